@@ -0,0 +1,361 @@
+import os
+import sys
+import argparse
+import collections
+import json
+import platform
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'data_manager'))
+sys.path.insert(0, os.path.join(ROOT, 'gui'))
+sys.path.insert(0, os.path.join(ROOT, 'emulators'))
+
+from iot_core.db_writer import DbWriter
+from iot_core.loopback_mqtt import LoopbackBroker, LoopbackClient
+from iot_core.payload_codec import encode_for_topic, set_topic_format
+from iot_core.rollups import RollupMaintainer, create_rollup_tables
+from iot_core.sensor_query import ensure_indexes
+from iot_core.sensor_schema import create_tables
+
+# End-to-end ingest benchmark.
+#
+# Every message is stamped (perf_counter) right before client.publish and
+# matched, in per-topic FIFO order, when it lands at the end of a path:
+#
+#   data_manager - row committed by data_manager's DbWriter
+#   analyzer     - alert published by dataAnalyzer.on_message reaches a subscriber
+#   gui          - alert reaches AlertDock.show_alert in the Qt main thread
+#                  (through the per-frame UI dispatcher)
+#                  (skipped when PyQt5 is not installed)
+#
+# Runs offline: against the in-process loopback broker (default), a local
+# broker started in this process (--broker local) or any host:port.
+#
+#   python ingest_benchmark.py --messages 20000 --output report.json
+
+SENSOR_TOPICS = ["iot/sensors/accelerometer", "iot/sensors/pressure", "iot/sensors/dht"]
+
+
+class StampLog:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = collections.defaultdict(collections.deque)
+        self.latencies = []
+        self.sent = 0
+        self.first_publish = None
+        self.last_arrival = None
+
+    def stamp(self, topic):
+        now = time.perf_counter()
+        with self.lock:
+            self.pending[topic].append(now)
+            self.sent += 1
+            if self.first_publish is None:
+                self.first_publish = now
+
+    def arrived(self, topic, count=1):
+        now = time.perf_counter()
+        with self.lock:
+            queue = self.pending[topic]
+            for _ in range(min(count, len(queue))):
+                self.latencies.append(now - queue.popleft())
+            self.last_arrival = now
+
+    @property
+    def received(self):
+        return len(self.latencies)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(stamps, wall_sec):
+    values = sorted(stamps.latencies)
+    to_ms = lambda v: None if v is None else round(v * 1000.0, 3)
+    span = (stamps.last_arrival - stamps.first_publish) if stamps.last_arrival and stamps.first_publish else 0.0
+    return {
+        'sent': stamps.sent,
+        'received': stamps.received,
+        'lost': stamps.sent - stamps.received,
+        'wall_sec': round(wall_sec, 3),
+        'msgs_per_sec': round(stamps.received / span, 1) if span else 0.0,
+        'latency_ms': {
+            'p50': to_ms(percentile(values, 50)),
+            'p95': to_ms(percentile(values, 95)),
+            'p99': to_ms(percentile(values, 99)),
+            'max': to_ms(values[-1] if values else None),
+            'mean': to_ms(sum(values) / len(values) if values else None),
+        },
+    }
+
+
+class ClientFactory:
+    def __init__(self, broker_arg):
+        self.local_broker = None
+        if broker_arg == 'loopback':
+            self.loopback = LoopbackBroker()
+            self.host, self.port = None, None
+            return
+        self.loopback = None
+        if broker_arg == 'local':
+            from local_broker import LocalBroker
+            self.local_broker = LocalBroker(port=0).start()
+            self.host, self.port = '127.0.0.1', self.local_broker.port
+        else:
+            host, _, port = broker_arg.partition(':')
+            self.host, self.port = host, int(port or 1883)
+
+    def __call__(self, client_id):
+        if self.loopback is not None:
+            return LoopbackClient(client_id, broker=self.loopback)
+        import paho.mqtt.client as mqtt
+        client = mqtt.Client(client_id)
+        client.max_inflight_messages_set(1000)
+        return client
+
+    def connect(self, client, topics=()):
+        client.connect(self.host or 'localhost', self.port or 1883)
+        for topic in topics:
+            client.subscribe(topic, 0)
+        client.loop_start()
+
+    def close(self):
+        if self.local_broker is not None:
+            self.local_broker.stop()
+
+
+def publish_loop(client, messages, rate, stamps):
+    interval = 1.0 / rate if rate else 0.0
+    start = time.perf_counter()
+    for i, (topic, payload) in enumerate(messages):
+        if interval:
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        stamps.stamp(topic)
+        client.publish(topic, payload)
+
+
+def sensor_messages(count, rng, hot_dht=False):
+    messages = []
+    for i in range(count):
+        topic = "iot/sensors/dht" if hot_dht else SENSOR_TOPICS[i % len(SENSOR_TOPICS)]
+        if topic.endswith('accelerometer'):
+            values = tuple(round(rng.uniform(-10.0, 10.0), 2) for _ in range(3))
+        elif topic.endswith('pressure'):
+            values = (rng.randint(40, 100), rng.randint(40, 100))
+        elif hot_dht:
+            values = (round(rng.uniform(29.5, 35.0), 1), round(rng.uniform(30.0, 60.0), 1))
+        else:
+            values = (round(rng.uniform(20.0, 30.0), 1), round(rng.uniform(30.0, 60.0), 1))
+        messages.append((topic, encode_for_topic(topic, [(int(time.time() * 1000), values)])[0]))
+    return messages
+
+
+def wait_for(stamps, expected, timeout, pump=None):
+    deadline = time.monotonic() + timeout
+    while stamps.received < expected and time.monotonic() < deadline:
+        if pump is not None:
+            pump()
+        time.sleep(0.001)
+
+
+def run_publisher(factory, messages, rate, stamps):
+    publisher = factory('bench-publisher')
+    factory.connect(publisher)
+    thread = threading.Thread(target=publish_loop, args=(publisher, messages, rate, stamps), daemon=True)
+    thread.start()
+    return publisher, thread
+
+
+def bench_data_manager(args, factory, workdir, rng):
+    import data_manager
+
+    db = os.path.join(workdir, 'bench_data_manager.db')
+    conn = sqlite3.connect(db)
+    create_tables(conn)
+    ensure_indexes(conn)
+    create_rollup_tables(conn)
+    conn.close()
+
+    stamps = StampLog()
+
+    def on_flush(batch):
+        for topic, count in collections.Counter(item[0] for item in batch).items():
+            stamps.arrived(topic, count)
+
+    data_manager.db_path = db
+    data_manager.db_writer = DbWriter(db, on_flush=on_flush, rollups=RollupMaintainer())
+    data_manager.db_writer.start()
+
+    subscriber = factory('bench-data-manager')
+    subscriber.on_message = data_manager.on_message
+    factory.connect(subscriber, SENSOR_TOPICS)
+    time.sleep(0.2)
+
+    messages = sensor_messages(args.messages, rng)
+    started = time.perf_counter()
+    publisher, thread = run_publisher(factory, messages, args.rate, stamps)
+    thread.join()
+    wait_for(stamps, len(messages), args.timeout)
+    wall = time.perf_counter() - started
+
+    result = summarize(stamps, wall)
+    result['db_writer'] = data_manager.db_writer.stats()
+    for client in (publisher, subscriber):
+        client.loop_stop()
+        client.disconnect()
+    data_manager.db_writer.stop()
+    return result
+
+
+def bench_analyzer(args, factory, workdir, rng):
+    import dataAnalyzer
+
+    stamps = StampLog()
+    analyzer = factory('bench-analyzer')
+    analyzer.on_message = dataAnalyzer.on_message
+    factory.connect(analyzer, ["iot/sensors/dht"])
+
+    listener = factory('bench-alert-listener')
+    listener.on_message = lambda client, userdata, msg: stamps.arrived("iot/sensors/dht")
+    factory.connect(listener, ["iot/alerts"])
+    time.sleep(0.2)
+
+    # Every sample is above the 29 C threshold, so every message yields an alert
+    messages = sensor_messages(args.messages, rng, hot_dht=True)
+    started = time.perf_counter()
+    publisher, thread = run_publisher(factory, messages, args.rate, stamps)
+    thread.join()
+    wait_for(stamps, len(messages), args.timeout)
+    wall = time.perf_counter() - started
+
+    result = summarize(stamps, wall)
+    for client in (publisher, analyzer, listener):
+        client.loop_stop()
+        client.disconnect()
+    return result
+
+
+def bench_gui(args, factory, workdir, rng):
+    try:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        from PyQt5.QtWidgets import QApplication
+        from PyQt5.QtCore import pyqtSlot
+    except ImportError:
+        return {'skipped': 'PyQt5 is not installed'}
+    import main_gui
+
+    db = os.path.join(workdir, 'bench_gui.db')
+    main_gui.db_path = db
+    main_gui.init_db(db, backfill=False)
+    main_gui.db_writer = DbWriter(db, rollups=RollupMaintainer())
+    main_gui.db_writer.start()
+
+    stamps = StampLog()
+
+    class StampingAlertDock(main_gui.AlertDock):
+        @pyqtSlot(str, str)
+        def show_alert(self, message, alert_type='good'):
+            super().show_alert(message, alert_type)
+            stamps.arrived("iot/alerts")
+
+    app = QApplication.instance() or QApplication([])
+    window = main_gui.MainWindow()
+    window.alertDock = StampingAlertDock()
+
+    mc = window.mc
+    mc.client = factory('bench-gui')
+    mc.client.on_message = mc.on_message
+    mc.worker.start()
+    factory.connect(mc.client, ["iot/alerts"])
+    time.sleep(0.2)
+
+    messages = [("iot/alerts", f"Bad posture detected! #{i}") for i in range(args.messages)]
+    started = time.perf_counter()
+    publisher, thread = run_publisher(factory, messages, args.rate, stamps)
+    while thread.is_alive():
+        app.processEvents()
+    wait_for(stamps, len(messages), args.timeout, pump=app.processEvents)
+    wall = time.perf_counter() - started
+
+    result = summarize(stamps, wall)
+    result['ingest_worker'] = mc.worker.stats()
+    result['ui_dispatcher'] = window.dispatcher.stats()
+    for client in (publisher, mc.client):
+        client.loop_stop()
+        client.disconnect()
+    mc.worker.stop()
+    main_gui.db_writer.stop()
+    window.close()
+    return result
+
+
+BENCHMARKS = {
+    'data_manager': bench_data_manager,
+    'analyzer': bench_analyzer,
+    'gui': bench_gui,
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure publish-to-ingest latency and throughput.")
+    parser.add_argument('--messages', type=int, default=5000, help="Messages per path")
+    parser.add_argument('--rate', type=float, default=0.0, help="Publish rate in msgs/s (0 = as fast as possible)")
+    parser.add_argument('--paths', default=','.join(BENCHMARKS), help="Comma separated paths to run")
+    parser.add_argument('--broker', default='loopback', help="'loopback', 'local' or host[:port]")
+    parser.add_argument('--format', choices=['text', 'binary'], default='text', help="Sensor payload format")
+    parser.add_argument('--timeout', type=float, default=30.0, help="Seconds to wait for stragglers")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="Write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    for topic in SENSOR_TOPICS:
+        set_topic_format(topic, args.format)
+
+    output = os.path.abspath(args.output) if args.output else None
+    workdir = tempfile.mkdtemp(prefix='iot_bench_')
+    # The services write their log files to the current directory
+    os.chdir(workdir)
+
+    factory = ClientFactory(args.broker)
+    rng = random.Random(args.seed)
+    results = {}
+    try:
+        for name in [p.strip() for p in args.paths.split(',') if p.strip()]:
+            results[name] = BENCHMARKS[name](args, factory, workdir, rng)
+    finally:
+        factory.close()
+
+    report = {
+        'benchmark': 'ingest',
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': vars(args),
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text)
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+import os
+import sys
+import argparse
+import json
+import platform
+import socket
+import sqlite3
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'data_manager'))
+
+from iot_core.devices import sensor_topic
+
+# Scale-out benchmark for ingest_service.py --workers N.
+#
+# Starts emulators/local_broker.py in its own process, runs an IngestCluster
+# with 1..N workers in fanout and/or share mode, publishes DHT samples for
+# many devices as fast as possible and waits until every sample is committed
+# to SQLite. Each device's samples carry a sequence number (as humidity), so
+# the stored rows show whether per-device order survived the split.
+#
+#   python scaleout_benchmark.py --messages 20000 --devices 100 --workers 1,2,4 --modes fanout,share
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_broker(port):
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'emulators', 'local_broker.py'),
+                                '--port', str(port)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Local broker did not start")
+
+
+def count_rows(db):
+    conn = sqlite3.connect(db)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM dht_data").fetchone()[0]
+    finally:
+        conn.close()
+
+
+# Rows per device must come back with increasing sequence numbers in id order
+def check_order(db):
+    conn = sqlite3.connect(db)
+    last = {}
+    out_of_order = 0
+    try:
+        for device_id, seq in conn.execute("SELECT device_id, humidity FROM dht_data ORDER BY raw_id"):
+            if seq <= last.get(device_id, -1):
+                out_of_order += 1
+            last[device_id] = seq
+    finally:
+        conn.close()
+    return len(last), out_of_order
+
+
+def run(args, port, workers, mode, workdir):
+    import ingest_service
+    import paho.mqtt.client as mqtt
+
+    db = os.path.join(workdir, f"scaleout_{mode}_{workers}.db")
+    ingest_service.ensure_database(db)
+    cluster_args = ingest_service.parse_args([
+        '--broker', '127.0.0.1', '--port', str(port), '--db', db,
+        '--workers', str(workers), '--mode', mode, '--group', f"bench-{mode}-{workers}", '--metrics-port', '0'])
+    cluster = ingest_service.IngestCluster(cluster_args)
+    cluster.start()
+    time.sleep(args.settle)  # Workers import, connect and subscribe
+
+    publisher = mqtt.Client(f"bench-publisher-{mode}-{workers}")
+    publisher.connect('127.0.0.1', port)
+    publisher.loop_start()
+    topics = [sensor_topic('dht', f"chair-{device}", 'bench') for device in range(args.devices)]
+    started = time.perf_counter()
+    for i in range(args.messages):
+        seq, device = divmod(i, args.devices)
+        publisher.publish(topics[device], f"Temperature: 22.0 C, Humidity: {seq}%")
+    published = time.perf_counter() - started
+
+    stored = 0
+    deadline = time.monotonic() + args.timeout
+    while time.monotonic() < deadline:
+        stored = count_rows(db)
+        if stored >= args.messages:
+            break
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+
+    stats = cluster.stats()
+    publisher.loop_stop()
+    publisher.disconnect()
+    cluster.stop()
+    devices, out_of_order = check_order(db)
+    return {
+        'workers': workers,
+        'mode': mode,
+        'sent': args.messages,
+        'stored': stored,
+        'lost': args.messages - stored,
+        'publish_sec': round(published, 3),
+        'elapsed_sec': round(elapsed, 3),
+        'msgs_per_sec': round(stored / elapsed, 1) if elapsed else 0.0,
+        'devices': devices,
+        'out_of_order': out_of_order,
+        'cluster': stats,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure ingest throughput with 1..N worker processes.")
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--devices', type=int, default=100)
+    parser.add_argument('--workers', default='1,2,4', help="Comma separated worker counts")
+    parser.add_argument('--modes', default='fanout,share', help="Comma separated: fanout, share")
+    parser.add_argument('--settle', type=float, default=2.0, help="Seconds to let workers subscribe")
+    parser.add_argument('--timeout', type=float, default=60.0, help="Seconds to wait for all rows")
+    parser.add_argument('--output', help="Write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    output = os.path.abspath(args.output) if args.output else None
+    workdir = tempfile.mkdtemp(prefix='iot_scaleout_')
+    # The services write their log files to the current directory
+    os.chdir(workdir)
+
+    port = free_port()
+    broker = start_broker(port)
+    results = []
+    try:
+        for mode in [m.strip() for m in args.modes.split(',') if m.strip()]:
+            for workers in [int(n) for n in args.workers.split(',') if n.strip()]:
+                results.append(run(args, port, workers, mode, workdir))
+    finally:
+        broker.terminate()
+        broker.wait(5)
+
+    report = {
+        'benchmark': 'scaleout',
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'config': vars(args),
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text)
+    return report
+
+
+if __name__ == '__main__':
+    main()
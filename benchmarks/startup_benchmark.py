@@ -0,0 +1,119 @@
+import os
+import sys
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Cold-start benchmark for the services. Every target is imported in a fresh
+# interpreter, several times, and the report gives the import time, the whole
+# process time (interpreter start included, what spawning a worker costs), the
+# peak RSS, and which heavy dependencies the import pulled in. The headless
+# services should stay well below the GUI and load neither Qt nor numpy.
+#
+#   python startup_benchmark.py --runs 10 --output startup.json
+
+# name -> (directory put on sys.path, module)
+TARGETS = {
+    'python': (None, None),  # Bare interpreter, the floor for everything else
+    'data_manager': ('data_manager', 'data_manager'),
+    'data_analyzer': ('data_manager', 'dataAnalyzer'),
+    'ingest_service': ('data_manager', 'ingest_service'),
+    'gui': ('gui', 'main_gui'),
+}
+HEAVY_MODULES = ['PyQt5', 'numpy', 'pyarrow', 'paho', 'asyncio', 'multiprocessing', 'http.server']
+
+PROBE = """
+import sys, time, json
+started = time.perf_counter()
+path, module = sys.argv[1], sys.argv[2]
+if module:
+    sys.path[:0] = [path, {root!r}]
+    __import__(module)
+elapsed = (time.perf_counter() - started) * 1000.0
+try:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss_kb //= 1024
+except ImportError:
+    rss_kb = None
+print(json.dumps({{'import_ms': elapsed, 'rss_kb': rss_kb, 'modules': len(sys.modules),
+                  'heavy': [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def measure(name, runs, workdir):
+    directory, module = TARGETS[name]
+    probe = PROBE.format(root=ROOT, heavy=HEAVY_MODULES)
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-c', probe, os.path.join(ROOT, directory) if directory else '', module or ''],
+            cwd=workdir, env=env, capture_output=True, text=True)
+        process_ms = (time.perf_counter() - started) * 1000.0
+        if result.returncode != 0:
+            return {'target': name, 'error': result.stderr.strip().splitlines()[-1:]}
+        sample = json.loads(result.stdout.strip().splitlines()[-1])
+        sample['process_ms'] = process_ms
+        samples.append(sample)
+    return {
+        'target': name,
+        'module': module,
+        'runs': runs,
+        'import_ms_median': round(statistics.median(s['import_ms'] for s in samples), 1),
+        'import_ms_min': round(min(s['import_ms'] for s in samples), 1),
+        'process_ms_median': round(statistics.median(s['process_ms'] for s in samples), 1),
+        'rss_mb': round(samples[-1]['rss_kb'] / 1024.0, 1) if samples[-1]['rss_kb'] else None,
+        'modules': samples[-1]['modules'],
+        'heavy': samples[-1]['heavy'],
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start time and memory of the services.")
+    parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters per target")
+    parser.add_argument('--targets', default=','.join(TARGETS), help="Comma separated: " + ', '.join(TARGETS))
+    parser.add_argument('--output', help="Write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    output = os.path.abspath(args.output) if args.output else None
+    # The services create their log files in the current directory on import
+    workdir = tempfile.mkdtemp(prefix='iot_startup_')
+
+    results = []
+    for name in [t.strip() for t in args.targets.split(',') if t.strip()]:
+        if name not in TARGETS:
+            raise SystemExit(f"Unknown target: {name}")
+        results.append(measure(name, args.runs, workdir))
+
+    report = {
+        'benchmark': 'startup',
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'config': vars(args),
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text)
+    return report
+
+
+if __name__ == '__main__':
+    main()
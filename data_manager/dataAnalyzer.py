@@ -1,52 +1,87 @@
+import os
+import sys
 import logging
-import paho.mqtt.client as mqtt
 
-# Setup Logging
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from iot_core.devices import ALERT_TOPIC, DeviceRegistry, sensor_subscriptions
+from iot_core.metrics import messages_received, parse_failures, sensor_label, start_metrics_server
+from iot_core.payload_codec import decode_payload
+from iot_core.rules import DEFAULT_RULES_PATH, RuleEngine, analyze_data
+from iot_core.sensor_schema import DEFAULT_DEVICE_ID
+
 logger = logging.getLogger(__name__)
-handler = logging.FileHandler('data_analyzer.log')
-formatter = logging.Formatter('%(asctime)s : %(levelname)s : %(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
-logger.setLevel(logging.INFO)
-
-# Function to analyze temperature data from DHT
-def analyze_data(topic, message):
-    try:
-        if "Temperature" in message:
-            # Extract the temperature value and remove the "C" and space
-            temp_value_str = message.split(":")[1].split(",")[0].strip().replace(" C", "")
-            temp_value = float(temp_value_str)
-            if temp_value > 29.0:
-                logger.warning(f"High temperature detected: {temp_value}°C")
-                return f"<p style='color:blue;'>High temperature detected: {temp_value}°C</p>"
-        return None
-    except Exception as e:
-        logger.error(f"Error analyzing data: {e}")
-        return None
+
+# Setup Logging; only when run as a script, so importing this module (the
+# benchmarks do) leaves the logging configuration alone
+def setup_logging():
+    handler = logging.FileHandler('data_analyzer.log')
+    formatter = logging.Formatter('%(asctime)s : %(levelname)s : %(message)s')
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logging.getLogger('iot_core').addHandler(handler)
+    logging.getLogger('iot_core').setLevel(logging.INFO)
+
+broker = 'broker.hivemq.com'
+port = 1883
+client_id = 'iot-data-analyzer'  # Fixed, so the broker can keep our session
+metrics_port = 9102  # http://127.0.0.1:9102/metrics (None to disable)
+
+# Alert rules (see iot_core/rules.py for the format)
+rule_engine = RuleEngine.from_file(DEFAULT_RULES_PATH)
+stats_every = 1000  # Log per-rule evaluation cost every N analyzed samples
+
+# Rule state is kept per device; the device id comes from the topic
+devices = DeviceRegistry()
+
+analyzed = 0
 
 # Callback for MQTT messages
 def on_message(client, userdata, msg):
-    message = msg.payload.decode()
+    global analyzed
     topic = msg.topic
+    messages_received.inc(sensor=sensor_label(topic))
+
+    # Only messages that some rule reads
+    if rule_engine.handles(topic):
+        try:
+            sensor, samples = decode_payload(topic, msg.payload)
+        except ValueError as e:
+            parse_failures.inc(sensor=sensor_label(topic))
+            logger.error(f"Error decoding message on topic {topic}: {e}")
+            return
+        logger.debug(f"Received {len(samples)} sample(s) on topic {topic}")
+        device = devices.resolve(topic)[0] or devices.device(DEFAULT_DEVICE_ID)
 
-    # Only log temperature-related messages; avoid other sensor types
-    if "dht" in topic:
-        logger.info(f"Received message on topic {topic}: {message}")
+        # Analyze each sample for alerts
+        for ts_ms, values in samples:
+            device.observe(sensor, ts_ms, values)
+            for alert in analyze_data(rule_engine, topic, values, ts_ms, device.device_id):
+                logger.info(f"Alert triggered for {device.device_id}: {alert}")
+                client.publish(ALERT_TOPIC, alert)  # Send alert via MQTT to the GUI alert dock
 
-        # Analyze the message for alerts
-        alert = analyze_data(topic, message)
-        if alert:
-            logger.info(f"Alert triggered: {alert}")
-            client.publish("iot/alerts", alert)  # Send alert via MQTT to the GUI alert dock
+        analyzed += len(samples)
+        if analyzed // stats_every != (analyzed - len(samples)) // stats_every:
+            logger.info(f"Rule stats: {rule_engine.stats()}")
 
 # Start the data analyzer with MQTT connection
 def start_analyzer():
-    client = mqtt.Client()
-    client.connect('broker.hivemq.com', 1883)
-    client.subscribe("iot/sensors/dht")  # Subscribe only to DHT sensor data
-    client.on_message = on_message
-    logger.info("Data Analyzer started and subscribed to DHT sensors.")
-    client.loop_forever()
+    # paho is only needed once the analyzer runs, not by the benchmarks
+    from iot_core.connection import ConnectionManager
+
+    start_metrics_server(metrics_port)
+    # Persistent session: the broker queues QoS 1 samples while we are down
+    connection = ConnectionManager(client_id=client_id, clean_session=False, name="Data Analyzer")
+    connection.client.on_message = on_message
+    # Subscribe only to the sensors the rules read, on every device
+    topics = sensor_subscriptions(rule_engine.sensors())
+    connection.subscribe(topics)
+    logger.info(f"Data Analyzer started with {len(rule_engine.rules)} rules, subscribed to: {', '.join(topics)}")
+    try:
+        connection.run_forever(broker, port)
+    finally:
+        logger.info(f"Connection stats: {connection.stats()}")
 
 if __name__ == "__main__":
+    setup_logging()
     start_analyzer()
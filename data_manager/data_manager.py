@@ -1,7 +1,17 @@
-import sqlite3
-import paho.mqtt.client as mqtt
+import os
+import sys
 import logging
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from iot_core.db_writer import DbWriter
+from iot_core.devices import DeviceRegistry, sensor_subscriptions
+from iot_core.metrics import messages_received, parse_failures, sensor_label, start_metrics_server
+from iot_core.payload_codec import decode_payload, format_text
+from iot_core.rollups import RollupMaintainer
+from iot_core.retention import RetentionEngine, RetentionPolicy
+from iot_core.sensor_schema import DEFAULT_DEVICE_ID
+from iot_core.storage import init_db
+
 # Setup Logging using the standard logger
 logger = logging.getLogger(__name__)
 handler = logging.FileHandler('data_manager.log')
@@ -9,66 +19,99 @@ formatter = logging.Formatter('%(asctime)s : %(levelname)s : %(message)s')
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 logger.setLevel(logging.INFO)
+logging.getLogger('iot_core').addHandler(handler)
+logging.getLogger('iot_core').setLevel(logging.INFO)
 
 db_path = 'iot_data.db'  # Path to SQLite database
+broker = 'broker.hivemq.com'
+port = 1883
+client_id = 'iot-data-manager'  # Fixed, so the broker can keep our session
+metrics_port = 9101  # http://127.0.0.1:9101/metrics (None to disable)
+
+# Per-minute/hour aggregates, kept up to date by every write batch
+rollups = RollupMaintainer()
+
+# One long-lived, batched writer instead of a connection per message
+db_writer = DbWriter(db_path, rollups=rollups)
 
-# Ensure the 'sensor_data' table exists
+# Raw samples are kept for a week, minute rollups for 90 days, hour rollups
+# forever; the retention pass runs once a day in the background
+retention_policy = RetentionPolicy(raw_days=7, minute_days=90, hour_days=None)
+retention_interval = 24 * 60 * 60
+
+# Per-device state; topics are iot/<site>/<device>/<sensor> (see iot_core/devices.py)
+devices = DeviceRegistry()
+
+# Ensure the 'sensor_data' table and the typed per-sensor tables exist,
+# and migrate any rows stored before the typed tables (or rollups) were introduced
 def ensure_table_exists():
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS sensor_data (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                topic TEXT,
-                message TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        conn.commit()
-        conn.close()
-        logger.info("Ensured sensor_data table exists.")
+        init_db(db_path, rollups=rollups)
+        logger.info("Ensured sensor_data, typed sensor and rollup tables exist.")
     except Exception as e:
         logger.error(f"Error ensuring table exists: {e}")
 
-# Function to log data into the database
-def log_to_db(topic, message):
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO sensor_data (topic, message) VALUES (?, ?)", (topic, message))
-        conn.commit()
-        conn.close()
-        # Keep logging data-related events
-        logger.info(f"Data logged to database - Topic: {topic}, Message: {message}")
-    except Exception as e:
-        logger.error(f"Error logging to database: {e}")
+# Function to log data into the database (queued, committed in batches by db_writer)
+def log_to_db(topic, message, values=None, ts_ms=None, device_id=DEFAULT_DEVICE_ID):
+    if db_writer.write(topic, message, device_id, values, ts_ms):
+        # Per-message detail only at DEBUG; throughput is in the metrics
+        logger.debug(f"Data queued for database - Topic: {topic}, Message: {message}")
 
 # Callback for MQTT messages
 def on_message(client, userdata, msg):
-    message = msg.payload.decode()
     topic = msg.topic
+    messages_received.inc(sensor=sensor_label(topic))
+
+    # Decode once (text or binary); a binary message may carry several samples
+    try:
+        sensor, samples = decode_payload(topic, msg.payload)
+    except ValueError as e:
+        parse_failures.inc(sensor=sensor_label(topic))
+        logger.error(f"Error decoding message on topic {topic}: {e}")
+        log_to_db(topic, msg.payload.decode(errors='replace'))
+        return
+
+    if sensor is None:
+        # Not sensor data (e.g. alerts) - store as is
+        log_to_db(topic, msg.payload.decode(errors='replace'))
+        return
 
     # Only log raw data from sensors; no alerts here
-    if "dht" in topic or "accelerometer" in topic or "pressure" in topic:
-        logger.info(f"Received message on topic {topic}: {message}")
+    logger.debug(f"Received {len(samples)} sample(s) on topic {topic}")
+    device, _ = devices.resolve(topic)
+    device_id = device.device_id if device is not None else DEFAULT_DEVICE_ID
 
-    # Log the message to the database
-    log_to_db(topic, message)
+    # Log each sample to the database, keeping the stored message in text form
+    for ts_ms, values in samples:
+        if device is not None:
+            device.observe(sensor, ts_ms, values)
+        log_to_db(topic, format_text(sensor, values), values, ts_ms, device_id)
 
 # Start the data manager with MQTT connection
 def start_data_manager():
+    # paho is only needed once the service runs, not to import this module
+    from iot_core.connection import ConnectionManager
+
     logger.info(f"Using database at path: {db_path}")
     ensure_table_exists()  # Ensure the table is created
+    db_writer.start()
+    retention = RetentionEngine(db_path, retention_policy)
+    retention.start(retention_interval)
+    start_metrics_server(metrics_port)
 
-    client = mqtt.Client()
-    client.connect('broker.hivemq.com', 1883)
-    client.subscribe("iot/sensors/accelerometer")
-    client.subscribe("iot/sensors/pressure")
-    client.subscribe("iot/sensors/dht")
-    client.on_message = on_message
-    logger.info("Data Manager started and subscribed to accelerometer, pressure, and DHT topics.")
-    client.loop_forever()
+    # Persistent session: the broker queues QoS 1 samples while we are down
+    connection = ConnectionManager(client_id=client_id, clean_session=False, name="Data Manager")
+    connection.client.on_message = on_message
+    # Every device's accelerometer, pressure and DHT topics (plus the legacy ones)
+    topics = sensor_subscriptions()
+    connection.subscribe(topics)
+    logger.info(f"Data Manager started and subscribed to: {', '.join(topics)}")
+    try:
+        connection.run_forever(broker, port)
+    finally:
+        logger.info(f"Connection stats: {connection.stats()}")
+        retention.stop()
+        db_writer.stop()  # Commit whatever is still queued
 
 if __name__ == "__main__":
     start_data_manager()
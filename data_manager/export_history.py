@@ -0,0 +1,117 @@
+import os
+import sys
+import argparse
+import logging
+import sqlite3
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from iot_core.analytics import bad_posture_by_hour, hourly_summary, tilt_distribution
+from iot_core.export import export_history
+from iot_core.sensor_query import ms_to_timestamp, parse_time
+from iot_core.sensor_schema import SENSOR_TABLES, backfill_typed_tables, create_tables
+
+# Export sensor history to columnar files and run reports on the export
+# (see iot_core/export.py and iot_core/analytics.py):
+#
+#   python export_history.py export --db iot_data.db --out history
+#   python export_history.py posture --out history --device chair-1
+#   python export_history.py tilt --out history --start 2024-05-01
+#   python export_history.py hourly --out history --sensor dht --field temperature
+
+logger = logging.getLogger(__name__)
+handler = logging.FileHandler('export_history.log')
+formatter = logging.Formatter('%(asctime)s : %(levelname)s : %(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+logger.setLevel(logging.INFO)
+logging.getLogger('iot_core').addHandler(handler)
+logging.getLogger('iot_core').setLevel(logging.INFO)
+
+db_path = 'iot_data.db'
+export_dir = 'history_export'
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Columnar export of sensor history and reports on it.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', help="Append new rows from the database to the export")
+    export.add_argument('--db', default=db_path, help="Path to the SQLite database")
+    export.add_argument('--format', choices=['auto', 'parquet', 'npz'], default='auto',
+                        help="parquet needs pyarrow; auto falls back to npz without it")
+    export.add_argument('--sensor', action='append', choices=list(SENSOR_TABLES),
+                        help="Only this sensor (repeatable; default: all)")
+    export.add_argument('--chunk-size', type=int, default=50000, help="Rows read from SQLite per query")
+
+    for name, text in (('posture', "Bad-posture percentage per device and hour"),
+                       ('tilt', "Distribution of the tilt magnitude"),
+                       ('hourly', "Hourly count/mean/min/max of one field")):
+        report = commands.add_parser(name, help=text)
+        report.add_argument('--device', action='append', help="Only this device (repeatable)")
+        report.add_argument('--start', help="Start time, epoch ms or 'YYYY-MM-DD HH:MM:SS' UTC (inclusive)")
+        report.add_argument('--end', help="End time, epoch ms or 'YYYY-MM-DD HH:MM:SS' UTC (exclusive)")
+        if name == 'tilt':
+            report.add_argument('--bin-width', type=float, default=1.0, help="Histogram bin width in degrees")
+        if name == 'hourly':
+            report.add_argument('--sensor', choices=list(SENSOR_TABLES), default='dht')
+            report.add_argument('--field', help="Field to summarize (default: the sensor's first field)")
+
+    for command in commands.choices.values():
+        command.add_argument('--out', default=export_dir, help="Export directory")
+    return parser.parse_args(argv)
+
+
+def run_export(args):
+    conn = sqlite3.connect(args.db)
+    try:
+        # Rows stored before the typed tables existed are parsed first
+        create_tables(conn)
+        backfill_typed_tables(conn)
+        report = export_history(conn, args.out, args.sensor, args.format, chunk_size=args.chunk_size)
+    except ValueError as e:
+        logger.error(f"Export to {args.out} failed: {e}")
+        sys.exit(f"Export failed: {e}")
+    finally:
+        conn.close()
+    for sensor, result in report.items():
+        print(f"{sensor}: {result['rows']} rows in {result['parts']} parts "
+              f"(up to id {result['last_id']}, {result['seconds']} s)")
+
+
+def run_report(args):
+    start, end = parse_time(args.start), parse_time(args.end)
+    if args.command == 'posture':
+        for device_id, report in sorted(bad_posture_by_hour(args.out, args.device, start, end).items()):
+            print(f"-- {device_id}")
+            for hour_ms, samples, bad, percent in zip(report['hour_ms'], report['samples'], report['bad'],
+                                                      report['bad_percent']):
+                print(f"{ms_to_timestamp(int(hour_ms))}  {samples:6d} samples  {bad:6d} bad  {percent:5.1f}%")
+    elif args.command == 'tilt':
+        counts, edges = tilt_distribution(args.out, args.device, start, end,
+                                          np.arange(0.0, 90.0 + args.bin_width, args.bin_width))
+        total = counts.sum()
+        for lo, hi, count in zip(edges[:-1], edges[1:], counts):
+            if count:
+                print(f"{lo:5.1f}-{hi:5.1f}  {count:8d}  {count * 100.0 / total:5.1f}%")
+        print(f"{total} samples")
+    else:
+        field = args.field or SENSOR_TABLES[args.sensor][1][0]
+        for device_id, report in sorted(hourly_summary(args.out, args.sensor, field, args.device, start, end).items()):
+            print(f"-- {device_id} {field}")
+            for i, hour_ms in enumerate(report['hour_ms']):
+                print(f"{ms_to_timestamp(int(hour_ms))}  n={report['count'][i]:6d}  mean={report['mean'][i]:.2f}  "
+                      f"min={report['min'][i]:.2f}  max={report['max'][i]:.2f}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'export':
+        run_export(args)
+    else:
+        run_report(args)
+
+
+if __name__ == "__main__":
+    main()
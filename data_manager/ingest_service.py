@@ -0,0 +1,487 @@
+import os
+import sys
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import queue
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from iot_core.db_writer import DbWriter, ForwardingDbWriter
+from iot_core.devices import ALERT_TOPIC, DeviceRegistry, sensor_subscriptions
+from iot_core.metrics import messages_received, parse_failures, sensor_label, start_metrics_server
+from iot_core.partitioning import Partitioner, shared_subscription
+from iot_core.payload_codec import decode_payload, format_text
+from iot_core.pipeline import Envelope, Pipeline, Stage
+from iot_core.retention import RetentionEngine, RetentionPolicy
+from iot_core.rollups import RollupMaintainer
+from iot_core.sensor_fusion import SensorFusion
+from iot_core.sensor_schema import DEFAULT_DEVICE_ID
+from iot_core.rules import DEFAULT_RULES_PATH, RuleEngine, alerts_total, analyze_data
+from iot_core.storage import init_db
+
+# Single-process ingest service that replaces running data_manager.py and
+# dataAnalyzer.py side by side. One MQTT connection feeds a pipeline:
+#
+#   parse --+--> persist                (DbWriter, batched SQLite)
+#           +--> analyze --> alert      (alert rules, optional posture)
+#
+# Every payload is decoded once. Stages are connected by bounded asyncio
+# queues; when they fill up the MQTT network thread blocks, so backpressure
+# reaches the broker instead of growing memory.
+#
+#   python ingest_service.py --broker broker.hivemq.com --port 1883
+#
+# With --workers N the stream is split over N worker processes, each with its
+# own pipeline, by device (see iot_core/partitioning.py). The workers hand
+# their parsed batches to one writer process, the only SQLite writer:
+#
+#   python ingest_service.py --workers 4 --mode fanout   # one receiver, N workers
+#   python ingest_service.py --workers 4 --mode share    # $share/<group>/... subscriptions
+
+logger = logging.getLogger(__name__)
+
+
+# Only when run as a script: importing the service (tests, benchmarks) leaves
+# the logging configuration alone. Forked workers inherit the handler.
+def setup_logging():
+    handler = logging.FileHandler('ingest_service.log')
+    formatter = logging.Formatter('%(asctime)s : %(levelname)s : %(message)s')
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logging.getLogger('iot_core').addHandler(handler)
+    logging.getLogger('iot_core').setLevel(logging.INFO)
+
+db_path = 'iot_data.db'
+SENSOR_TOPICS = sensor_subscriptions()  # iot/+/+/<sensor> and the legacy iot/sensors/<sensor>
+WORKER_METRICS_OFFSET = 10  # Worker i of a cluster serves its metrics on --metrics-port + 10 + i
+
+
+class ParseStage(Stage):
+    name = 'parse'
+
+    def __init__(self, maxsize=1000, devices=None):
+        super().__init__(maxsize)
+        self.devices = devices if devices is not None else DeviceRegistry()
+
+    async def handle(self, envelope):
+        try:
+            sensor, samples = decode_payload(envelope.topic, envelope.payload, envelope.received_ms)
+        except ValueError as e:
+            # Passed on as raw text so it is still persisted, like data_manager does
+            parse_failures.inc(sensor=sensor_label(envelope.topic))
+            logger.error(f"Could not decode payload on {envelope.topic}: {e}")
+            sensor, samples = None, []
+        envelope.sensor = sensor
+        envelope.samples = samples
+        if sensor is None:
+            envelope.text = envelope.payload.decode(errors='replace')
+            return envelope
+        device, _ = self.devices.resolve(envelope.topic)
+        if device is not None:
+            envelope.device_id = device.device_id
+            for ts_ms, values in samples:
+                device.observe(sensor, ts_ms, values)
+        return envelope
+
+    def stats(self):
+        stats = super().stats()
+        stats['devices'] = self.devices.stats()
+        return stats
+
+
+class PersistStage(Stage):
+    name = 'persist'
+
+    def __init__(self, db_writer, maxsize=1000):
+        super().__init__(maxsize)
+        self.db_writer = db_writer
+
+    async def start(self):
+        self.db_writer.start()
+
+    async def stop(self):
+        # Joining the writer thread would block the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self.db_writer.stop)
+
+    async def handle(self, envelope):
+        if envelope.sensor is None:
+            self.db_writer.write(envelope.topic, envelope.text)
+            return None
+        for ts_ms, values in envelope.samples:
+            self.db_writer.write(envelope.topic, format_text(envelope.sensor, values), envelope.device_id, values, ts_ms)
+        return None
+
+    def stats(self):
+        stats = super().stats()
+        stats['db_writer'] = self.db_writer.stats()
+        return stats
+
+
+# Produces alert texts. Samples are checked against the alert rules
+# (data_manager/alert_rules.json, or --rules); posture (optional) fuses accelerometer/pressure per device and scores all
+# devices in one vectorized pass per tick, emitting only state transitions.
+class AnalyzeStage(Stage):
+    name = 'analyze'
+
+    def __init__(self, rules, posture=False, tick_interval=0.5, maxsize=1000):
+        super().__init__(maxsize)
+        self.rules = rules
+        self.posture = posture
+        self.tick_interval = tick_interval
+        self.fusion = SensorFusion()
+        self.engine = None
+        if posture:
+            # numpy is only loaded by workers that score posture
+            from iot_core.posture_engine import PostureEngine
+            self.engine = PostureEngine()
+        self.alerts = 0
+        self._tick_task = None
+
+    async def start(self):
+        if self.posture:
+            self._tick_task = asyncio.create_task(self._tick_forever())
+
+    async def stop(self):
+        if self._tick_task is not None:
+            self._tick_task.cancel()
+
+    async def emit(self, message, device_id=DEFAULT_DEVICE_ID):
+        self.alerts += 1
+        for stage in self.downstream:
+            await stage.queue.put((device_id, message))
+
+    async def handle(self, envelope):
+        if self.rules.handles(envelope.topic):
+            for ts_ms, values in envelope.samples:
+                for alert in analyze_data(self.rules, envelope.topic, values, ts_ms, envelope.device_id):
+                    await self.emit(alert, envelope.device_id)
+        if self.posture and envelope.sensor in ('accelerometer', 'pressure'):
+            for ts_ms, values in envelope.samples:
+                for fused in self.fusion.add(envelope.device_id, envelope.sensor, ts_ms, values):
+                    self.engine.update_accel(fused.device_id, fused.accel[0], fused.accel[1])
+                    self.engine.update_pressure(fused.device_id, fused.pressure[0], fused.pressure[1])
+        return None
+
+    async def tick(self):
+        for device_id, bad in self.engine.evaluate_transitions():
+            alerts_total.inc(rule='posture')
+            await self.emit("Bad posture detected!" if bad else "Good posture!", device_id)
+
+    async def _tick_forever(self):
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            await self.tick()
+
+    def stats(self):
+        stats = super().stats()
+        stats['alerts'] = self.alerts
+        stats['rules'] = self.rules.stats()
+        if self.posture:
+            stats['fusion'] = self.fusion.stats()
+        return stats
+
+
+class AlertStage(Stage):
+    name = 'alert'
+
+    def __init__(self, client, topic=ALERT_TOPIC, maxsize=1000):
+        super().__init__(maxsize)
+        self.client = client
+        self.topic = topic
+
+    async def handle(self, alert):
+        device_id, message = alert
+        logger.info(f"Alert triggered for {device_id}: {message}")
+        # paho's publish is thread-safe and only queues the packet
+        self.client.publish(self.topic, message)
+        return None
+
+
+def build_pipeline(client, db_writer, rules, posture=False, queue_size=1000):
+    pipeline = Pipeline()
+    parse = pipeline.add(ParseStage(queue_size))
+    pipeline.add(PersistStage(db_writer, queue_size), after=parse)
+    analyze = pipeline.add(AnalyzeStage(rules, posture, maxsize=queue_size), after=parse)
+    pipeline.add(AlertStage(client, maxsize=queue_size), after=analyze)
+    return pipeline
+
+
+# connection is an iot_core.connection.ConnectionManager: it reconnects with
+# backoff and resubscribes, so the service survives broker restarts
+class IngestService:
+    def __init__(self, connection, db_writer, rules, topics=SENSOR_TOPICS, posture=False, queue_size=1000,
+                 stats_interval=60.0, name="Ingest service"):
+        self.connection = connection
+        self.client = client = connection.client
+        self.topics = topics
+        self.name = name
+        self.stats_interval = stats_interval
+        self.pipeline = build_pipeline(client, db_writer, rules, posture, queue_size)
+        self.loop = None
+        self.received = 0
+
+    # Runs on the MQTT network thread: hand the message to the event loop and
+    # wait for queue space, so a full pipeline stops reading from the socket
+    def on_message(self, client, userdata, msg):
+        self.received += 1
+        messages_received.inc(sensor=sensor_label(msg.topic))
+        envelope = Envelope(msg.topic, msg.payload)
+        future = asyncio.run_coroutine_threadsafe(self.pipeline.submit(envelope), self.loop)
+        try:
+            future.result()
+        except Exception as e:
+            logger.error(f"Dropping message on {msg.topic}: {e}")
+
+    async def start(self, broker, port):
+        self.loop = asyncio.get_running_loop()
+        await self.pipeline.start()
+        self.client.on_message = self.on_message
+        self.connection.subscribe(self.topics)
+        self.connection.start(broker, port)
+        logger.info(f"{self.name} started on {broker}:{port}, subscribed to {', '.join(self.topics) or 'nothing'}")
+
+    async def stop(self):
+        # Disconnect while the network loop still runs so DISCONNECT reaches the
+        # broker, then drain what was already received. loop_stop joins the
+        # network thread, which may itself be waiting on this event loop for
+        # queue space, so it must not block the loop
+        await self.loop.run_in_executor(None, self.connection.stop)
+        await self.pipeline.stop()
+        logger.info(f"{self.name} stopped. Stats: {self.stats()}")
+
+    def stats(self):
+        return {'received': self.received, 'connection': self.connection.stats(), 'stages': self.pipeline.stats()}
+
+    # Fanout workers: take message batches from a Partitioner queue instead of
+    # a subscription, until the None sent by Partitioner.stop()
+    async def feed(self, partition_queue):
+        while True:
+            try:
+                batch = await self.loop.run_in_executor(None, partition_queue.get, True, 1.0)
+            except queue.Empty:
+                continue
+            if batch is None:
+                return
+            for topic, payload, received_ms in batch:
+                self.received += 1
+                messages_received.inc(sensor=sensor_label(topic))
+                await self.pipeline.submit(Envelope(topic, payload, received_ms))
+
+    # Runs until cancelled, until the feed ends, or until stop_event is set
+    async def run_forever(self, broker, port, partition_queue=None, stop_event=None):
+        await self.start(broker, port)
+        feeder = asyncio.create_task(self.feed(partition_queue)) if partition_queue is not None else None
+        next_stats = time.monotonic() + self.stats_interval
+        try:
+            while not (feeder is not None and feeder.done()) and not (stop_event is not None and stop_event.is_set()):
+                await asyncio.sleep(0.2)
+                if time.monotonic() >= next_stats:
+                    logger.info(f"{self.name} stats: {self.stats()}")
+                    next_stats = time.monotonic() + self.stats_interval
+        finally:
+            if feeder is not None:
+                if feeder.done() and not feeder.cancelled() and feeder.exception() is not None:
+                    logger.error(f"{self.name} feed failed: {feeder.exception()}")
+                feeder.cancel()
+            await self.stop()
+
+
+def ensure_database(path, rollups=None):
+    init_db(path, rollups=rollups or RollupMaintainer())
+
+
+# The writer process of a cluster: commits what the workers forward on
+# write_queue until the None sent by IngestCluster.stop()
+def run_writer(args, write_queue):
+    db_writer = DbWriter(args.db, rollups=RollupMaintainer())
+    try:
+        db_writer.serve(write_queue)
+    except KeyboardInterrupt:
+        pass
+
+
+# One worker process: its own MQTT connection (for alerts, and in share mode
+# for the shared subscriptions), pipeline and rule state; its rows go to the
+# writer process over write_queue
+def run_worker(index, args, partition_queue=None, stop_event=None, write_queue=None):
+    from iot_core.connection import ConnectionManager
+
+    name = f"Ingest worker {index}"
+    if partition_queue is None:
+        topics = [shared_subscription(args.group, topic) for topic in SENSOR_TOPICS]
+    else:
+        topics = []
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port + WORKER_METRICS_OFFSET + index)
+    db_writer = ForwardingDbWriter(args.db, write_queue)
+    rules = RuleEngine.from_file(args.rules)
+    connection = ConnectionManager(client_id=f"{args.group}-{index}", clean_session=args.clean_session, name=name)
+    service = IngestService(connection, db_writer, rules, topics, posture=args.posture, queue_size=args.queue_size,
+                            name=name)
+    try:
+        asyncio.run(service.run_forever(args.broker, args.port, partition_queue, stop_event))
+    except KeyboardInterrupt:
+        pass
+
+
+# N ingest processes that split the stream by device. In fanout mode this
+# process keeps the only subscription and feeds the workers through a
+# Partitioner; in share mode the workers subscribe themselves. Either way
+# they share one writer process, since SQLite takes one writer at a time:
+# with a DbWriter per worker the commits only queued on the file lock.
+class IngestCluster:
+    def __init__(self, args, stats_interval=60.0, write_queue_size=64):
+        self.args = args
+        self.stats_interval = stats_interval
+        self.stop_event = multiprocessing.Event()
+        self.partitioner = Partitioner(args.workers) if args.mode == 'fanout' else None
+        self.write_queue = multiprocessing.Queue(write_queue_size)  # Row batches, workers -> writer
+        self.writer = None
+        self.connection = None
+        self.processes = []
+
+    def start(self):
+        self.writer = multiprocessing.Process(target=run_writer, name="ingest-writer",
+                                              args=(self.args, self.write_queue))
+        self.writer.start()
+        for index in range(self.args.workers):
+            partition_queue = self.partitioner.queues[index] if self.partitioner is not None else None
+            process = multiprocessing.Process(target=run_worker, name=f"ingest-worker-{index}",
+                                              args=(index, self.args, partition_queue, self.stop_event,
+                                                    self.write_queue))
+            process.start()
+            self.processes.append(process)
+
+        if self.partitioner is not None:
+            from iot_core.connection import ConnectionManager
+
+            self.partitioner.start()
+            self.connection = ConnectionManager(client_id=f"{self.args.group}-receiver",
+                                                clean_session=self.args.clean_session, name="Ingest receiver")
+            self.connection.client.on_message = self.partitioner.on_message
+            self.connection.subscribe(SENSOR_TOPICS)
+            self.connection.start(self.args.broker, self.args.port)
+        logger.info(f"Ingest cluster started: {self.args.workers} workers, {self.args.mode} mode")
+
+    def stop(self, timeout=30.0):
+        if self.connection is not None:
+            self.connection.stop()
+        if self.partitioner is not None:
+            self.partitioner.stop()  # Workers drain their queue, then exit
+        else:
+            self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning(f"{process.name} did not stop in time, terminating")
+                process.terminate()
+        self.processes = []
+        # Every worker has forwarded its last batch; the writer commits them and exits
+        if self.writer is not None:
+            self.write_queue.put(None)
+            self.writer.join(timeout)
+            if self.writer.is_alive():
+                logger.warning("ingest-writer did not stop in time, terminating")
+                self.writer.terminate()
+            self.writer = None
+        logger.info(f"Ingest cluster stopped. Stats: {self.stats()}")
+
+    def stats(self):
+        stats = {'workers': self.args.workers, 'mode': self.args.mode,
+                 'alive': sum(process.is_alive() for process in self.processes),
+                 'writer_alive': self.writer is not None and self.writer.is_alive()}
+        if self.partitioner is not None:
+            stats['partitioner'] = self.partitioner.stats()
+        if self.connection is not None:
+            stats['connection'] = self.connection.stats()
+        return stats
+
+    def run_forever(self):
+        self.start()
+        # After the workers are forked, so they do not inherit the socket or
+        # the retention thread; retention runs once, here, for the whole cluster
+        start_metrics_server(self.args.metrics_port)
+        retention = start_retention(self.args)
+        try:
+            while True:
+                time.sleep(self.stats_interval)
+                logger.info(f"Ingest cluster stats: {self.stats()}")
+        finally:
+            if retention is not None:
+                retention.stop()
+            self.stop()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Consolidated MQTT ingest service (persist + analyze).")
+    parser.add_argument('--broker', default='broker.hivemq.com')
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--db', default=db_path)
+    parser.add_argument('--rules', default=DEFAULT_RULES_PATH, help="Alert rules file (JSON)")
+    parser.add_argument('--queue-size', type=int, default=1000, help="Bound of every stage queue")
+    parser.add_argument('--posture', action='store_true', help="Also publish posture transition alerts")
+    parser.add_argument('--workers', type=int, default=1, help="Ingest processes, partitioned by device")
+    parser.add_argument('--mode', choices=['fanout', 'share'], default='fanout',
+                        help="How --workers split the stream: local fanout or MQTT shared subscriptions. "
+                             "With share, per-chair ordering only holds on emulators/local_broker.py, "
+                             "which hashes the device; real brokers round-robin $share groups")
+    parser.add_argument('--group', default='ingest', help="Shared subscription group / client id prefix")
+    parser.add_argument('--metrics-port', type=int, default=9100,
+                        help=f"Serve /metrics on this port (0 to disable); worker i uses port + {WORKER_METRICS_OFFSET} + i")
+    parser.add_argument('--clean-session', action='store_true',
+                        help="Do not ask the broker to keep our session (and queue messages) while disconnected")
+    parser.add_argument('--raw-days', type=float, default=7, help="Keep raw samples this many days (0 = forever)")
+    parser.add_argument('--minute-days', type=float, default=90, help="Keep minute rollups (0 = forever)")
+    parser.add_argument('--retention-hours', type=float, default=24,
+                        help="Hours between retention passes, the first one at startup "
+                             "(0 to disable, e.g. when data_manager.py runs them)")
+    parser.add_argument('--vacuum-convert', action='store_true',
+                        help="On the first retention pass, switch a database created without incremental "
+                             "auto_vacuum over with a one-time full VACUUM (blocks writers while it runs)")
+    return parser.parse_args(argv)
+
+
+# Same policy as data_manager.py; hour rollups are kept forever
+def start_retention(args):
+    if not args.retention_hours:
+        return None
+    policy = RetentionPolicy(raw_days=args.raw_days or None, minute_days=args.minute_days or None, hour_days=None)
+    retention = RetentionEngine(args.db, policy)
+    retention.start(args.retention_hours * 60 * 60, convert=args.vacuum_convert)
+    return retention
+
+
+def start_ingest_service(argv=None):
+    from iot_core.connection import ConnectionManager
+
+    args = parse_args(argv)
+    logger.info(f"Using database at path: {args.db}")
+    rollups = RollupMaintainer()
+    ensure_database(args.db, rollups)
+    if args.workers > 1:
+        try:
+            IngestCluster(args).run_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+    db_writer = DbWriter(args.db, rollups=rollups)
+    rules = RuleEngine.from_file(args.rules)
+    connection = ConnectionManager(client_id=args.group, clean_session=args.clean_session, name="Ingest service")
+    start_metrics_server(args.metrics_port)
+    retention = start_retention(args)
+    service = IngestService(connection, db_writer, rules, posture=args.posture, queue_size=args.queue_size)
+    try:
+        asyncio.run(service.run_forever(args.broker, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if retention is not None:
+            retention.stop()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    start_ingest_service()
@@ -1,29 +1,51 @@
+import os
 import sys
 import random
 from PyQt5.QtWidgets import QApplication, QMainWindow, QLabel, QVBoxLayout, QWidget, QPushButton
 from PyQt5.QtCore import QTimer
 import paho.mqtt.client as mqtt
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from iot_core.devices import DEFAULT_SITE, sensor_topic
+from iot_core.payload_codec import set_topic_format, now_ms
+from iot_core.store_forward import BufferedPublisher, RecordBuffer
+
 broker = 'broker.hivemq.com'
 port = 1883
-topic = "iot/sensors/accelerometer"
+site = DEFAULT_SITE
+device_id = 'chair-1'  # Override with: python Accelerometer.py <device id>
+topic = sensor_topic('accelerometer', device_id, site)
+payload_format = 'text'  # 'text' or 'binary' (see iot_core/payload_codec.py)
+batch_size = 1  # Samples per message; only the binary format can batch
+# Samples published while the broker is unreachable wait here (see iot_core/store_forward.py)
+buffer_dir = os.path.dirname(os.path.abspath(__file__))
+buffer_max_bytes = 4 * 1024 * 1024
 
 class AccelerometerEmulator(QMainWindow):
     def __init__(self):
         super().__init__()
         self.client = mqtt.Client()
-        self.client.connect(broker, port)
+        self.buffer = RecordBuffer(os.path.join(buffer_dir, f'accelerometer_{device_id}.buffer'), buffer_max_bytes)
+        self.publisher = BufferedPublisher(self.client, self.buffer)
+        # connect_async + loop_start: keeps retrying if the broker is down at startup
+        self.client.connect_async(broker, port)
+        self.client.loop_start()
+        self.publisher.start()
+        set_topic_format(topic, payload_format)
+        self.pending_samples = []
         self.initUI()
 
     def initUI(self):
-        self.setWindowTitle('Accelerometer Emulator')
+        self.setWindowTitle(f'Accelerometer Emulator - {device_id}')
         layout = QVBoxLayout()
 
         self.accel_label = QLabel('Tilt Data: Waiting...')
+        self.buffer_label = QLabel('Buffered: 0')
         self.start_button = QPushButton('Start Publishing Data')
         self.start_button.clicked.connect(self.start_publishing)
 
         layout.addWidget(self.accel_label)
+        layout.addWidget(self.buffer_label)
         layout.addWidget(self.start_button)
 
         container = QWidget()
@@ -41,11 +63,31 @@ class AccelerometerEmulator(QMainWindow):
         tilt_y = round(random.uniform(-10.0, 10.0), 2)  
         tilt_z = round(random.uniform(-10.0, 10.0), 2)
         message = f"Tilt X: {tilt_x}, Tilt Y: {tilt_y}, Tilt Z: {tilt_z}"
-        self.client.publish(topic, message)
+        self.pending_samples.append((now_ms(), (tilt_x, tilt_y, tilt_z)))
+        flushed = len(self.pending_samples) >= batch_size
+        if flushed:
+            self.publisher.publish_samples(topic, self.pending_samples)
+            self.pending_samples = []
         self.accel_label.setText(f'Tilt X: {tilt_x}, Y: {tilt_y}, Z: {tilt_z}')
-        print(f'Published: {message}')
+        stats = self.publisher.stats()
+        state = 'online' if stats['connected'] else 'offline'
+        self.buffer_label.setText(f"{state}, buffered: {stats['depth']}, dropped: {stats['dropped']}")
+        if flushed:
+            print(f"Published: {message} ({state}, buffered: {stats['depth']}, dropped: {stats['dropped']})")
+        else:
+            print(f"Queued: {message} ({len(self.pending_samples)}/{batch_size} samples in the next batch)")
+
+    def closeEvent(self, event):
+        self.publisher.stop()
+        self.client.disconnect()
+        self.client.loop_stop()
+        self.buffer.close()
+        super().closeEvent(event)
 
 if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        device_id = sys.argv[1]
+        topic = sensor_topic('accelerometer', device_id, site)
     app = QApplication(sys.argv)
     ex = AccelerometerEmulator()
     ex.show()
@@ -0,0 +1,188 @@
+import os
+import sys
+import argparse
+import heapq
+import json
+import random
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from iot_core.devices import DEFAULT_SITE, LEGACY_PREFIX, sensor_topic
+from iot_core.payload_codec import encode_for_topic, set_topic_format
+from iot_core.loopback_mqtt import LoopbackClient, MQTT_ERR_SUCCESS
+
+# Headless load generator: simulates many chairs, each with accelerometer,
+# pressure and DHT streams, publishing the same payloads as the Qt emulators
+# (Accelerometer.py, Pressure.py, DHT.PY) but without a window per sensor.
+#
+#   python load_generator.py --chairs 2000 --rate 1 --duration 30 --fake
+#   python load_generator.py --chairs 500 --rate 2 --broker localhost --format binary --batch 10
+
+broker = 'localhost'
+port = 1883
+
+site = DEFAULT_SITE
+
+
+# Every chair publishes on its own iot/<site>/chair-<n>/<sensor> topics;
+# legacy=True puts all chairs on the shared iot/sensors/<sensor> topics
+def chair_topics(chairs, sensors, site=site, legacy=False):
+    if legacy:
+        return {(chair, sensor): LEGACY_PREFIX + sensor for chair in range(chairs) for sensor in sensors}
+    return {(chair, sensor): sensor_topic(sensor, f"chair-{chair}", site)
+            for chair in range(chairs) for sensor in sensors}
+
+
+# Same value ranges as the Qt emulators
+def sample_accelerometer(rng):
+    return (round(rng.uniform(-10.0, 10.0), 2), round(rng.uniform(-10.0, 10.0), 2),
+            round(rng.uniform(-10.0, 10.0), 2))
+
+
+def sample_pressure(rng):
+    return rng.randint(40, 100), rng.randint(40, 100)
+
+
+def sample_dht(rng):
+    return round(rng.uniform(20.0, 30.0), 1), round(rng.uniform(30.0, 60.0), 1)
+
+
+SAMPLERS = {
+    'accelerometer': sample_accelerometer,
+    'pressure': sample_pressure,
+    'dht': sample_dht,
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Publish simulated chair sensor data at high rates.")
+    parser.add_argument('--chairs', type=int, default=100, help="Number of virtual chairs")
+    parser.add_argument('--rate', type=float, default=1.0, help="Samples per second per sensor stream")
+    parser.add_argument('--jitter', type=float, default=0.1,
+                        help="Random +/- fraction applied to each sample interval")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds to run")
+    parser.add_argument('--sensors', default='accelerometer,pressure,dht', help="Comma separated streams per chair")
+    parser.add_argument('--format', choices=['text', 'binary'], default='text', help="Payload format")
+    parser.add_argument('--batch', type=int, default=1, help="Samples per message (binary only)")
+    parser.add_argument('--site', default=site, help="Site level of the topics")
+    parser.add_argument('--legacy-topics', action='store_true',
+                        help="Publish every chair on the old iot/sensors/<sensor> topics")
+    parser.add_argument('--broker', default=broker, help="Broker host")
+    parser.add_argument('--port', type=int, default=port, help="Broker port")
+    parser.add_argument('--qos', type=int, default=0, choices=[0, 1])
+    parser.add_argument('--fake', action='store_true', help="Publish to an in-process loopback broker")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--report', help="Write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def make_client(args):
+    if args.fake:
+        client = LoopbackClient()
+    else:
+        import paho.mqtt.client as mqtt
+        client = mqtt.Client()
+        client.max_inflight_messages_set(1000)
+    client.connect(args.broker, args.port)
+    client.loop_start()
+    return client
+
+
+def publish_samples(client, topic, samples, qos):
+    sent = sent_bytes = failed = 0
+    for payload in encode_for_topic(topic, samples):
+        info = client.publish(topic, payload, qos=qos)
+        sent += 1
+        sent_bytes += len(payload)
+        if info.rc != MQTT_ERR_SUCCESS:
+            failed += 1
+    return sent, sent_bytes, failed
+
+
+# Publish until duration elapses. Every (chair, sensor) stream has its own
+# next-due time in a heap, so the cost per sample is O(log streams).
+def run(args, client=None):
+    rng = random.Random(args.seed)
+    sensors = [s.strip() for s in args.sensors.split(',') if s.strip()]
+    batch = max(1, args.batch) if args.format == 'binary' else 1
+    topics = chair_topics(args.chairs, sensors, args.site, args.legacy_topics)
+    for topic in set(topics.values()):
+        set_topic_format(topic, args.format)
+
+    own_client = client is None
+    if own_client:
+        client = make_client(args)
+
+    interval = 1.0 / args.rate
+    start = time.monotonic()
+    end = start + args.duration
+    # Spread the first samples over one interval so the chairs are not in lockstep
+    heap = [(start + rng.uniform(0, interval), chair, sensor) for chair in range(args.chairs) for sensor in sensors]
+    heapq.heapify(heap)
+    pending = {}
+
+    samples = messages = payload_bytes = errors = 0
+    max_lag = 0.0
+    while heap:
+        due, chair, sensor = heap[0]
+        if due >= end:
+            break
+        now = time.monotonic()
+        if due > now:
+            time.sleep(min(due - now, 0.01))
+            continue
+        heapq.heappop(heap)
+        max_lag = max(max_lag, now - due)
+
+        key = (chair, sensor)
+        stream = pending.setdefault(key, [])
+        stream.append((int(time.time() * 1000), SAMPLERS[sensor](rng)))
+        samples += 1
+        if len(stream) >= batch:
+            sent, sent_bytes, failed = publish_samples(client, topics[key], stream, args.qos)
+            messages += sent
+            payload_bytes += sent_bytes
+            errors += failed
+            pending[key] = []
+
+        next_due = due + interval * (1.0 + rng.uniform(-args.jitter, args.jitter))
+        heapq.heappush(heap, (next_due, chair, sensor))
+
+    # Flush partially filled batches
+    for key, stream in pending.items():
+        if stream:
+            sent, sent_bytes, failed = publish_samples(client, topics[key], stream, args.qos)
+            messages += sent
+            payload_bytes += sent_bytes
+            errors += failed
+
+    elapsed = time.monotonic() - start
+    if own_client:
+        client.loop_stop()
+        client.disconnect()
+
+    return {
+        'chairs': args.chairs,
+        'streams': args.chairs * len(sensors),
+        'format': args.format,
+        'batch': batch,
+        'target_samples_per_sec': round(args.chairs * len(sensors) * args.rate, 1),
+        'elapsed_sec': round(elapsed, 3),
+        'samples': samples,
+        'messages': messages,
+        'bytes': payload_bytes,
+        'publish_errors': errors,
+        'samples_per_sec': round(samples / elapsed, 1) if elapsed else 0.0,
+        'messages_per_sec': round(messages / elapsed, 1) if elapsed else 0.0,
+        'bytes_per_sec': round(payload_bytes / elapsed, 1) if elapsed else 0.0,
+        'max_schedule_lag_ms': round(max_lag * 1000, 3),
+    }
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    report = run(args)
+    print(json.dumps(report, indent=2))
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,346 @@
+import os
+import sys
+import argparse
+import asyncio
+import logging
+import struct
+import threading
+from collections import OrderedDict, deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from iot_core.loopback_mqtt import topic_matches
+from iot_core.partitioning import parse_shared_subscription, partition_for, partition_key
+
+# Minimal MQTT 3.1.1 broker for offline benchmarks and tests (a mosquitto
+# stand-in). Supports CONNECT, PUBLISH QoS 0/1, SUBSCRIBE/UNSUBSCRIBE with
+# wildcards, shared subscriptions ($share/<group>/<filter>), retained
+# messages, persistent sessions, PINGREQ and DISCONNECT. QoS 2 publishes are
+# accepted and delivered at QoS 1. It is not meant for production use.
+#
+# A client that connects with clean_session=False keeps its session after it
+# disconnects: its subscriptions stay, QoS 1 messages for it are queued (up to
+# max_queued, oldest dropped first) and unacknowledged ones are resent with
+# the DUP flag when it comes back. Sessions live in memory only, so a broker
+# restart loses them; clients have to resubscribe (iot_core/connection.py does).
+#
+# A shared subscription group receives each message once. The member is
+# picked by hashing the topic's device id (iot_core.partitioning), so
+# all of one device's messages reach the same member while the group is
+# unchanged.
+#
+#   python local_broker.py --port 1883
+
+logger = logging.getLogger(__name__)
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+
+def encode_length(length):
+    out = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        out.append(byte)
+        if not length:
+            return bytes(out)
+
+
+def encode_string(value):
+    data = value.encode() if isinstance(value, str) else value
+    return struct.pack('!H', len(data)) + data
+
+
+def packet(packet_type, flags, body=b''):
+    return bytes([(packet_type << 4) | flags]) + encode_length(len(body)) + body
+
+
+def read_string(data, offset):
+    (length,) = struct.unpack_from('!H', data, offset)
+    offset += 2
+    return data[offset:offset + length], offset + length
+
+
+class Session:
+    def __init__(self, client_id, writer, clean=True, max_queued=10000):
+        self.client_id = client_id
+        self.writer = writer  # None while a persistent session is offline
+        self.clean = clean
+        self.subscriptions = {}  # topic filter -> granted qos
+        self.shared = {}  # (group, topic filter) -> granted qos
+        self.inflight = OrderedDict()  # mid -> (topic, payload), QoS 1 sent but not acknowledged
+        self.queued = deque(maxlen=max_queued)  # (topic, payload, qos) while offline
+        self.dropped = 0
+        self.next_mid = 0
+
+    def mid(self):
+        self.next_mid = self.next_mid % 65535 + 1
+        return self.next_mid
+
+    def send(self, data):
+        if self.writer is not None and not self.writer.is_closing():
+            self.writer.write(data)
+
+
+class LocalBroker:
+    def __init__(self, host='127.0.0.1', port=1883, max_queued=10000):
+        self.host = host
+        self.port = port
+        self.max_queued = max_queued
+        self.sessions = {}
+        self.retained = {}
+        self.messages_in = 0
+        self.messages_out = 0
+        self._server = None
+        self._loop = None
+        self._thread = None
+        self._anon = 0
+
+    # -- routing -----------------------------------------------------------
+    def route(self, topic, payload, qos, retain):
+        self.messages_in += 1
+        if retain:
+            if payload:
+                self.retained[topic] = (payload, qos)
+            else:
+                self.retained.pop(topic, None)
+        groups = {}  # (group, topic filter) -> [(session, qos)]
+        for session in list(self.sessions.values()):
+            granted = None
+            for sub, sub_qos in session.subscriptions.items():
+                if topic_matches(sub, topic):
+                    granted = sub_qos if granted is None else max(granted, sub_qos)
+            if granted is not None:
+                self.deliver(session, topic, payload, min(qos, granted), False)
+            for share, sub_qos in session.shared.items():
+                if topic_matches(share[1], topic):
+                    groups.setdefault(share, []).append((session, sub_qos))
+        for members in groups.values():
+            members.sort(key=lambda member: member[0].client_id)
+            session, sub_qos = members[partition_for(partition_key(topic), len(members))]
+            self.deliver(session, topic, payload, min(qos, sub_qos), False)
+
+    def deliver(self, session, topic, payload, qos, retain):
+        if session.writer is None:
+            # Offline persistent session: keep QoS 1 messages, drop QoS 0
+            if qos:
+                if len(session.queued) == session.queued.maxlen:
+                    session.dropped += 1
+                session.queued.append((topic, payload, qos))
+            return
+        flags = (qos << 1) | (1 if retain else 0)
+        body = encode_string(topic)
+        if qos:
+            mid = session.mid()
+            session.inflight[mid] = (topic, payload)
+            body += struct.pack('!H', mid)
+        session.send(packet(PUBLISH, flags, body + payload))
+        self.messages_out += 1
+
+    # A persistent session is back: resend what was not acknowledged, then
+    # what was queued while it was away
+    def resume(self, session):
+        for mid, (topic, payload) in session.inflight.items():
+            body = encode_string(topic) + struct.pack('!H', mid) + payload
+            session.send(packet(PUBLISH, 0x08 | (1 << 1), body))  # DUP, QoS 1
+            self.messages_out += 1
+        queued = list(session.queued)
+        session.queued.clear()
+        for topic, payload, qos in queued:
+            self.deliver(session, topic, payload, qos, False)
+
+    # -- connection handling -----------------------------------------------
+    async def read_packet(self, reader):
+        first = await reader.readexactly(1)
+        multiplier, length = 1, 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        body = await reader.readexactly(length) if length else b''
+        return first[0] >> 4, first[0] & 0x0F, body
+
+    def handle_connect(self, body, writer):
+        protocol, offset = read_string(body, 0)
+        offset += 1  # protocol level
+        flags = body[offset]
+        offset += 3  # flags + keepalive
+        clean = bool(flags & 0x02)
+        client_id, offset = read_string(body, offset)
+        client_id = client_id.decode()
+        if not client_id:
+            self._anon += 1
+            client_id = f"anon-{self._anon}"
+        old = self.sessions.get(client_id)
+        if old is not None and old.writer is not None:
+            old.writer.close()  # Session takeover
+        if old is not None and not clean and not old.clean:
+            session = old
+            session.writer = writer
+            writer.write(packet(CONNACK, 0, b'\x01\x00'))  # Session present
+            self.resume(session)
+        else:
+            session = Session(client_id, writer, clean, self.max_queued)
+            self.sessions[client_id] = session
+            writer.write(packet(CONNACK, 0, b'\x00\x00'))
+        return session
+
+    def handle_publish(self, session, flags, body):
+        qos = (flags >> 1) & 0x03
+        retain = bool(flags & 0x01)
+        topic, offset = read_string(body, 0)
+        mid = None
+        if qos:
+            (mid,) = struct.unpack_from('!H', body, offset)
+            offset += 2
+        self.route(topic.decode(), body[offset:], min(qos, 1), retain)
+        if qos == 1:
+            session.send(packet(PUBACK, 0, struct.pack('!H', mid)))
+        elif qos == 2:
+            session.send(packet(PUBREC, 0, struct.pack('!H', mid)))
+
+    def handle_subscribe(self, session, body):
+        (mid,) = struct.unpack_from('!H', body, 0)
+        offset = 2
+        granted = []
+        new_filters = []
+        while offset < len(body):
+            sub, offset = read_string(body, offset)
+            qos = min(body[offset], 1)
+            offset += 1
+            try:
+                group, topic_filter = parse_shared_subscription(sub.decode())
+            except ValueError:
+                granted.append(0x80)  # Failure
+                continue
+            if group is not None:
+                # Retained messages are not sent to shared subscriptions
+                session.shared[(group, topic_filter)] = qos
+            else:
+                session.subscriptions[topic_filter] = qos
+                new_filters.append((topic_filter, qos))
+            granted.append(qos)
+        session.send(packet(SUBACK, 0, struct.pack('!H', mid) + bytes(granted)))
+        for sub, qos in new_filters:
+            for topic, (payload, retained_qos) in self.retained.items():
+                if topic_matches(sub, topic):
+                    self.deliver(session, topic, payload, min(qos, retained_qos), True)
+
+    def handle_unsubscribe(self, session, body):
+        (mid,) = struct.unpack_from('!H', body, 0)
+        offset = 2
+        while offset < len(body):
+            sub, offset = read_string(body, offset)
+            try:
+                group, topic_filter = parse_shared_subscription(sub.decode())
+            except ValueError:
+                continue
+            if group is not None:
+                session.shared.pop((group, topic_filter), None)
+            else:
+                session.subscriptions.pop(topic_filter, None)
+        session.send(packet(UNSUBACK, 0, struct.pack('!H', mid)))
+
+    async def handle_client(self, reader, writer):
+        session = None
+        try:
+            while True:
+                packet_type, flags, body = await self.read_packet(reader)
+                if packet_type == CONNECT:
+                    session = self.handle_connect(body, writer)
+                elif session is None:
+                    break
+                elif packet_type == PUBLISH:
+                    self.handle_publish(session, flags, body)
+                elif packet_type == PUBACK:
+                    session.inflight.pop(struct.unpack_from('!H', body, 0)[0], None)
+                elif packet_type == PUBREL:
+                    session.send(packet(PUBCOMP, 0, body[:2]))
+                elif packet_type == SUBSCRIBE:
+                    self.handle_subscribe(session, body)
+                elif packet_type == UNSUBSCRIBE:
+                    self.handle_unsubscribe(session, body)
+                elif packet_type == PINGREQ:
+                    session.send(packet(PINGRESP, 0))
+                elif packet_type == DISCONNECT:
+                    break
+                # PUBREC/PUBCOMP from clients need no action here
+                if writer.transport.get_write_buffer_size() > 1 << 20:
+                    await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            # Only the connection that currently owns the session may end it
+            if session is not None and session.writer is writer and self.sessions.get(session.client_id) is session:
+                if session.clean:
+                    del self.sessions[session.client_id]
+                else:
+                    session.writer = None
+            writer.close()
+
+    # -- lifecycle ---------------------------------------------------------
+    async def serve(self):
+        self._server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        if self.port == 0:
+            self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Local broker listening on {self.host}:{self.port}")
+        return self._server
+
+    # Run in a background thread (for benchmarks and tests)
+    def start(self):
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self.serve())
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="LocalBroker", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self):
+        if self._loop is None:
+            return
+
+        async def shutdown():
+            self._server.close()
+            for session in list(self.sessions.values()):
+                if session.writer is not None:
+                    session.writer.close()
+            await self._server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        self._loop = None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Minimal local MQTT broker for offline testing.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--max-queued', type=int, default=10000,
+                        help="QoS 1 messages kept per offline persistent session")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s : %(levelname)s : %(message)s')
+    broker = LocalBroker(args.host, args.port, args.max_queued)
+
+    async def main():
+        server = await broker.serve()
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,107 @@
+import collections
+
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QTimer, QVariant
+from PyQt5.QtGui import QColor
+from PyQt5.QtWidgets import QListView, QAbstractItemView
+
+DEFAULT_RETENTION = 1000  # Lines kept per log view
+REFRESH_INTERVAL_MS = 100  # Appends are applied to the view at most this often
+
+
+# Fixed-capacity list model for the dock logs. append() only buffers the
+# line; flush() (driven by a timer) moves the pending lines into the ring in
+# one insert and drops the oldest rows past the retention count, so the view
+# repaints once per refresh instead of once per message and memory stays flat.
+class RingBufferModel(QAbstractListModel):
+    def __init__(self, capacity=DEFAULT_RETENTION, parent=None):
+        super().__init__(parent)
+        self.capacity = capacity
+        self.rows = collections.deque()  # (text, color or None)
+        self.pending = []
+        self.appended = 0
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.rows):
+            return QVariant()
+        text, color = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return text
+        if role == Qt.ForegroundRole and color is not None:
+            return QColor(color)
+        return QVariant()
+
+    def append(self, text, color=None):
+        self.pending.append((text, color))
+        self.appended += 1
+        # Lines past the retention count would be dropped on flush anyway
+        if len(self.pending) > self.capacity:
+            del self.pending[:len(self.pending) - self.capacity]
+
+    def flush(self):
+        if not self.pending:
+            return False
+        pending, self.pending = self.pending, []
+
+        overflow = len(self.rows) + len(pending) - self.capacity
+        if overflow > 0:
+            remove = min(overflow, len(self.rows))
+            self.beginRemoveRows(QModelIndex(), 0, remove - 1)
+            for _ in range(remove):
+                self.rows.popleft()
+            self.endRemoveRows()
+
+        first = len(self.rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(pending) - 1)
+        self.rows.extend(pending)
+        self.endInsertRows()
+        return True
+
+    def set_capacity(self, capacity):
+        self.capacity = max(1, capacity)
+        overflow = len(self.rows) - self.capacity
+        if overflow > 0:
+            self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+            for _ in range(overflow):
+                self.rows.popleft()
+            self.endRemoveRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self.rows.clear()
+        self.pending = []
+        self.endResetModel()
+
+    def lines(self):
+        return [text for text, _ in self.rows]
+
+
+# QListView over a RingBufferModel. Only the visible rows are laid out and
+# painted (uniform row heights), and it follows the newest line unless the
+# user has scrolled up.
+class LogView(QListView):
+    def __init__(self, retention=DEFAULT_RETENTION, refresh_interval=REFRESH_INTERVAL_MS, parent=None):
+        super().__init__(parent)
+        self.log_model = RingBufferModel(retention, self)
+        self.setModel(self.log_model)
+        self.setUniformItemSizes(True)
+        self.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+
+        self.refreshTimer = QTimer(self)
+        self.refreshTimer.timeout.connect(self.refresh)
+        self.refreshTimer.start(refresh_interval)
+
+    def append(self, text, color=None):
+        self.log_model.append(text, color)
+
+    def refresh(self):
+        scrollbar = self.verticalScrollBar()
+        follow = scrollbar.value() >= scrollbar.maximum()
+        if self.log_model.flush() and follow:
+            self.scrollToBottom()
+
+    def set_retention(self, retention):
+        self.log_model.set_capacity(retention)
@@ -1,10 +1,30 @@
+import collections
 import logging
 import sqlite3
-from PyQt5.QtWidgets import QApplication, QMainWindow, QDockWidget, QLineEdit, QPushButton, QFormLayout, QWidget, QLabel, QVBoxLayout, QTextEdit
-from PyQt5.QtCore import Qt, QTimer,  QMetaObject, Q_ARG, pyqtSlot
+from PyQt5.QtWidgets import QApplication, QMainWindow, QDockWidget, QLineEdit, QPushButton, QFormLayout, QWidget, QLabel, QVBoxLayout, QComboBox
+from PyQt5.QtCore import Qt, QTimer, pyqtSlot
+import threading
 import time
+import os
 import sys
-import paho.mqtt.client as mqtt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from iot_core.connection import ConnectionManager
+from iot_core.db_tail import DbTail
+from iot_core.db_writer import DbWriter
+from iot_core.devices import ALERT_TOPIC, DeviceRegistry, sensor_subscriptions
+from iot_core.ingest_worker import IngestWorker
+from iot_core.metrics import messages_received, parse_failures, sensor_label, start_metrics_server
+from iot_core.payload_codec import decode_payload, format_text
+from iot_core.posture_engine import PostureEngine
+from iot_core.rollups import RollupMaintainer
+from iot_core.rules import parse_alert
+from iot_core.sensor_fusion import SensorFusion
+from iot_core.sensor_schema import DEFAULT_DEVICE_ID, SENSOR_TABLES, backfill_typed_tables
+from iot_core.storage import init_db
+from log_view import LogView
+from ui_dispatcher import UiDispatcher
+from plot_dock import PlotDock
 
 
 # Setup Logging
@@ -14,33 +34,27 @@ formatter = logging.Formatter('%(asctime)s : %(levelname)s : %(message)s')
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 logger.setLevel(logging.INFO)
+logging.getLogger('iot_core').addHandler(handler)
+logging.getLogger('iot_core').setLevel(logging.INFO)
+for _name in ('ui_dispatcher', 'plot_dock'):
+    logging.getLogger(_name).addHandler(handler)
+    logging.getLogger(_name).setLevel(logging.INFO)
 
 db_path = 'iot_data.db'
-
-def init_db():
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sensor_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            topic TEXT,
-            message TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-def log_to_db(topic, message):
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO sensor_data (topic, message) VALUES (?, ?)", (topic, message))
-        conn.commit()
-        conn.close()
-        logger.info(f"Data logged to database - Topic: {topic}, Message: {message}")
-    except Exception as e:
-        logger.error(f"Error logging to database: {e}")
+db_writer = DbWriter(db_path, rollups=RollupMaintainer())  # Rollups stay complete while the GUI writes
+log_retention = 1000  # Lines kept by each dock's log view
+metrics_port = 9103  # http://127.0.0.1:9103/metrics (None to disable)
+history_minutes = 10  # Newest stored minutes shown in the docks at startup
+history_limit = 600  # Rows per sensor, at most, for that
+tail_interval = 1.0  # Seconds between polls for rows written to the DB by other processes
+same_sample_ms = 5000  # A DB row this close to a live sample with the same values is that sample
+startup_budget_ms = 1000  # Warn when the window takes longer than this to appear
+started_at = time.perf_counter()
+
+def log_to_db(topic, message, values=None, ts_ms=None, device_id=DEFAULT_DEVICE_ID):
+    # Queued; db_writer commits in batches on its own thread
+    if db_writer.write(topic, message, device_id, values, ts_ms):
+        logger.debug(f"Data queued for database - Topic: {topic}, Message: {message}")
 
 # MQTT Client Class
 class Mqtt_client:
@@ -48,75 +62,195 @@ class Mqtt_client:
         self.broker = 'broker.hivemq.com'  # HiveMQ broker
         self.port = 1883
         self.client = None
-        self.connected = False
+        # Reconnects with backoff and resubscribes on its own; created on the
+        # first Connect click and reused (pointed at the new host) after that
+        self.connection = None
         self.main_window = main_window  # Reference to the main window
         self.last_published_message = None  # Store the last published message
+        # Decoding, DB queuing and dock dispatch run on this worker thread;
+        # paho's network thread only enqueues the raw message
+        self.worker = IngestWorker(self.handle_message, name="GuiIngest")
+        # Every chair is stored; the docks show one of them (the first one
+        # seen until another is picked in the status bar)
+        self.devices = DeviceRegistry()
+        self.device_id = None
+        # Rows written to the DB by other processes (the data manager, the
+        # ingest service) keep the docks moving while not connected. A row no
+        # newer than what was already shown for its device and sensor is
+        # skipped. The other processes stamp text payloads with their own
+        # receive time, so a row is also skipped when it has the values of a
+        # live sample within same_sample_ms of it (and a live sample when the
+        # tail showed it first); see is_duplicate().
+        self.tail = DbTail(db_path, self.on_db_rows, interval=tail_interval, name="GuiDbTail")
+        self.shown = {}  # (device_id, sensor) -> deque of recent (source, ts_ms, values)
+        self.lock = threading.Lock()
+
+    @property
+    def connected(self):
+        return self.connection is not None and self.connection.connected
+
+    # Called on paho's network thread; the button is updated on the GUI thread
+    def on_connection_state(self, connected, rc):
+        self.main_window.dispatcher.post('connection', connected)
 
+    def on_message(self, client, userdata, msg):
+        messages_received.inc(sensor=sensor_label(msg.topic))
+        self.worker.submit(msg.topic, msg.payload)
 
-    def on_connect(self, client, userdata, flags, rc):
-        if rc == 0:
-            logger.info(f"Successfully connected to {self.broker}:{self.port}")
-            self.main_window.connectionDock.update_button_color(connected=True)
-        else:
-            logger.error(f"Failed to connect. Returned code={rc}")
-            self.main_window.connectionDock.update_button_color(connected=False)
+    def handle_message(self, topic, payload, received_ms):
+        # Decode once (text or binary); a binary message may carry several samples
+        try:
+            sensor, samples = decode_payload(topic, payload, received_ms)
+        except ValueError as e:
+            parse_failures.inc(sensor=sensor_label(topic))
+            logger.error(f"Error decoding message from {topic}: {e}")
+            return
 
-    def on_message(self, client, userdata, msg):
-        topic = msg.topic
-        payload = msg.payload.decode()
-        logger.info(f"Message received from {topic}: {payload}")
+        if sensor is None:
+            self.dispatch_text(topic, payload.decode(errors='replace'))
+            return
+
+        logger.debug(f"Message received from {topic}: {len(samples)} sample(s)")
+        device, _ = self.devices.resolve(topic)
+        device_id = device.device_id if device is not None else DEFAULT_DEVICE_ID
+        if self.device_id is None:
+            self.device_id = device_id
+            self.main_window.dispatcher.post('device', device_id)
+        shown = device_id == self.device_id
+        with self.lock:
+            for ts_ms, values in samples:
+                # Log data to DB
+                log_to_db(topic, format_text(sensor, values), values, ts_ms, device_id)
+                if self.is_duplicate('live', device_id, sensor, ts_ms, values):
+                    continue  # Already shown from the DB
+                if device is not None:
+                    device.observe(sensor, ts_ms, values)
+                if shown:
+                    self.dispatch_sample(sensor, values, ts_ms)
+
+    # Called on the DB tail thread with new rows (id, device_id, ts_ms, values...)
+    def on_db_rows(self, sensor, rows):
+        with self.lock:
+            for row in rows:
+                device = self.devices.device(row[1])
+                latest = device.latest.get(sensor)
+                if latest is not None and row[2] <= latest[0]:
+                    continue  # Already seen live
+                values = row[3:]
+                if self.is_duplicate('db', row[1], sensor, row[2], values):
+                    continue  # Seen live, stamped by another process
+                device.observe(sensor, row[2], values)
+                if self.device_id is None:
+                    self.device_id = row[1]
+                    self.main_window.dispatcher.post('device', row[1])
+                if row[1] == self.device_id:
+                    self.dispatch_sample(sensor, values, row[2])
+
+    # True when the other source (live or db) showed the same values for this
+    # device and sensor within same_sample_ms; otherwise remembers the sample.
+    # Called with self.lock held.
+    def is_duplicate(self, source, device_id, sensor, ts_ms, values):
+        recent = self.shown.get((device_id, sensor))
+        if recent is None:
+            recent = self.shown[(device_id, sensor)] = collections.deque(maxlen=64)
+        values = tuple(values)
+        for other_source, other_ts, other_values in recent:
+            if other_source != source and other_values == values and abs(other_ts - ts_ms) <= same_sample_ms:
+                return True
+        recent.append((source, ts_ms, values))
+        return False
+
+    # Runs on the history loader thread at startup: migrate rows that predate
+    # the typed tables, replay the last history_minutes of the newest device
+    # into the docks, then follow the DB. The window is already up meanwhile.
+    def load_history(self):
+        started = time.perf_counter()
+        try:
+            conn = sqlite3.connect(db_path)
+            try:
+                backfill_typed_tables(conn)
+            finally:
+                conn.close()
+            # Before the recent rows are read, so nothing written meanwhile is missed
+            self.tail.mark()
+            device_id = self.device_id or self.tail.latest_device()
+            if device_id is not None:
+                if self.device_id is None:
+                    self.device_id = device_id
+                self.main_window.dispatcher.post('device', device_id)
+                recent = {sensor: self.tail.recent(sensor, device_id, history_minutes * 60 * 1000, history_limit)
+                          for sensor in SENSOR_TABLES}
+                samples = []
+                with self.lock:
+                    device = self.devices.device(device_id)
+                    for sensor, rows in recent.items():
+                        latest = device.latest.get(sensor)
+                        for row in rows:
+                            if latest is None or row[2] > latest[0]:
+                                device.observe(sensor, row[2], row[3:])
+                            samples.append((row[2], sensor, row[3:]))
+                samples.sort(key=lambda sample: sample[0])
+                self.main_window.dispatcher.post('history', samples)
+                logger.info(f"Loaded {len(samples)} recent samples of {device_id} in "
+                            f"{(time.perf_counter() - started) * 1000.0:.0f} ms")
+        except sqlite3.Error as e:
+            logger.error(f"Loading history from {db_path} failed: {e}")
+        self.tail.start()
+
+    def dispatch_text(self, topic, payload):
+        logger.debug(f"Message received from {topic}: {payload}")
 
         # Ignore messages that were recently published by this client
-        if topic == "iot/alerts" and payload == self.last_published_message:
-            logger.info("Ignoring message received from the broker as it was recently published by this client.")
+        if topic == ALERT_TOPIC and payload == self.last_published_message:
+            logger.debug("Ignoring message received from the broker as it was recently published by this client.")
             return
 
         # Log data to DB
         log_to_db(topic, payload)
 
-        # Dispatch the updates to the main thread using QMetaObject.invokeMethod
+        # Hand the updates to the main thread; the dispatcher delivers them in
+        # one batch per frame instead of one queued call per message
+        dispatcher = self.main_window.dispatcher
         if "posture" in topic:
-            QMetaObject.invokeMethod(self.main_window.postureDock, "update_posture_data",
-                                    Qt.QueuedConnection, Q_ARG(str, payload))
-        elif "environment" in topic or "dht" in topic:
-            QMetaObject.invokeMethod(self.main_window.environmentDock, "update_environment_data",
-                                    Qt.QueuedConnection, Q_ARG(str, payload))
+            dispatcher.post('posture', payload)
+        elif "environment" in topic:
+            dispatcher.post('environment', payload)
         elif "alerts" in topic:
-            QMetaObject.invokeMethod(self.main_window.alertDock, "show_alert",
-                                    Qt.QueuedConnection, Q_ARG(str, payload), Q_ARG(str, 'good'))
-
-        elif "accelerometer" in topic:
-            QMetaObject.invokeMethod(self.main_window.accelerometerDock, "update_accel_data",
-                                    Qt.QueuedConnection, Q_ARG(str, payload))
-        elif "pressure" in topic:
-            QMetaObject.invokeMethod(self.main_window.pressureDock, "update_pressure_data",
-                                    Qt.QueuedConnection, Q_ARG(str, payload))
-
-
-
+            dispatcher.post('alert', payload, 'good')
+
+    # Sensor samples arrive already decoded, so the docks get typed values
+    def dispatch_sample(self, sensor, values, ts_ms):
+        dispatcher = self.main_window.dispatcher
+        dispatcher.post('plot', sensor, ts_ms, values)
+        if sensor == 'dht':
+            dispatcher.post('environment', format_text(sensor, values))
+        elif sensor == 'accelerometer':
+            dispatcher.post('accelerometer', values[0], values[1], values[2], ts_ms)
+        elif sensor == 'pressure':
+            dispatcher.post('pressure', int(values[0]), int(values[1]), ts_ms)
 
     def publish_message(self, topic, message):
+        if self.client is None:
+            logger.warning(f"Not connected, message to {topic} not published")
+            return
         self.client.publish(topic, message)
         logger.info(f"Published message to {topic}: {message}")
         self.last_published_message = message  # Track the last published message
 
-
     def connect_to_broker(self, broker, port):
         self.broker = broker
         self.port = port
         logger.info(f"Attempting to connect to {broker}:{port}")
-        self.client = mqtt.Client()
-        self.client.on_message = self.on_message
-        self.client.on_connect = self.on_connect
-        self.client.connect(broker, port)
-
-        # Subscribing to the topics
-        self.client.subscribe("iot/sensors/dht")
-        self.client.subscribe("iot/sensors/pressure")
-        self.client.subscribe("iot/sensors/accelerometer")
-        self.client.subscribe("iot/alerts")
-        self.client.loop_start()
-        self.connected = True
+        if self.connection is None:
+            # A viewer, so a clean session: several GUIs can run side by side
+            self.connection = ConnectionManager(name="GUI")
+            self.connection.add_listener(self.on_connection_state)
+            self.client = self.connection.client
+            self.client.on_message = self.on_message
+            # Every device's sensor topics and the alerts
+            self.connection.subscribe(sensor_subscriptions() + [ALERT_TOPIC])
+            self.worker.start()
+        self.connection.start(broker, port)
 
 # Connection Dock
 class ConnectionDock(QDockWidget):
@@ -158,112 +292,94 @@ class PostureDock(QDockWidget):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Posture Monitoring")
-        self.postureLabel = QTextEdit()
-        self.postureLabel.setReadOnly(True)
+        self.postureLabel = LogView(log_retention)
+
+        # Matched/dropped/late counters of the sensor fusion stage
+        self.fusionLabel = QLabel("Fusion: no data")
 
         layout = QVBoxLayout()
         layout.addWidget(self.postureLabel)
+        layout.addWidget(self.fusionLabel)
         widget = QWidget()
         widget.setLayout(layout)
         self.setWidget(widget)
 
-        # Flags and data storage
-        self.is_new_accel_data = False
-        self.is_new_pressure_data = False
+        # Accelerometer and pressure samples are joined by timestamp per device;
+        # the engine then holds the latest fused readings
+        self.fusion = SensorFusion()
+        self.engine = PostureEngine()
+        self.device_id = DEFAULT_DEVICE_ID
         self.current_tilt_x = 0.0
         self.current_tilt_y = 0.0
         self.current_seat_pressure = 0
         self.current_back_pressure = 0
 
         self.previous_alert = None  # Initialize the previous_alert attribute
-
-        # Alert cooldown timer
-        self.alert_timer = QTimer(self)
-        self.alert_timer.setSingleShot(True)
-        self.alert_timer.timeout.connect(self.reset_alert_state)
-        self.alert_cooldown = False
+        self.replaying = False  # Set while stored samples are replayed at startup
 
         logger.info("PostureDock initialized.")
 
-    @pyqtSlot(float, float)
-    def update_accel_data(self, tilt_x, tilt_y):
-        logger.info(f"Accelerometer data received - X: {tilt_x}, Y: {tilt_y}")
-        self.current_tilt_x = tilt_x
-        self.current_tilt_y = tilt_y
-        self.is_new_accel_data = True
-
-        # Check if both accelerometer and pressure data have been updated
-        self.check_and_calculate_posture()
-
-    @pyqtSlot(int, int)
-    def update_pressure_data(self, seat_pressure, back_pressure):
-        logger.info(f"Pressure data received - Seat: {seat_pressure}, Back: {back_pressure}")
-        self.current_seat_pressure = seat_pressure
-        self.current_back_pressure = back_pressure
-        self.is_new_pressure_data = True
-
-        # Check if both accelerometer and pressure data have been updated
-        self.check_and_calculate_posture()
-
-    def check_and_calculate_posture(self):
-        # Only calculate posture if both accelerometer and pressure data have been updated
-        if self.is_new_accel_data and self.is_new_pressure_data:
-            logger.info("Both data sets received, calculating posture.")
-            self.calculate_posture()
-
-            # Reset the flags so that the next round of data can be processed
-            self.is_new_accel_data = False
-            self.is_new_pressure_data = False
-
-    def calculate_posture(self):
+    @pyqtSlot(float, float, float)
+    def update_accel_data(self, tilt_x, tilt_y, ts_ms):
+        logger.debug(f"Accelerometer data received - X: {tilt_x}, Y: {tilt_y}")
+        fused = self.fusion.add(self.device_id, 'accelerometer', int(ts_ms), (tilt_x, tilt_y))
+        self.check_and_calculate_posture(fused)
+
+    @pyqtSlot(int, int, float)
+    def update_pressure_data(self, seat_pressure, back_pressure, ts_ms):
+        logger.debug(f"Pressure data received - Seat: {seat_pressure}, Back: {back_pressure}")
+        fused = self.fusion.add(self.device_id, 'pressure', int(ts_ms), (seat_pressure, back_pressure))
+        self.check_and_calculate_posture(fused)
+
+    @pyqtSlot(str)
+    def update_posture_data(self, data):
+        self.postureLabel.append(data)
+
+    def check_and_calculate_posture(self, fused):
+        # Only calculate posture once an accelerometer and a pressure sample
+        # close enough in time have been joined by the fusion stage
+        stats = self.fusion.stats()
+        self.fusionLabel.setText(
+            f"Fusion: matched {stats['matched']}, dropped {stats['dropped_stale'] + stats['dropped_overflow']}, "
+            f"late {stats['late']}, waiting {stats['pending']}")
+        for sample in fused:
+            logger.debug("Both data sets received, calculating posture.")
+            self.current_tilt_x, self.current_tilt_y = sample.accel[0], sample.accel[1]
+            self.current_seat_pressure, self.current_back_pressure = sample.pressure
+            self.engine.update_accel(sample.device_id, self.current_tilt_x, self.current_tilt_y)
+            self.engine.update_pressure(sample.device_id, self.current_seat_pressure, self.current_back_pressure)
+            self.calculate_posture(sample.ts_ms / 1000.0)
+
+    # now: time of the fused sample in seconds. The engine's cooldown runs on
+    # sample time rather than the wall clock, so replaying stored history at
+    # startup does not leave a fresh cooldown behind it
+    def calculate_posture(self, now):
         # Display the current accelerometer and pressure data
         data_message = (
-            f"Accelerometer Data: X: {self.current_tilt_x}, Y: {self.current_tilt_y}\n"
-            f"Pressure Data: Seat: {self.current_seat_pressure}, Back: {self.current_back_pressure}\n"
+            f"Accelerometer Data: X: {self.current_tilt_x}, Y: {self.current_tilt_y} | "
+            f"Pressure Data: Seat: {self.current_seat_pressure}, Back: {self.current_back_pressure}"
         )
 
         # Append data message to postureLabel without overwriting old data
         self.postureLabel.append(data_message)
 
-        pressure_threshold_absolute = 38
-        pressure_threshold_percent = 20.0  # Percentage difference
-        tilt_threshold_magnitude = 15.0  # Overall tilt magnitude
-
-        # Calculate percentage difference in seat and back pressure
-        avg_pressure = (self.current_seat_pressure + self.current_back_pressure) / 2.0
-        pressure_difference_percent = abs(self.current_seat_pressure - self.current_back_pressure) / avg_pressure * 100
-
-        # Calculate tilt magnitude from X, Y, and Z components
-        tilt_magnitude = (self.current_tilt_x**2 + self.current_tilt_y**2 )**0.5
-
-        # Posture evaluation logic: determine bad or good posture
-        bad_posture = (
-            abs(self.current_seat_pressure - self.current_back_pressure) > pressure_threshold_absolute or
-            pressure_difference_percent > pressure_threshold_percent or
-            tilt_magnitude > tilt_threshold_magnitude
-        )
-
-        # Always trigger an alert regardless of whether the posture has changed
-        if bad_posture:
-            self.trigger_alert("Bad posture detected!", alert_type='bad')
-            self.previous_alert = "bad"
-        else:
-            self.trigger_alert("Good posture!", alert_type='good')
-            self.previous_alert = "good"
-
-
+        # The engine smooths the readings and applies hysteresis, debounce and
+        # cooldown, so an alert is only raised when the posture state changes
+        for device_id, bad_posture in self.engine.evaluate_transitions(now):
+            if self.replaying:
+                # Only the state is restored; the past raises no alerts
+                self.previous_alert = "bad" if bad_posture else "good"
+            elif bad_posture:
+                self.trigger_alert("Bad posture detected!", alert_type='bad')
+                self.previous_alert = "bad"
+            else:
+                self.trigger_alert("Good posture!", alert_type='good')
+                self.previous_alert = "good"
 
     def trigger_alert(self, message, alert_type):
         logger.info(f"Triggering alert: {message}")
-
-        # Always send the alert if new data is received, even if it's the same posture
-        self.previous_alert_time = time.time()  # Add a timestamp to track when the last alert was sent
         self.parent().alertDock.show_alert(message, alert_type=alert_type)
-        self.parent().mc.publish_message("iot/alerts", message)
-
-
-    def reset_alert_state(self):
-        self.alert_cooldown = False
+        self.parent().mc.publish_message(ALERT_TOPIC, message)
 
 
 # Environmental Monitoring Dock
@@ -286,8 +402,7 @@ class AccelerometerDock(QDockWidget):
     def __init__(self, main_window):
         super().__init__()
         self.setWindowTitle("Accelerometer Monitoring")
-        self.accelLabel = QTextEdit()
-        self.accelLabel.setReadOnly(True)
+        self.accelLabel = LogView(log_retention)
 
         layout = QVBoxLayout()
         layout.addWidget(self.accelLabel)
@@ -297,34 +412,25 @@ class AccelerometerDock(QDockWidget):
 
         self.main_window = main_window
 
-    @pyqtSlot(str)  # Ensure the method is marked as a slot and accepts a string argument
-    def update_accel_data(self, data: str):
-        try:
-            tilt_x = float(data.split("Tilt X: ")[1].split(",")[0])
-            tilt_y = float(data.split("Tilt Y: ")[1].split(",")[0])
-            tilt_z = float(data.split("Tilt Z: ")[1].split(",")[0])
-
-            # Append new data instead of replacing old data
-            new_data = f"X: {tilt_x}, Y: {tilt_y}, Z: {tilt_z}\n"
-            self.accelLabel.append(new_data)
-
-            # Pass data to PostureDock
-            self.main_window.postureDock.update_accel_data(tilt_x, tilt_y)
-        except (ValueError, IndexError) as e:
-            logger.error(f"Error parsing accelerometer data: {e}")
-
-
-
+    @pyqtSlot(float, float, float, float)  # Values arrive already decoded by Mqtt_client
+    def update_accel_data(self, tilt_x, tilt_y, tilt_z, ts_ms):
+        # Append new data instead of replacing old data
+        new_data = f"X: {tilt_x}, Y: {tilt_y}, Z: {tilt_z}"
+        self.accelLabel.append(new_data)
 
+        # Pass data to PostureDock
+        self.main_window.postureDock.update_accel_data(tilt_x, tilt_y, ts_ms)
 
+    def update_accel_batch(self, samples):
+        for tilt_x, tilt_y, tilt_z, ts_ms in samples:
+            self.update_accel_data(tilt_x, tilt_y, tilt_z, ts_ms)
 
 
 class PressureDock(QDockWidget):
     def __init__(self, main_window):
         super().__init__()
         self.setWindowTitle("Pressure Monitoring")
-        self.pressureLabel = QTextEdit()
-        self.pressureLabel.setReadOnly(True)
+        self.pressureLabel = LogView(log_retention)
 
         layout = QVBoxLayout()
         layout.addWidget(self.pressureLabel)
@@ -334,34 +440,25 @@ class PressureDock(QDockWidget):
 
         self.main_window = main_window
 
-    @pyqtSlot(str)  # Added this decorator
-    def update_pressure_data(self, data: str):
-        try:
-            # Parse the string data (coming from the MQTT message payload)
-            seat_pressure_str = data.split("Seat Pressure: ")[1].split(",")[0].strip()
-            back_pressure_str = data.split("Back Pressure: ")[1].strip()
-
-            seat_pressure = int(seat_pressure_str)
-            back_pressure = int(back_pressure_str)
-
-            # Append new pressure data without overwriting old data
-            new_data = f"Seat: {seat_pressure}, Back: {back_pressure}\n"
-            self.pressureLabel.append(new_data)
-
-            # Pass the data to PostureDock
-            self.main_window.postureDock.update_pressure_data(seat_pressure, back_pressure)
-        except (ValueError, IndexError) as e:
-            logger.error(f"Error parsing pressure data: {e}")
+    @pyqtSlot(int, int, float)  # Values arrive already decoded by Mqtt_client
+    def update_pressure_data(self, seat_pressure, back_pressure, ts_ms):
+        # Append new pressure data without overwriting old data
+        new_data = f"Seat: {seat_pressure}, Back: {back_pressure}"
+        self.pressureLabel.append(new_data)
 
+        # Pass the data to PostureDock
+        self.main_window.postureDock.update_pressure_data(seat_pressure, back_pressure, ts_ms)
 
+    def update_pressure_batch(self, samples):
+        for seat_pressure, back_pressure, ts_ms in samples:
+            self.update_pressure_data(seat_pressure, back_pressure, ts_ms)
 
 
 class AlertDock(QDockWidget):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Alerts")
-        self.alertBox = QTextEdit()
-        self.alertBox.setReadOnly(True)
+        self.alertBox = LogView(log_retention)
 
         layout = QVBoxLayout()
         layout.addWidget(self.alertBox)
@@ -371,16 +468,18 @@ class AlertDock(QDockWidget):
 
     @pyqtSlot(str, str)  # Ensure that it accepts both message and alert_type
     def show_alert(self, message: str, alert_type: str = 'good'):
-        color = "red" if alert_type == 'bad' else "green"
-        alert_message = f"<p style='color:{color};'>Alert: {message}</p>"
-        self.alertBox.append(alert_message)
-
-
+        # Rule alerts carry their own colour (see iot_core/rules.py); the list
+        # shows plain text, so the markup becomes the row colour
+        message, color = parse_alert(message)
+        if color is None:
+            color = "red" if alert_type == 'bad' else "green"
+        self.alertBox.append(f"Alert: {message}", color)
 
 
 class MainWindow(QMainWindow):
     def __init__(self, parent=None):
         super().__init__(parent)
+        self.dispatcher = UiDispatcher(parent=self)
         self.mc = Mqtt_client(self)
 
         self.postureDock = PostureDock()
@@ -390,6 +489,7 @@ class MainWindow(QMainWindow):
         self.accelerometerDock = AccelerometerDock(self)  # Pass main_window reference
         self.pressureDock = PressureDock(self)            # Pass main_window reference
         self.alertDock = AlertDock()
+        self.plotDock = PlotDock(device_id=None)  # History is loaded once a device is picked
 
         # Set up the main window layout
         self.setGeometry(100, 100, 800, 600)
@@ -402,12 +502,124 @@ class MainWindow(QMainWindow):
         self.addDockWidget(Qt.BottomDockWidgetArea, self.accelerometerDock)
         self.addDockWidget(Qt.BottomDockWidgetArea, self.pressureDock)
         self.addDockWidget(Qt.BottomDockWidgetArea, self.alertDock)
-
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.plotDock)
+
+        # Handlers are looked up on every delivery so docks can be swapped
+        self.dispatcher.register('accelerometer', lambda batch: self.accelerometerDock.update_accel_batch(batch))
+        self.dispatcher.register('pressure', lambda batch: self.pressureDock.update_pressure_batch(batch))
+        self.dispatcher.register('posture', lambda batch: [self.postureDock.update_posture_data(*args) for args in batch])
+        self.dispatcher.register('alert', lambda batch: [self.alertDock.show_alert(*args) for args in batch])
+        self.dispatcher.register('plot', lambda batch: self.plotDock.add_samples(batch))
+        self.dispatcher.register('history', lambda batch: [self.show_history(*args) for args in batch])
+        self.dispatcher.register('device', lambda batch: self.show_device(batch[-1][0]), latest_only=True)
+        self.dispatcher.register('connection', lambda batch: self.connectionDock.update_button_color(batch[-1][0]),
+                                 latest_only=True)
+        # The label only ever shows the newest reading
+        self.dispatcher.register('environment', lambda batch: self.environmentDock.update_environment_data(*batch[-1]),
+                                 latest_only=True)
+
+        # Chair shown in the docks; the list grows as devices appear
+        self.deviceBox = QComboBox()
+        self.deviceBox.currentTextChanged.connect(self.show_device)
+        self.statusBar().addPermanentWidget(QLabel("Device"))
+        self.statusBar().addPermanentWidget(self.deviceBox)
+        # Ingest lag indicator: messages waiting for the worker, how long the
+        # oldest has waited, and rows waiting for the DB writer
+        self.ingestLabel = QLabel("Ingest: idle")
+        self.statusBar().addPermanentWidget(self.ingestLabel)
+        # UI responsiveness: time spent applying a frame's updates, updates
+        # still buffered, and how late the frame timer fired
+        self.uiLabel = QLabel("UI: idle")
+        self.statusBar().addPermanentWidget(self.uiLabel)
+        self.ingestTimer = QTimer(self)
+        self.ingestTimer.timeout.connect(self.update_ingest_status)
+        self.ingestTimer.start(1000)
+
+        self.first_shown_ms = None
         logger.info("Main window initialized with all docks.")
 
+    def show_device(self, device_id):
+        if not device_id:
+            return
+        if self.deviceBox.findText(device_id) < 0:
+            self.deviceBox.addItem(device_id)
+        self.deviceBox.setCurrentText(device_id)
+        if device_id == self.plotDock.device_id and device_id == self.mc.device_id:
+            return
+        logger.info(f"Showing device {device_id}")
+        self.mc.device_id = device_id
+        self.postureDock.device_id = device_id
+        self.plotDock.set_device(device_id, db_path)
+
+    # Stored samples [(ts_ms, sensor, values), ...] in time order, shown like
+    # live ones except on the plot, which loads its own history
+    def show_history(self, samples):
+        self.postureDock.replaying = True
+        try:
+            for ts_ms, sensor, values in samples:
+                if sensor == 'accelerometer':
+                    self.accelerometerDock.update_accel_data(values[0], values[1], values[2], ts_ms)
+                elif sensor == 'pressure':
+                    self.pressureDock.update_pressure_data(int(values[0]), int(values[1]), ts_ms)
+                elif sensor == 'dht':
+                    self.environmentDock.update_environment_data(format_text(sensor, values))
+        finally:
+            self.postureDock.replaying = False
+
+    def start_history(self):
+        threading.Thread(target=self.mc.load_history, name="HistoryLoader", daemon=True).start()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.first_shown_ms is None:
+            self.first_shown_ms = (time.perf_counter() - started_at) * 1000.0
+            log = logger.warning if self.first_shown_ms > startup_budget_ms else logger.info
+            log(f"Window shown {self.first_shown_ms:.0f} ms after start (budget {startup_budget_ms} ms)")
+
+    def update_ingest_status(self):
+        if len(self.mc.devices) != self.deviceBox.count():
+            for device in self.mc.devices.devices():
+                if self.deviceBox.findText(device.device_id) < 0:
+                    self.deviceBox.addItem(device.device_id)
+
+        if self.mc.connection is not None:
+            conn = self.mc.connection.stats()
+            last = conn['last_reconnect_ms']
+            self.connectionDock.eConnectButton.setToolTip(
+                f"Up {conn['session_uptime_sec']:.0f} s, {conn['disconnects']} disconnects, "
+                f"last reconnect {'-' if last is None else f'{last:.0f} ms'}")
+
+        stats = self.mc.worker.stats()
+        lag_ms = stats['lag_ms']
+        self.ingestLabel.setText(
+            f"Ingest: queue {stats['queue_depth']}, lag {lag_ms:.0f} ms, dropped {stats['dropped']}, "
+            f"DB queue {db_writer.stats()['queue_depth']}, DB tail {self.mc.tail.rows} rows")
+        self.ingestLabel.setStyleSheet("color: red" if lag_ms > 1000 else "")
+
+        ui = self.dispatcher.stats()
+        self.uiLabel.setText(
+            f"UI: frame {ui['last_frame_ms']:.1f} ms (max {ui['max_frame_ms']:.1f}), "
+            f"pending {ui['pending']}, loop lag {ui['loop_lag_ms']:.0f} ms")
+        self.uiLabel.setStyleSheet("color: red" if ui['loop_lag_ms'] > 100 else "")
+
+    def closeEvent(self, event):
+        self.ingestTimer.stop()
+        self.dispatcher.timer.stop()
+        if self.mc.connection is not None:
+            self.mc.connection.stop()
+        self.mc.worker.stop()
+        self.mc.tail.stop()
+        super().closeEvent(event)
+
 if __name__ == "__main__":
-    init_db()  # Initialize the database
+    # Only what has to exist before the window opens; the backfill of old
+    # rows runs on the history loader thread (see Mqtt_client.load_history)
+    init_db(db_path, backfill=False)
+    db_writer.start()
+    start_metrics_server(metrics_port)
     app = QApplication(sys.argv)
     mainwin = MainWindow()
     mainwin.show()
+    mainwin.start_history()  # Recent samples, the plot's week of history, then the DB tail
     app.exec_()
+    db_writer.stop()  # Commit whatever is still queued
@@ -0,0 +1,223 @@
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import numpy as np
+from PyQt5.QtWidgets import QDockWidget, QWidget, QVBoxLayout, QHBoxLayout, QComboBox, QLabel, QSizePolicy
+from PyQt5.QtGui import QPainter, QPen, QColor, QPolygonF
+from PyQt5.QtCore import Qt, QRectF, pyqtSignal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from iot_core.sensor_schema import SENSOR_TABLES, DEFAULT_DEVICE_ID
+from iot_core.time_series import TimeSeries, load_series
+
+logger = logging.getLogger(__name__)
+
+MINUTE_MS = 60 * 1000
+RANGES = [
+    ("5 minutes", 5 * MINUTE_MS),
+    ("1 hour", 60 * MINUTE_MS),
+    ("1 day", 24 * 60 * MINUTE_MS),
+    ("1 week", 7 * 24 * 60 * MINUTE_MS),
+]
+HISTORY_MS = RANGES[-1][1]
+
+# (title, sensor, columns to draw, colors)
+PANELS = [
+    ("Tilt", 'accelerometer', [0, 1, 2], ['#d62728', '#2ca02c', '#1f77b4']),
+    ("Pressure", 'pressure', [0, 1], ['#9467bd', '#ff7f0e']),
+    ("Temperature", 'dht', [0], ['#8c564b']),
+]
+
+
+# Copy pixel coordinates straight into a QPolygonF's buffer (x, y doubles)
+def _polyline(xs, ys):
+    polygon = QPolygonF(len(xs))
+    buffer = polygon.data()
+    buffer.setsize(len(xs) * 16)
+    points = np.frombuffer(buffer, dtype=np.float64).reshape(len(xs), 2)
+    points[:, 0] = xs
+    points[:, 1] = ys
+    return polygon
+
+
+# Custom-painted strip charts. Every paint only looks at the visible time
+# range of each TimeSeries and draws at most ~2 points per horizontal pixel
+# (min/max or LTTB), so a week of history costs the same as five minutes.
+class PlotWidget(QWidget):
+    rendered = pyqtSignal()
+
+    def __init__(self, series, parent=None):
+        super().__init__(parent)
+        self.series = series  # sensor -> TimeSeries
+        self.span_ms = RANGES[0][1]
+        self.method = 'minmax'
+        self.last_render_ms = 0.0
+        self.points_in_range = 0
+        self.points_drawn = 0
+        self.setMinimumHeight(240)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+
+    def end_ms(self):
+        # Follow the newest sample, so replayed or old data is still visible
+        latest = [s.last_ts() for s in self.series.values() if len(s)]
+        return max(latest) + 1 if latest else int(time.time() * 1000)
+
+    def paintEvent(self, event):
+        started = time.perf_counter()
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), Qt.white)
+        end = self.end_ms()
+        start = end - self.span_ms
+        max_points = max(2, 2 * self.width())
+
+        self.points_in_range = 0
+        self.points_drawn = 0
+        height = self.height() / len(PANELS)
+        for i, (title, sensor, columns, colors) in enumerate(PANELS):
+            rect = QRectF(50, i * height + 18, max(1, self.width() - 60), max(1, height - 30))
+            self.draw_panel(painter, rect, title, self.series[sensor], columns, colors, start, end, max_points)
+        painter.end()
+        self.last_render_ms = (time.perf_counter() - started) * 1000.0
+        self.rendered.emit()
+
+    def draw_panel(self, painter, rect, title, series, columns, colors, start, end, max_points):
+        painter.setPen(QPen(QColor('#999999')))
+        painter.drawRect(rect)
+        painter.setPen(QPen(Qt.black))
+        painter.drawText(QRectF(rect.left(), rect.top() - 16, rect.width(), 14), Qt.AlignLeft, title)
+
+        ts, _ = series.window(start, end)
+        self.points_in_range += len(ts) * len(columns)
+        if not len(ts):
+            return
+        lines = series.downsampled(start, end, max_points, self.method, columns)
+        lo = min(np.nanmin(y) for _, y in lines)
+        hi = max(np.nanmax(y) for _, y in lines)
+        if hi - lo < 1e-9:
+            lo, hi = lo - 1.0, hi + 1.0
+
+        painter.drawText(QRectF(0, rect.top(), 46, 14), Qt.AlignRight, f"{hi:.1f}")
+        painter.drawText(QRectF(0, rect.bottom() - 14, 46, 14), Qt.AlignRight, f"{lo:.1f}")
+
+        painter.setRenderHint(QPainter.Antialiasing, False)
+        x_scale = rect.width() / float(end - start)
+        y_scale = rect.height() / (hi - lo)
+        for (x, y), color in zip(lines, colors):
+            xs = rect.left() + (x - start) * x_scale
+            ys = rect.bottom() - (y - lo) * y_scale
+            painter.setPen(QPen(QColor(color), 1))
+            painter.drawPolyline(_polyline(xs, ys))
+            self.points_drawn += len(x)
+
+
+class PlotDock(QDockWidget):
+    historyLoaded = pyqtSignal(object, object)  # (device_id, {sensor: TimeSeries}), from the loader thread
+
+    def __init__(self, device_id=DEFAULT_DEVICE_ID):
+        super().__init__()
+        self.setWindowTitle("Sensor Trends")
+        self.device_id = device_id
+        self.series = {sensor: TimeSeries(columns) for sensor, (_, columns) in SENSOR_TABLES.items()}
+
+        self.plot = PlotWidget(self.series)
+        self.plot.rendered.connect(self.update_render_label)
+        self.rangeBox = QComboBox()
+        for label, _ in RANGES:
+            self.rangeBox.addItem(label)
+        self.rangeBox.currentIndexChanged.connect(self.set_range)
+        self.methodBox = QComboBox()
+        self.methodBox.addItems(['minmax', 'lttb'])
+        self.methodBox.currentTextChanged.connect(self.set_method)
+        self.renderLabel = QLabel("No data")
+
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel("Range"))
+        controls.addWidget(self.rangeBox)
+        controls.addWidget(QLabel("Downsampling"))
+        controls.addWidget(self.methodBox)
+        controls.addStretch()
+        controls.addWidget(self.renderLabel)
+
+        layout = QVBoxLayout()
+        layout.addLayout(controls)
+        layout.addWidget(self.plot)
+        widget = QWidget()
+        widget.setLayout(layout)
+        self.setWidget(widget)
+        self.historyLoaded.connect(self.merge_history)
+
+    def set_range(self, index):
+        self.plot.span_ms = RANGES[index][1]
+        self.refresh()
+
+    def set_method(self, method):
+        self.plot.method = method
+        self.refresh()
+
+    def refresh(self):
+        self.plot.update()
+
+    def update_render_label(self):
+        self.renderLabel.setText(
+            f"{self.plot.points_drawn} of {self.plot.points_in_range} points in {self.plot.last_render_ms:.1f} ms")
+
+    # Live samples from the UI dispatcher: [(sensor, ts_ms, values), ...]
+    def add_samples(self, batch):
+        grouped = {}
+        for sensor, ts_ms, values in batch:
+            grouped.setdefault(sensor, ([], []))
+            grouped[sensor][0].append(ts_ms)
+            grouped[sensor][1].append(values)
+        for sensor, (ts, values) in grouped.items():
+            series = self.series.get(sensor)
+            if series is not None:
+                series.extend(ts, values)
+        self.refresh()
+
+    # Show another device: drop the current series and reload its history
+    def set_device(self, device_id, db_path=None):
+        if device_id == self.device_id:
+            return
+        self.device_id = device_id
+        for sensor, (_, columns) in SENSOR_TABLES.items():
+            self.series[sensor] = TimeSeries(columns)
+        if db_path is not None:
+            self.load_history(db_path)
+        self.refresh()
+
+    # Seed the series with up to a week of stored samples. The rows are read
+    # on a background thread, so a large database never holds up the window.
+    def load_history(self, db_path, span_ms=HISTORY_MS):
+        threading.Thread(target=self._load_history, args=(db_path, self.device_id, span_ms),
+                         name="PlotHistory", daemon=True).start()
+
+    def _load_history(self, db_path, device_id, span_ms):
+        started = time.perf_counter()
+        start_ms = int(time.time() * 1000) - span_ms
+        conn = sqlite3.connect(db_path)
+        try:
+            loaded = {sensor: load_series(conn, sensor, device_id, start_ms) for sensor in self.series}
+        except sqlite3.Error as e:
+            logger.error(f"Loading plot history of {device_id} failed: {e}")
+            return
+        finally:
+            conn.close()
+        counts = {sensor: len(series) for sensor, series in loaded.items()}
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        logger.info(f"Loaded plot history of {device_id} in {elapsed_ms:.0f} ms: {counts}")
+        self.historyLoaded.emit(device_id, loaded)
+
+    # On the GUI thread. Only the stored samples older than the first live
+    # sample are added, so nothing is plotted twice.
+    def merge_history(self, device_id, loaded):
+        if device_id != self.device_id:
+            return  # Another device was picked while loading
+        for sensor, history in loaded.items():
+            series = self.series[sensor]
+            ts, values = history.window(None, series.first_ts())
+            series.extend(ts, values)
+        self.refresh()
@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+
+from PyQt5.QtCore import QObject, QTimer
+
+logger = logging.getLogger(__name__)
+
+FRAME_INTERVAL_MS = 16  # ~60 deliveries per second
+
+
+# Coalescing bridge from worker threads to the Qt main thread.
+# Instead of one queued invokeMethod per message, post() appends the update
+# to a per-channel buffer under a lock, and a timer in the main thread
+# delivers everything buffered once per frame as a single batch:
+# handler(list of argument tuples). Channels registered with latest_only=True
+# keep just the newest update (e.g. a label that only shows the last value).
+#
+# Metrics: how long each delivery took (frame time), how many updates are
+# buffered, how many were coalesced away, and how late the frame timer fired,
+# which grows when the Qt event queue is backed up.
+class UiDispatcher(QObject):
+    def __init__(self, interval_ms=FRAME_INTERVAL_MS, parent=None):
+        super().__init__(parent)
+        self.interval_ms = interval_ms
+        self.lock = threading.Lock()
+        self.handlers = {}  # channel -> (handler, latest_only)
+        self.buffers = {}  # channel -> [args, ...]
+
+        self.posted = 0
+        self.delivered = 0
+        self.coalesced = 0
+        self.frames = 0
+        self.last_frame_ms = 0.0
+        self.max_frame_ms = 0.0
+        self.total_frame_ms = 0.0
+        self.loop_lag_ms = 0.0
+        self.max_loop_lag_ms = 0.0
+        self._last_tick = None
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.deliver)
+        self.timer.start(interval_ms)
+
+    def register(self, channel, handler, latest_only=False):
+        with self.lock:
+            self.handlers[channel] = (handler, latest_only)
+            self.buffers.setdefault(channel, [])
+
+    # Thread-safe; called from any thread
+    def post(self, channel, *args):
+        with self.lock:
+            buffer = self.buffers[channel]
+            if self.handlers[channel][1] and buffer:
+                buffer[0] = args
+                self.coalesced += 1
+            else:
+                buffer.append(args)
+            self.posted += 1
+
+    def pending(self):
+        with self.lock:
+            return sum(len(buffer) for buffer in self.buffers.values())
+
+    # Runs in the main thread on every frame tick
+    def deliver(self):
+        now = time.perf_counter()
+        if self._last_tick is not None:
+            self.loop_lag_ms = max(0.0, (now - self._last_tick) * 1000.0 - self.interval_ms)
+            self.max_loop_lag_ms = max(self.max_loop_lag_ms, self.loop_lag_ms)
+        self._last_tick = now
+
+        with self.lock:
+            ready = [(channel, buffer) for channel, buffer in self.buffers.items() if buffer]
+            for channel, _ in ready:
+                self.buffers[channel] = []
+        if not ready:
+            return
+
+        for channel, batch in ready:
+            handler = self.handlers[channel][0]
+            try:
+                handler(batch)
+            except Exception as e:
+                logger.error(f"UI update for {channel} failed: {e}")
+            self.delivered += len(batch)
+
+        elapsed_ms = (time.perf_counter() - now) * 1000.0
+        self.frames += 1
+        self.last_frame_ms = elapsed_ms
+        self.total_frame_ms += elapsed_ms
+        self.max_frame_ms = max(self.max_frame_ms, elapsed_ms)
+
+    def stats(self):
+        return {
+            'pending': self.pending(),
+            'posted': self.posted,
+            'delivered': self.delivered,
+            'coalesced': self.coalesced,
+            'frames': self.frames,
+            'last_frame_ms': round(self.last_frame_ms, 3),
+            'max_frame_ms': round(self.max_frame_ms, 3),
+            'avg_frame_ms': round(self.total_frame_ms / self.frames, 3) if self.frames else 0.0,
+            'loop_lag_ms': round(self.loop_lag_ms, 1),
+            'max_loop_lag_ms': round(self.max_loop_lag_ms, 1),
+        }
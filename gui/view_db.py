@@ -1,16 +1,73 @@
+import os
+import sys
+import argparse
 import sqlite3
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from iot_core.sensor_query import ensure_indexes, ms_to_timestamp, parse_time, query_range
+from iot_core.sensor_schema import SENSOR_TABLES, sensor_for_topic
+from iot_core.rollups import PERIODS, POSTURE_FIELD, POSTURE_SENSOR, query_rollups
+
 db_path = 'iot_data.db'
 
-def view_data():
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM sensor_data")
-    rows = cursor.fetchall()
-    
-    for row in rows:
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Browse stored sensor history page by page.")
+    parser.add_argument('--db', default=db_path, help="Path to the SQLite database")
+    parser.add_argument('--topic', help="Topic to show, e.g. iot/home/chair-1/dht or iot/sensors/dht (default: all raw rows)")
+    parser.add_argument('--device', help="Device id (sensor topics only)")
+    parser.add_argument('--start', help="Start time, epoch ms or 'YYYY-MM-DD HH:MM:SS' UTC (inclusive)")
+    parser.add_argument('--end', help="End time, epoch ms or 'YYYY-MM-DD HH:MM:SS' UTC (exclusive)")
+    parser.add_argument('--limit', type=int, default=50, help="Rows per page (default 50)")
+    parser.add_argument('--after', help="Resume after this cursor (printed at the end of each page)")
+    parser.add_argument('--newest-first', action='store_true', help="Page backwards from the newest row")
+    parser.add_argument('--raw', action='store_true', help="Show raw sensor_data rows even for sensor topics")
+    parser.add_argument('--rollup', choices=list(PERIODS),
+                        help="Show per-minute/hour aggregates instead of rows (topic may also be 'posture')")
+    parser.add_argument('--field', help="Field to aggregate, e.g. temperature (default: the sensor's first field)")
+    return parser.parse_args(argv)
+
+
+# Rollup buckets: (bucket time, count, min, max, mean); for 'posture' the mean
+# is the share of bad-posture evaluations in the bucket
+def view_rollups(conn, args):
+    sensor = POSTURE_SENSOR if args.topic == POSTURE_SENSOR else sensor_for_topic(args.topic or '')
+    if sensor is None:
+        raise SystemExit("--rollup needs a sensor topic or 'posture'")
+    field = args.field or (POSTURE_FIELD if sensor == POSTURE_SENSOR else SENSOR_TABLES[sensor][1][0])
+    rows = query_rollups(conn, sensor, field, args.rollup, args.device, parse_time(args.start), parse_time(args.end))
+    for bucket_ms, count, lo, hi, mean in rows:
+        print((ms_to_timestamp(bucket_ms), count, lo, hi, round(mean, 3)))
+
+
+def view_data(argv=None):
+    args = parse_args(argv)
+    after = None
+    if args.after:
+        order_value, row_id = args.after.rsplit('|', 1)
+        after = (int(order_value) if order_value.isdigit() else order_value, int(row_id))
+
+    conn = sqlite3.connect(args.db)
+    ensure_indexes(conn)
+    if args.rollup:
+        view_rollups(conn, args)
+        conn.close()
+        return
+
+    last = None
+    count = 0
+    for row in query_range(conn, args.topic, args.device, args.start, args.end, args.limit,
+                           after, args.newest_first, args.raw):
         print(row)
-    
+        last = row
+        count += 1
+
+    # Raw rows are (id, topic, message, timestamp); typed rows are (id, device_id, ts_ms, ...)
+    if last is not None and count == args.limit:
+        is_raw = args.raw or sensor_for_topic(args.topic or '') is None
+        order_value = last[3] if is_raw else last[2]
+        print(f"-- next page: --after '{order_value}|{last[0]}'")
+
     conn.close()
 
 if __name__ == "__main__":
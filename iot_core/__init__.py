@@ -0,0 +1,8 @@
+# Shared, Qt-free building blocks used by the data manager, the analyzer,
+# the GUI and the emulators.
+#
+# Importing a module here stays cheap: numpy (posture engine, time series,
+# analytics), paho (connection), pyarrow (export) and http.server (metrics
+# endpoint) are only loaded by the modules, or at the call sites, that use
+# them, so a headless worker pays for what it runs and nothing else.
+# benchmarks/startup_benchmark.py tracks cold-start time and memory.
@@ -0,0 +1,191 @@
+import calendar
+import os
+import time
+
+import numpy as np
+
+from iot_core.export import DAY_MS, day_string, list_partitions
+from iot_core.posture_engine import PostureThresholds, evaluate_posture
+from iot_core.sensor_fusion import FUSION_TOLERANCE_MS
+from iot_core.sensor_schema import SENSOR_TABLES
+
+# Array access and vectorized statistics over an export written by
+# iot_core/export.py. Everything works one (day, device) partition at a time,
+# so memory follows the size of one partition, not of the whole history;
+# partitions outside the requested devices and time range are never opened.
+
+HOUR_MS = 3_600_000
+
+
+def _day_start_ms(day):
+    return calendar.timegm(time.strptime(day, '%Y-%m-%d')) * 1000
+
+
+def _read_part(path, columns):
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, columns=columns)
+        return {name: table.column(name).to_numpy() for name in columns}
+    with np.load(path) as part:
+        return {name: part[name] for name in columns}
+
+
+# Columns of one partition directory, concatenated and sorted by time
+def read_partition(directory, columns):
+    parts = [_read_part(os.path.join(directory, name), columns)
+             for name in sorted(os.listdir(directory)) if name.startswith('part-')]
+    if not parts:
+        return {name: np.empty(0) for name in columns}
+    data = {name: np.concatenate([part[name] for part in parts]) for name in columns}
+    if len(parts) > 1 and 'ts_ms' in data:
+        order = np.argsort(data['ts_ms'], kind='stable')
+        data = {name: values[order] for name, values in data.items()}
+    return data
+
+
+# (device_id, day, arrays) per partition, in day order; arrays are
+# {'ts_ms': int64, <field>: float64, ...} limited to start_ms <= ts < end_ms
+def iter_partitions(out_dir, sensor, devices=None, start_ms=None, end_ms=None, fields=None):
+    columns = ['ts_ms'] + list(fields or SENSOR_TABLES[sensor][1])
+    for day, device_id, directory in list_partitions(out_dir, sensor):
+        if devices is not None and device_id not in devices:
+            continue
+        day_start = _day_start_ms(day)
+        if start_ms is not None and day_start + DAY_MS <= start_ms:
+            continue
+        if end_ms is not None and day_start >= end_ms:
+            continue
+        data = read_partition(directory, columns)
+        if start_ms is not None or end_ms is not None:
+            ts = data['ts_ms']
+            mask = np.ones(len(ts), dtype=bool)
+            if start_ms is not None:
+                mask &= ts >= start_ms
+            if end_ms is not None:
+                mask &= ts < end_ms
+            data = {name: values[mask] for name, values in data.items()}
+        if len(data['ts_ms']):
+            yield device_id, day, data
+
+
+# A whole range as arrays, plus a 'device_id' column. Loads everything that
+# matches into memory; use iter_partitions() for open-ended scans.
+def load(out_dir, sensor, devices=None, start_ms=None, end_ms=None, fields=None):
+    columns = ['ts_ms'] + list(fields or SENSOR_TABLES[sensor][1])
+    pieces = {name: [] for name in columns}
+    device_ids = []
+    for device_id, _, data in iter_partitions(out_dir, sensor, devices, start_ms, end_ms, fields):
+        for name in columns:
+            pieces[name].append(data[name])
+        device_ids.append(np.full(len(data['ts_ms']), device_id, dtype=object))
+    result = {name: np.concatenate(values) if values else np.empty(0) for name, values in pieces.items()}
+    result['device_id'] = np.concatenate(device_ids) if device_ids else np.empty(0, dtype=object)
+    return result
+
+
+# Hourly summary of one field: {device_id: {'hour_ms', 'count', 'mean', 'min', 'max'}}
+def hourly_summary(out_dir, sensor, field, devices=None, start_ms=None, end_ms=None):
+    result = {}
+    for device_id, _, data in iter_partitions(out_dir, sensor, devices, start_ms, end_ms, [field]):
+        values = data[field]
+        valid = ~np.isnan(values)
+        hours, index = np.unique(data['ts_ms'][valid] // HOUR_MS, return_inverse=True)
+        values = values[valid]
+        count = np.bincount(index, minlength=len(hours))
+        total = np.bincount(index, weights=values, minlength=len(hours))
+        low = np.full(len(hours), np.inf)
+        high = np.full(len(hours), -np.inf)
+        np.minimum.at(low, index, values)
+        np.maximum.at(high, index, values)
+        summary = result.setdefault(device_id, {'hour_ms': [], 'count': [], 'mean': [], 'min': [], 'max': []})
+        summary['hour_ms'].append(hours * HOUR_MS)
+        summary['count'].append(count)
+        summary['mean'].append(total / np.maximum(count, 1))
+        summary['min'].append(low)
+        summary['max'].append(high)
+    return {device_id: {name: np.concatenate(parts) for name, parts in summary.items()}
+            for device_id, summary in result.items()}
+
+
+# Histogram of the tilt magnitude (hypot of tilt_x and tilt_y); returns (counts, edges)
+def tilt_distribution(out_dir, devices=None, start_ms=None, end_ms=None, bins=None):
+    edges = np.asarray(bins if bins is not None else np.arange(0.0, 46.0, 1.0), dtype=np.float64)
+    counts = np.zeros(len(edges) - 1, dtype=np.int64)
+    for _, _, data in iter_partitions(out_dir, 'accelerometer', devices, start_ms, end_ms, ['tilt_x', 'tilt_y']):
+        counts += np.histogram(np.hypot(data['tilt_x'], data['tilt_y']), edges)[0]
+    return counts, edges
+
+
+# Share of time in bad posture per device and hour. Every accelerometer
+# sample is paired with the pressure sample of the same device nearest in
+# time, at most max_gap_ms away (SensorFusion's rule and tolerance; unlike the
+# live fusion, one pressure sample may serve several accelerometer samples),
+# then judged by evaluate_posture().
+# Returns {device_id: {'hour_ms', 'samples', 'bad', 'bad_percent'}}.
+def bad_posture_by_hour(out_dir, devices=None, start_ms=None, end_ms=None, max_gap_ms=FUSION_TOLERANCE_MS,
+                        thresholds=None):
+    thresholds = thresholds or PostureThresholds()
+    columns = ('ts_ms', 'seat', 'back')
+    # Only the paths; each pressure partition is read next to its accelerometer one
+    pressure_dirs = {(device_id, day): directory
+                     for day, device_id, directory in list_partitions(out_dir, 'pressure')}
+    empty = {'ts_ms': np.empty(0, dtype=np.int64), 'seat': np.empty(0), 'back': np.empty(0)}
+    # device_id -> (day, its last pressure sample), for samples just after midnight
+    carry = {}
+    result = {}
+    for device_id, day, accel in iter_partitions(out_dir, 'accelerometer', devices, start_ms, end_ms):
+        ts = accel['ts_ms']
+        day_index = _day_start_ms(day) // DAY_MS
+        yesterday, tomorrow = day_string(day_index - 1), day_string(day_index + 1)
+
+        # Samples near midnight may be nearest to a pressure sample of the day
+        # before or after; only the samples within reach of the boundary are added
+        previous = empty
+        if ts[0] - max_gap_ms < day_index * DAY_MS:
+            if device_id in carry and carry[device_id][0] == yesterday:
+                previous = carry[device_id][1]
+            elif (device_id, yesterday) in pressure_dirs:
+                earlier = read_partition(pressure_dirs[(device_id, yesterday)], list(columns))
+                previous = {name: earlier[name][-1:] for name in columns}
+        directory = pressure_dirs.get((device_id, day))
+        today = read_partition(directory, list(columns)) if directory is not None else empty
+        if len(today['ts_ms']):
+            carry[device_id] = (day, {name: today[name][-1:] for name in columns})
+        following = empty
+        if ts[-1] + max_gap_ms >= (day_index + 1) * DAY_MS and (device_id, tomorrow) in pressure_dirs:
+            later = read_partition(pressure_dirs[(device_id, tomorrow)], list(columns))
+            head = later['ts_ms'] <= ts[-1] + max_gap_ms
+            following = {name: later[name][head] for name in columns}
+        press = {name: np.concatenate([previous[name], today[name], following[name]]) for name in columns}
+
+        # Nearest of the pressure samples just before and just after; ties go to the earlier one
+        after = np.searchsorted(press['ts_ms'], ts, side='left')
+        before = after - 1
+        count = len(press['ts_ms'])
+        gap_before = np.full(len(ts), np.inf)
+        gap_after = np.full(len(ts), np.inf)
+        has_before = before >= 0
+        has_after = after < count
+        gap_before[has_before] = ts[has_before] - press['ts_ms'][before[has_before]]
+        gap_after[has_after] = press['ts_ms'][after[has_after]] - ts[has_after]
+        index = np.where(gap_after < gap_before, after, before)
+        matched = np.minimum(gap_before, gap_after) <= max_gap_ms
+        if not matched.any():
+            continue
+        index = index[matched]
+        bad = evaluate_posture(accel['tilt_x'][matched], accel['tilt_y'][matched],
+                               press['seat'][index], press['back'][index], thresholds)[0]
+        hours, hour_index = np.unique(ts[matched] // HOUR_MS, return_inverse=True)
+        samples = np.bincount(hour_index, minlength=len(hours))
+        bad_count = np.bincount(hour_index, weights=bad, minlength=len(hours)).astype(np.int64)
+        summary = result.setdefault(device_id, {'hour_ms': [], 'samples': [], 'bad': []})
+        summary['hour_ms'].append(hours * HOUR_MS)
+        summary['samples'].append(samples)
+        summary['bad'].append(bad_count)
+
+    report = {}
+    for device_id, summary in result.items():
+        merged = {name: np.concatenate(parts) for name, parts in summary.items()}
+        merged['bad_percent'] = merged['bad'] * 100.0 / merged['samples']
+        report[device_id] = merged
+    return report
@@ -0,0 +1,185 @@
+import logging
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+from iot_core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+connected_gauge = registry.gauge('iot_mqtt_connected', '1 while the MQTT connection is up', ['connection'])
+uptime_gauge = registry.gauge('iot_mqtt_uptime_seconds', 'Seconds connected since start', ['connection'])
+disconnects_total = registry.counter('iot_mqtt_disconnects_total', 'Unexpected or requested disconnects',
+                                     ['connection'])
+reconnect_ms = registry.histogram('iot_mqtt_reconnect_ms', 'Time from losing the connection to the next CONNACK (ms)',
+                                  ['connection'], buckets=(100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000))
+
+
+# One MQTT connection and its whole lifecycle:
+#  - connect_async + paho's network loop, so a broker that is down at startup
+#    or goes away later is retried with exponential backoff (min_delay,
+#    doubling up to max_delay) instead of failing once
+#  - connected only becomes True on a successful CONNACK
+#  - subscriptions are re-sent on every CONNACK, so they survive a broker
+#    restart that lost the session
+#  - with a fixed client_id and clean_session=False the broker keeps the
+#    session, and queues QoS 1 messages for it, while the client is away
+#  - uptime and reconnect latency (disconnect to CONNACK) are kept for stats()
+class ConnectionManager:
+    def __init__(self, client_id='', clean_session=None, qos=1, keepalive=60, min_delay=1, max_delay=60,
+                 name="MQTT"):
+        # A persistent session needs a stable client id
+        if clean_session is None:
+            clean_session = not client_id
+        self.client_id = client_id
+        self.clean_session = clean_session
+        self.qos = qos
+        self.keepalive = keepalive
+        self.name = name
+        self.client = mqtt.Client(client_id=client_id, clean_session=clean_session)
+        self.client.reconnect_delay_set(min_delay, max_delay)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+
+        self.broker = None
+        self.port = None
+        self.topics = {}  # topic filter -> qos
+        self.listeners = []  # callback(connected, rc), called on the network thread
+        self.lock = threading.Lock()
+        self.running = False
+
+        self.connected = False
+        self.started_at = None
+        self.connected_at = None
+        self.disconnected_at = None  # Set while an unexpected disconnect is unresolved
+        self.uptime = 0.0  # Seconds connected, not counting the current session
+        self.connects = 0
+        self.disconnects = 0
+        self.refused = 0
+        self.first_connect_ms = None
+        self.last_reconnect_ms = None
+        self.max_reconnect_ms = 0.0
+        self.total_reconnect_ms = 0.0
+        self.reconnects = 0
+        connected_gauge.set_function(lambda: int(self.connected), connection=name)
+        uptime_gauge.set_function(lambda: self.stats()['uptime_sec'], connection=name)
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    # Remembered for every later (re)connect; sent now if connected
+    def subscribe(self, topics, qos=None):
+        if isinstance(topics, str):
+            topics = [topics]
+        qos = self.qos if qos is None else qos
+        new = [(topic, qos) for topic in topics if self.topics.get(topic) != qos]
+        self.topics.update(new)
+        if new and self.connected:
+            self.client.subscribe(new)
+
+    def start(self, broker, port):
+        if self.running:
+            self.stop()
+        self.broker = broker
+        self.port = port
+        self.started_at = self.started_at or time.monotonic()
+        self.running = True
+        logger.info(f"{self.name} connecting to {broker}:{port}")
+        self.client.connect_async(broker, port, self.keepalive)
+        self.client.loop_start()
+
+    # Blocking variant for the headless services
+    def run_forever(self, broker, port):
+        self.broker = broker
+        self.port = port
+        self.started_at = self.started_at or time.monotonic()
+        self.running = True
+        logger.info(f"{self.name} connecting to {broker}:{port}")
+        self.client.connect_async(broker, port, self.keepalive)
+        try:
+            self.client.loop_forever(retry_first_connection=True)
+        finally:
+            self.running = False
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        self.client.disconnect()
+        self.client.loop_stop()
+        if self.connected:
+            # paho only reports the disconnect from its (now stopped) loop
+            self._on_disconnect(self.client, None, 0)
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc != 0:
+            self.refused += 1
+            logger.error(f"{self.name} connection to {self.broker}:{self.port} refused, rc={rc}")
+            self._notify(False, rc)
+            return
+        now = time.monotonic()
+        with self.lock:
+            self.connected = True
+            self.connected_at = now
+            self.connects += 1
+            if self.disconnected_at is not None:
+                latency_ms = (now - self.disconnected_at) * 1000
+                self.disconnected_at = None
+                self.last_reconnect_ms = latency_ms
+                self.max_reconnect_ms = max(self.max_reconnect_ms, latency_ms)
+                self.total_reconnect_ms += latency_ms
+                self.reconnects += 1
+                reconnect_ms.observe(latency_ms, connection=self.name)
+                logger.info(f"{self.name} reconnected to {self.broker}:{self.port} after {latency_ms:.0f} ms")
+            else:
+                if self.first_connect_ms is None:
+                    self.first_connect_ms = (now - self.started_at) * 1000
+                logger.info(f"{self.name} connected to {self.broker}:{self.port}")
+        if flags.get('session present'):
+            logger.info(f"{self.name} resumed its session on the broker")
+        if self.topics:
+            client.subscribe(list(self.topics.items()))
+        self._notify(True, rc)
+
+    def _on_disconnect(self, client, userdata, rc):
+        now = time.monotonic()
+        with self.lock:
+            if not self.connected:
+                return
+            self.connected = False
+            self.uptime += now - self.connected_at
+            self.disconnects += 1
+            disconnects_total.inc(connection=self.name)
+            if rc != 0 and self.running:
+                self.disconnected_at = now
+        if rc != 0:
+            logger.warning(f"{self.name} lost the connection to {self.broker}:{self.port} (rc={rc}), reconnecting")
+        self._notify(False, rc)
+
+    def _notify(self, connected, rc):
+        for callback in self.listeners:
+            try:
+                callback(connected, rc)
+            except Exception as e:
+                logger.error(f"{self.name} connection listener failed: {e}")
+
+    def stats(self):
+        now = time.monotonic()
+        with self.lock:
+            session = now - self.connected_at if self.connected else 0.0
+            uptime = self.uptime + session
+            elapsed = now - self.started_at if self.started_at is not None else 0.0
+            return {
+                'connected': self.connected,
+                'connects': self.connects,
+                'disconnects': self.disconnects,
+                'refused': self.refused,
+                'session_uptime_sec': round(session, 1),
+                'uptime_sec': round(uptime, 1),
+                'availability': round(uptime / elapsed, 4) if elapsed else 0.0,
+                'first_connect_ms': self.first_connect_ms,
+                'last_reconnect_ms': self.last_reconnect_ms,
+                'max_reconnect_ms': self.max_reconnect_ms,
+                'avg_reconnect_ms': self.total_reconnect_ms / self.reconnects if self.reconnects else None,
+            }
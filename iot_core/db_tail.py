@@ -0,0 +1,157 @@
+import logging
+import sqlite3
+import threading
+import time
+
+from iot_core.metrics import registry
+from iot_core.sensor_query import iter_sensor
+from iot_core.sensor_schema import SENSOR_TABLES
+
+logger = logging.getLogger(__name__)
+
+tail_rows_total = registry.counter('iot_db_tail_rows_total', 'Rows picked up by the database tail', ['tail'])
+
+
+# Follows the typed sensor tables by id: every interval it reads the rows
+# with an id above the last one seen, per table, in id order and in batches
+# of batch_size, and hands them to handler(sensor, rows) on its own thread.
+# rows are (id, device_id, ts_ms, <sensor columns...>). Each poll is a range
+# scan on the rowid, so its cost depends on how much is new, not on the size
+# of the database, and it sees rows written by any process (the data manager,
+# the ingest service, or this process's own DbWriter).
+#
+# mark() fixes the cursors at the current end of the tables; a caller that
+# loads recent history itself calls mark() first, so no row is missed between
+# that load and the first poll (rows written in between may be seen twice).
+class DbTail:
+    def __init__(self, db_path, handler, interval=1.0, batch_size=1000, sensors=None, name="DbTail"):
+        self.db_path = db_path
+        self.handler = handler
+        self.interval = interval
+        self.batch_size = batch_size
+        self.sensors = list(sensors or SENSOR_TABLES)
+        self.name = name
+        self.cursors = {}  # sensor -> last id handed to the handler
+        self.stop_event = threading.Event()
+        self._thread = None
+
+        self.polls = 0
+        self.rows = 0
+        self.errors = 0
+        self.last_poll_ms = 0.0
+        self.max_poll_ms = 0.0
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    # Start the cursors at the newest row of each table; returns them
+    def mark(self):
+        conn = self._connect()
+        try:
+            for sensor in self.sensors:
+                table = SENSOR_TABLES[sensor][0]
+                self.cursors[sensor] = conn.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0] or 0
+        finally:
+            conn.close()
+        return dict(self.cursors)
+
+    # Up to limit rows of one device and sensor from the span_ms before end_ms
+    # (default: its newest stored sample, so a database last written to
+    # yesterday still shows something), oldest first. Both queries are served
+    # by the (device_id, ts_ms) index from the newest end, so they are bounded
+    # by limit whatever the table size.
+    def recent(self, sensor, device_id, span_ms, limit, end_ms=None):
+        conn = self._connect()
+        try:
+            if end_ms is None:
+                table = SENSOR_TABLES[sensor][0]
+                newest = conn.execute(f"SELECT MAX(ts_ms) FROM {table} WHERE device_id = ?", (device_id,)).fetchone()[0]
+                if newest is None:
+                    return []
+                end_ms = newest + 1
+            rows = list(iter_sensor(conn, sensor, device_id, end_ms - span_ms, end_ms, limit, descending=True,
+                                    batch_size=limit))
+        finally:
+            conn.close()
+        rows.reverse()
+        return rows
+
+    # Device of the newest row across the tables, or None for an empty database
+    def latest_device(self):
+        conn = self._connect()
+        try:
+            newest = None
+            for sensor in self.sensors:
+                table = SENSOR_TABLES[sensor][0]
+                row = conn.execute(f"SELECT ts_ms, device_id FROM {table} ORDER BY id DESC LIMIT 1").fetchone()
+                if row is not None and (newest is None or row[0] > newest[0]):
+                    newest = row
+        finally:
+            conn.close()
+        return newest[1] if newest is not None else None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        if len(self.cursors) < len(self.sensors):
+            self.mark()
+        self.stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        logger.info(f"{self.name} following {self.db_path} from ids {self.cursors}")
+
+    def stop(self, timeout=5.0):
+        if self._thread is None:
+            return
+        self.stop_event.set()
+        self._thread.join(timeout)
+        self._thread = None
+        logger.info(f"{self.name} stopped. Stats: {self.stats()}")
+
+    # One round over all tables; returns the number of new rows
+    def poll(self, conn):
+        started = time.perf_counter()
+        total = 0
+        for sensor in self.sensors:
+            table, columns = SENSOR_TABLES[sensor]
+            sql = (f"SELECT id, device_id, ts_ms, {', '.join(columns)} FROM {table} "
+                   f"WHERE id > ? ORDER BY id LIMIT ?")
+            while not self.stop_event.is_set():
+                rows = conn.execute(sql, (self.cursors.get(sensor, 0), self.batch_size)).fetchall()
+                if not rows:
+                    break
+                self.cursors[sensor] = rows[-1][0]
+                total += len(rows)
+                self.handler(sensor, rows)
+                if len(rows) < self.batch_size:
+                    break
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        self.polls += 1
+        self.rows += total
+        self.last_poll_ms = elapsed_ms
+        self.max_poll_ms = max(self.max_poll_ms, elapsed_ms)
+        if total:
+            tail_rows_total.inc(total, tail=self.name)
+        return total
+
+    def stats(self):
+        return {
+            'polls': self.polls,
+            'rows': self.rows,
+            'errors': self.errors,
+            'last_poll_ms': round(self.last_poll_ms, 1),
+            'max_poll_ms': round(self.max_poll_ms, 1),
+            'cursors': dict(self.cursors),
+        }
+
+    def _run(self):
+        conn = self._connect()
+        try:
+            while not self.stop_event.wait(self.interval):
+                try:
+                    self.poll(conn)
+                except Exception as e:
+                    self.errors += 1
+                    logger.error(f"{self.name} poll failed: {e}")
+        finally:
+            conn.close()
@@ -0,0 +1,293 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from iot_core.metrics import queue_depth, registry
+from iot_core.sensor_schema import (DEFAULT_DEVICE_ID, advance_typed_watermark, parse_message, sensor_for_topic,
+                                    typed_insert_sql)
+
+logger = logging.getLogger(__name__)
+
+flush_ms = registry.histogram('iot_db_flush_ms', 'Time to commit one DbWriter batch (ms)')
+rows_written = registry.counter('iot_db_rows_written_total', 'Rows committed to sensor_data')
+rows_dropped = registry.counter('iot_db_rows_dropped_total', 'Rows dropped because the writer queue was full')
+flush_errors = registry.counter('iot_db_flush_errors_total', 'Batches that failed to commit')
+
+# Control messages understood by the writer thread
+_STOP = object()
+
+
+class _FlushRequest:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+# Batched SQLite writer.
+# A single background thread owns one long-lived connection (WAL mode) and
+# drains a bounded queue, inserting rows with executemany whenever the batch
+# is full or the oldest queued row has waited flush_interval seconds.
+# Callers only enqueue, so the MQTT network thread never waits on the disk.
+# Sensor messages are written to the typed tables as well; callers that have
+# already decoded the payload pass the values so it is never parsed twice.
+class DbWriter:
+    def __init__(self, db_path, batch_size=200, flush_interval=0.5, max_queue=10000, stats_interval=60.0,
+                 on_flush=None, rollups=None):
+        self.db_path = db_path
+        self.on_flush = on_flush  # Called with the committed rows (benchmarks)
+        # RollupMaintainer, updated in the same transaction. Optional only for
+        # databases without rollups: the rollup watermark would skip the rows
+        # of a writer without one (see iot_core/rollups.py backfill_rollups)
+        self.rollups = rollups
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stats_interval = stats_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        queue_depth.set_function(self.queue.qsize, queue='db_writer')
+
+        # Counters (written by the writer thread, read by anyone)
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.flush_count = 0
+        self.flush_errors = 0
+        self.parse_errors = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+        self.rows_per_sec = 0.0
+
+        self._thread = None
+        self._rate_started = time.monotonic()
+        self._rate_rows = 0
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="DbWriter", daemon=True)
+        self._thread.start()
+        logger.info(f"DB writer started for {self.db_path}")
+
+    def write(self, topic, message, device_id=DEFAULT_DEVICE_ID, values=None, ts_ms=None):
+        # Timestamp at enqueue time so batching does not skew the stored time
+        if ts_ms is None:
+            now = datetime.now(timezone.utc)
+            ts_ms = int(now.timestamp() * 1000)
+        else:
+            now = datetime.fromtimestamp(ts_ms / 1000.0, timezone.utc)
+        timestamp = now.strftime('%Y-%m-%d %H:%M:%S')
+        try:
+            self.queue.put_nowait((topic, message, timestamp, ts_ms, device_id, values))
+            return True
+        except queue.Full:
+            self.rows_dropped += 1
+            rows_dropped.inc()
+            if self.rows_dropped % 1000 == 1:
+                logger.warning(f"DB writer queue full, dropped {self.rows_dropped} rows so far")
+            return False
+
+    def flush(self, timeout=None):
+        # Block until everything queued before this call is committed
+        if self._thread is None or not self._thread.is_alive():
+            return False
+        request = _FlushRequest()
+        self.queue.put(request)
+        return request.done.wait(timeout)
+
+    def stop(self, timeout=5.0):
+        if self._thread is None:
+            return
+        self.queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+        logger.info(f"DB writer stopped. Stats: {self.stats()}")
+
+    def stats(self):
+        return {
+            'queue_depth': self.queue.qsize(),
+            'rows_written': self.rows_written,
+            'rows_dropped': self.rows_dropped,
+            'flush_count': self.flush_count,
+            'flush_errors': self.flush_errors,
+            'parse_errors': self.parse_errors,
+            'last_flush_ms': round(self.last_flush_ms, 3),
+            'max_flush_ms': round(self.max_flush_ms, 3),
+            'avg_flush_ms': round(self.total_flush_ms / self.flush_count, 3) if self.flush_count else 0.0,
+            'rows_per_sec': round(self.rows_per_sec, 1),
+        }
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL only syncs at checkpoints, not on every commit
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def _typed_rows(self, batch, first_id):
+        typed = {}
+        for offset, (topic, message, _, ts_ms, device_id, values) in enumerate(batch):
+            if values is not None:
+                sensor = sensor_for_topic(topic)
+            else:
+                try:
+                    parsed = parse_message(topic, message)
+                except (ValueError, IndexError):
+                    self.parse_errors += 1
+                    continue
+                if parsed is None:
+                    continue
+                sensor, values = parsed
+            if sensor is None:
+                continue
+            typed.setdefault(sensor, []).append((first_id + offset, device_id, ts_ms) + tuple(values))
+        return typed
+
+    def _flush_batch(self, conn, batch):
+        if not batch:
+            return
+        started = time.perf_counter()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO sensor_data (topic, message, timestamp) VALUES (?, ?, ?)",
+                    [item[:3] for item in batch])
+                # One writer holds the write lock, so the AUTOINCREMENT ids of
+                # this batch are contiguous and end at last_insert_rowid()
+                last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                first_id = last_id - len(batch) + 1
+                typed = self._typed_rows(batch, first_id)
+                for sensor, rows in typed.items():
+                    conn.executemany(typed_insert_sql(sensor), rows)
+                advance_typed_watermark(conn, first_id, last_id)
+                if self.rollups is not None:
+                    self.rollups.apply(conn, typed)
+            self.rows_written += len(batch)
+            rows_written.inc(len(batch))
+            self._rate_rows += len(batch)
+            if self.on_flush is not None:
+                self.on_flush(batch)
+        except Exception as e:
+            self.flush_errors += 1
+            flush_errors.inc()
+            logger.error(f"Error flushing {len(batch)} rows to database: {e}")
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        self.flush_count += 1
+        self.last_flush_ms = elapsed_ms
+        self.total_flush_ms += elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        flush_ms.observe(elapsed_ms)
+
+    def _update_rate(self, now):
+        elapsed = now - self._rate_started
+        if elapsed >= 1.0:
+            self.rows_per_sec = self._rate_rows / elapsed
+            self._rate_rows = 0
+            self._rate_started = now
+
+    # Commit the batches ForwardingDbWriters put on source (a multiprocessing
+    # queue), on the calling thread, until a None arrives. This is the writer
+    # process of an ingest cluster: one connection holds the write lock
+    # instead of N workers taking turns on it. Batches that are already
+    # waiting are merged up to batch_size rows per transaction.
+    def serve(self, source):
+        conn = self._connect()
+        next_stats = time.monotonic() + self.stats_interval
+        logger.info(f"DB writer serving {self.db_path}")
+        try:
+            stopping = False
+            while not stopping:
+                try:
+                    batch = source.get(timeout=1.0)
+                except queue.Empty:
+                    batch = []
+                if batch is None:
+                    break
+                while len(batch) < self.batch_size:
+                    try:
+                        more = source.get_nowait()
+                    except queue.Empty:
+                        break
+                    if more is None:
+                        stopping = True
+                        break
+                    batch.extend(more)
+                self._flush_batch(conn, batch)
+                now = time.monotonic()
+                self._update_rate(now)
+                if self.stats_interval and now >= next_stats:
+                    logger.info(f"DB writer stats: {self.stats()}")
+                    next_stats = now + self.stats_interval
+        finally:
+            conn.close()
+            logger.info(f"DB writer stopped serving. Stats: {self.stats()}")
+
+    def _run(self):
+        conn = self._connect()
+        batch = []
+        deadline = None
+        next_stats = time.monotonic() + self.stats_interval
+        try:
+            while True:
+                # Wake up at least once a second so the rate/stats stay fresh when idle
+                timeout = 1.0 if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+
+                if item is _STOP:
+                    self._flush_batch(conn, batch)
+                    return
+                if isinstance(item, _FlushRequest):
+                    self._flush_batch(conn, batch)
+                    batch, deadline = [], None
+                    item.done.set()
+                    continue
+                if item is not None:
+                    batch.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+
+                now = time.monotonic()
+                if len(batch) >= self.batch_size or (deadline is not None and now >= deadline):
+                    self._flush_batch(conn, batch)
+                    batch, deadline = [], None
+                self._update_rate(now)
+                if self.stats_interval and now >= next_stats:
+                    logger.info(f"DB writer stats: {self.stats()}")
+                    next_stats = now + self.stats_interval
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+# The worker side of DbWriter.serve: batches rows exactly like DbWriter, on
+# its own thread, but puts each batch on sink (a multiprocessing queue)
+# instead of committing it. put() blocks while the writer process is behind,
+# so a slow disk fills this writer's queue and write() drops, as with DbWriter.
+class ForwardingDbWriter(DbWriter):
+    def __init__(self, db_path, sink, batch_size=200, flush_interval=0.2, max_queue=10000, stats_interval=60.0):
+        super().__init__(db_path, batch_size, flush_interval, max_queue, stats_interval)
+        self.sink = sink
+
+    def _connect(self):
+        return None
+
+    def _flush_batch(self, conn, batch):
+        if not batch:
+            return
+        started = time.perf_counter()
+        try:
+            self.sink.put(batch)
+            self.rows_written += len(batch)
+            self._rate_rows += len(batch)
+        except Exception as e:
+            self.flush_errors += 1
+            logger.error(f"Error forwarding {len(batch)} rows to the DB writer: {e}")
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        self.flush_count += 1
+        self.last_flush_ms = elapsed_ms
+        self.total_flush_ms += elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
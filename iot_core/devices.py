@@ -0,0 +1,112 @@
+import logging
+import threading
+
+from iot_core.sensor_schema import DEFAULT_DEVICE_ID, SENSOR_TABLES
+
+logger = logging.getLogger(__name__)
+
+# Topic scheme: iot/<site>/<device>/<sensor>, e.g. iot/home/chair-1/pressure.
+# Consumers subscribe with one wildcard filter per sensor (iot/+/+/pressure)
+# and read the device id from the topic. The original single-chair topics
+# iot/sensors/<sensor> are still accepted and map to DEFAULT_DEVICE_ID.
+
+TOPIC_ROOT = 'iot'
+DEFAULT_SITE = 'home'
+LEGACY_PREFIX = 'iot/sensors/'
+ALERT_TOPIC = 'iot/alerts'
+
+
+def sensor_topic(sensor, device_id=DEFAULT_DEVICE_ID, site=DEFAULT_SITE):
+    for part in (site, device_id):
+        if not part or '/' in part or '+' in part or '#' in part:
+            raise ValueError(f"Invalid site or device id for a topic: {part!r}")
+    return f"{TOPIC_ROOT}/{site}/{device_id}/{sensor}"
+
+
+# Wildcard filters for every device of the given sensors (all by default),
+# plus the legacy single-chair topics
+def sensor_subscriptions(sensors=None, site='+', legacy=True):
+    sensors = list(sensors or SENSOR_TABLES)
+    topics = [f"{TOPIC_ROOT}/{site}/+/{sensor}" for sensor in sensors]
+    if legacy:
+        topics += [LEGACY_PREFIX + sensor for sensor in sensors]
+    return topics
+
+
+# (site, device_id, sensor) for a sensor topic, None for anything else
+def parse_topic(topic):
+    parts = topic.split('/')
+    if len(parts) == 4 and parts[0] == TOPIC_ROOT and parts[3] in SENSOR_TABLES:
+        return parts[1], parts[2], parts[3]
+    if len(parts) == 3 and topic.startswith(LEGACY_PREFIX) and parts[2] in SENSOR_TABLES:
+        return DEFAULT_SITE, DEFAULT_DEVICE_ID, parts[2]
+    return None
+
+
+class Device:
+    __slots__ = ('device_id', 'site', 'index', 'first_seen_ms', 'last_seen_ms', 'samples', 'latest')
+
+    def __init__(self, device_id, site, index):
+        self.device_id = device_id
+        self.site = site
+        self.index = index  # Dense 0..n-1, usable as an array row
+        self.first_seen_ms = None
+        self.last_seen_ms = None
+        self.samples = 0
+        self.latest = {}  # sensor -> (ts_ms, values)
+
+    def observe(self, sensor, ts_ms, values):
+        if self.first_seen_ms is None:
+            self.first_seen_ms = ts_ms
+        if self.last_seen_ms is None or ts_ms > self.last_seen_ms:
+            self.last_seen_ms = ts_ms
+        self.samples += 1
+        self.latest[sensor] = (ts_ms, values)
+
+    def __repr__(self):
+        return f"Device({self.site}/{self.device_id}, samples={self.samples})"
+
+
+# Per-device state keyed by device id. Every message does one dict lookup of
+# its topic (resolved and cached the first time it is seen); creating a device
+# is the only step that takes the lock.
+class DeviceRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._devices = {}  # device_id -> Device
+        self._topics = {}  # topic -> (Device, sensor), (None, None) for non-sensor topics
+
+    def __len__(self):
+        return len(self._devices)
+
+    def __contains__(self, device_id):
+        return device_id in self._devices
+
+    def get(self, device_id):
+        return self._devices.get(device_id)
+
+    def devices(self):
+        return list(self._devices.values())
+
+    def device(self, device_id, site=DEFAULT_SITE):
+        device = self._devices.get(device_id)
+        if device is None:
+            with self._lock:
+                device = self._devices.get(device_id)
+                if device is None:
+                    device = Device(device_id, site, len(self._devices))
+                    self._devices[device_id] = device
+                    logger.info(f"New device {device_id} at site {site}")
+        return device
+
+    # (Device, sensor) for a topic; (None, None) if it is not a sensor topic
+    def resolve(self, topic):
+        entry = self._topics.get(topic)
+        if entry is None:
+            parsed = parse_topic(topic)
+            entry = (None, None) if parsed is None else (self.device(parsed[1], parsed[0]), parsed[2])
+            self._topics[topic] = entry
+        return entry
+
+    def stats(self):
+        return {'devices': len(self._devices), 'topics': len(self._topics)}
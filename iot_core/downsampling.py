@@ -0,0 +1,72 @@
+import numpy as np
+
+# Downsampling for plotting long time ranges. Both functions take x sorted
+# ascending and return the indices of the points to draw (sorted), so the
+# caller can pick the same points from several aligned columns.
+
+
+# Min/max decimation: split the points into `buckets` runs of equal length and
+# keep the first/last point plus the min and max of every run. Peaks survive,
+# so the drawn envelope is the same as drawing every point. O(n), no Python loop.
+def minmax_indices(y, buckets):
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if buckets <= 0 or n <= 2 * buckets + 2:
+        return np.arange(n)
+
+    per_bucket = -(-n // buckets)  # ceil
+    padded = buckets * per_bucket
+    runs = y
+    if padded > n:
+        # Repeat the last value so the array reshapes; the extra indices are clipped below
+        runs = np.concatenate([y, np.full(padded - n, y[-1])])
+    runs = runs.reshape(buckets, per_bucket)
+    with np.errstate(invalid='ignore'):
+        lo = np.nanargmin(np.where(np.isnan(runs), np.inf, runs), axis=1)
+        hi = np.nanargmax(np.where(np.isnan(runs), -np.inf, runs), axis=1)
+    base = np.arange(buckets) * per_bucket
+    picked = np.concatenate([[0, n - 1], base + lo, base + hi])
+    return np.unique(np.minimum(picked, n - 1))
+
+
+# Largest-Triangle-Three-Buckets (Steinarsson 2013): keeps `threshold` points
+# chosen to preserve the visual shape. Slower than min/max (one vectorized
+# step per output point) but draws a cleaner single line.
+def lttb_indices(x, y, threshold):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Bucket edges over the points between the fixed first and last ones
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    out = np.empty(threshold, dtype=np.intp)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (the last point for the final bucket)
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        # Point in this bucket forming the largest triangle with a and the average
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def downsample_indices(x, y, max_points, method='minmax'):
+    if method == 'lttb':
+        return lttb_indices(x, y, max_points)
+    if method == 'minmax':
+        return minmax_indices(y, max(1, max_points // 2))
+    raise ValueError(f"Unknown downsampling method: {method}")
+
+
+def downsample(x, y, max_points, method='minmax'):
+    x = np.asarray(x)
+    y = np.asarray(y)
+    indices = downsample_indices(x, y, max_points, method)
+    return x[indices], y[indices]
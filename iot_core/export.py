@@ -0,0 +1,205 @@
+import json
+import logging
+import os
+import time
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from iot_core.sensor_schema import SENSOR_TABLES
+
+logger = logging.getLogger(__name__)
+
+# Columnar export of the typed sensor tables for offline analysis.
+#
+#   <out>/<sensor>/day=YYYY-MM-DD/device=<id>/part-<first id>.parquet (or .npz)
+#
+# Rows are read in id order with keyset pagination, split by UTC day and
+# device and buffered per partition; a partition is written as one part file
+# when it reaches part_rows, and every buffer is written out when all of them
+# together hold max_buffered rows. Memory stays bounded however large the
+# database is. Each part holds id, ts_ms and the sensor's value columns; the
+# day and device are in the path (Hive-style, so pyarrow.dataset can read the
+# tree too).
+#
+# Parquet needs pyarrow; without it the parts are NumPy .npz files.
+# <out>/_export_state.json remembers the last exported id per sensor, so a
+# later export only appends what is new.
+
+DAY_MS = 86_400_000
+STATE_FILE = '_export_state.json'
+FORMATS = ('parquet', 'npz')
+
+
+def have_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def resolve_format(fmt='auto'):
+    if fmt == 'auto':
+        return 'parquet' if have_pyarrow() else 'npz'
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if fmt == 'parquet' and not have_pyarrow():
+        raise ValueError("Parquet export needs pyarrow (pip install pyarrow), or use --format npz")
+    return fmt
+
+
+def day_string(day):
+    return time.strftime('%Y-%m-%d', time.gmtime(day * DAY_MS / 1000))
+
+
+def partition_dir(out_dir, sensor, day, device_id):
+    return os.path.join(out_dir, sensor, f"day={day_string(day)}", f"device={quote(device_id, safe='')}")
+
+
+# (day string, device id, directory) for every partition of a sensor, in day order
+def list_partitions(out_dir, sensor):
+    sensor_dir = os.path.join(out_dir, sensor)
+    if not os.path.isdir(sensor_dir):
+        return []
+    partitions = []
+    for day_name in sorted(os.listdir(sensor_dir)):
+        if not day_name.startswith('day='):
+            continue
+        day_dir = os.path.join(sensor_dir, day_name)
+        for device_name in sorted(os.listdir(day_dir)):
+            if device_name.startswith('device='):
+                partitions.append((day_name[4:], unquote(device_name[7:]), os.path.join(day_dir, device_name)))
+    return partitions
+
+
+def load_state(out_dir):
+    path = os.path.join(out_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {'format': None, 'sensors': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(out_dir, state):
+    path = os.path.join(out_dir, STATE_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def write_part(directory, fmt, columns):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"part-{int(columns['id'][0]):012d}.{fmt}")
+    if fmt == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        pq.write_table(pa.table(columns), path)
+    else:
+        np.savez(path, **columns)
+    return path
+
+
+class _SensorExport:
+    def __init__(self, out_dir, sensor, fmt, part_rows, max_buffered):
+        self.out_dir = out_dir
+        self.sensor = sensor
+        self.fields = SENSOR_TABLES[sensor][1]
+        self.fmt = fmt
+        self.part_rows = part_rows
+        self.max_buffered = max_buffered
+        self.buffers = {}  # (day, device_id) -> [(ids, ts, values)]
+        self.sizes = {}
+        self.buffered = 0
+        self.rows = 0
+        self.parts = 0
+
+    def add(self, rows):
+        columns = list(zip(*rows))
+        ids = np.array(columns[0], dtype=np.int64)
+        devices = np.array(columns[1], dtype=object)
+        ts = np.array(columns[2], dtype=np.int64)
+        values = np.array(columns[3:], dtype=np.float64).T  # NULL -> nan
+
+        # Group the chunk by (day, device) without a Python loop per row
+        device_names, device_codes = np.unique(devices, return_inverse=True)
+        days = ts // DAY_MS
+        keys = (days - days.min()) * len(device_names) + device_codes
+        order = np.argsort(keys, kind='stable')
+        boundaries = np.flatnonzero(np.diff(keys[order])) + 1
+        for group in np.split(order, boundaries):
+            key = (int(days[group[0]]), device_names[device_codes[group[0]]])
+            self.buffers.setdefault(key, []).append((ids[group], ts[group], values[group]))
+            self.sizes[key] = self.sizes.get(key, 0) + len(group)
+            self.buffered += len(group)
+            if self.sizes[key] >= self.part_rows:
+                self.write(key)
+        if self.buffered >= self.max_buffered:
+            self.flush()
+
+    def write(self, key):
+        pieces = self.buffers.pop(key)
+        self.buffered -= self.sizes.pop(key)
+        columns = {
+            'id': np.concatenate([piece[0] for piece in pieces]),
+            'ts_ms': np.concatenate([piece[1] for piece in pieces]),
+        }
+        values = np.concatenate([piece[2] for piece in pieces])
+        for index, field in enumerate(self.fields):
+            columns[field] = values[:, index]
+        write_part(partition_dir(self.out_dir, self.sensor, key[0], key[1]), self.fmt, columns)
+        self.rows += len(columns['id'])
+        self.parts += 1
+
+    def flush(self):
+        for key in list(self.buffers):
+            self.write(key)
+
+
+# Export one typed table; returns (rows, parts, last exported id)
+def export_sensor(conn, out_dir, sensor, fmt, after_id=0, chunk_size=50000, part_rows=250000,
+                  max_buffered=1000000):
+    table, fields = SENSOR_TABLES[sensor]
+    sql = (f"SELECT id, device_id, ts_ms, {', '.join(fields)} FROM {table} "
+           f"WHERE id > ? ORDER BY id LIMIT ?")
+    export = _SensorExport(out_dir, sensor, fmt, part_rows, max_buffered)
+    last_id = after_id
+    while True:
+        rows = conn.execute(sql, (last_id, chunk_size)).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        export.add(rows)
+    export.flush()
+    return export.rows, export.parts, last_id
+
+
+# Export every sensor table (or the given ones) into out_dir. With
+# incremental=True (the default) only rows newer than the previous export are
+# written; the format of an existing export is kept.
+def export_history(conn, out_dir, sensors=None, fmt='auto', incremental=True, chunk_size=50000,
+                   part_rows=250000, max_buffered=1000000):
+    os.makedirs(out_dir, exist_ok=True)
+    if not incremental and os.path.exists(os.path.join(out_dir, STATE_FILE)):
+        raise ValueError(f"{out_dir} already holds an export; a full export needs an empty directory")
+    state = load_state(out_dir)
+    if state['format'] is not None and fmt in ('auto', state['format']):
+        fmt = state['format']
+    elif state['sensors']:
+        raise ValueError(f"{out_dir} already holds a {state['format']} export")
+    fmt = resolve_format(fmt)
+    state['format'] = fmt
+
+    report = {}
+    for sensor in sensors or SENSOR_TABLES:
+        started = time.perf_counter()
+        after_id = state['sensors'].get(sensor, 0)
+        rows, parts, last_id = export_sensor(conn, out_dir, sensor, fmt, after_id, chunk_size, part_rows,
+                                             max_buffered)
+        state['sensors'][sensor] = last_id
+        save_state(out_dir, state)
+        elapsed = time.perf_counter() - started
+        report[sensor] = {'rows': rows, 'parts': parts, 'last_id': last_id, 'seconds': round(elapsed, 2)}
+        logger.info(f"Exported {rows} {sensor} rows in {parts} {fmt} parts ({elapsed:.1f} s)")
+    return report
@@ -0,0 +1,101 @@
+import logging
+import queue
+import threading
+import time
+
+from iot_core.metrics import queue_depth, registry
+
+logger = logging.getLogger(__name__)
+
+lag_ms_histogram = registry.histogram('iot_ingest_lag_ms', 'Time a message waited for the ingest worker (ms)',
+                                      ['worker'])
+dropped_total = registry.counter('iot_ingest_dropped_total', 'Messages dropped because the ingest queue was full',
+                                 ['worker'])
+
+_STOP = object()
+
+
+# Hands raw MQTT messages from the network thread to a worker thread.
+# on_message only stamps the arrival time and enqueues, so decoding, database
+# queuing and UI dispatch never run on paho's loop thread. The queue is
+# bounded; when it is full the message is dropped and counted, like DbWriter
+# does, rather than blocking reception.
+# Lag is the time a message spent waiting between arrival and processing.
+class IngestWorker:
+    def __init__(self, handler, max_queue=10000, name="IngestWorker"):
+        self.handler = handler  # handler(topic, payload, received_ms)
+        self.name = name
+        self.queue = queue.Queue(maxsize=max_queue)
+        queue_depth.set_function(self.queue.qsize, queue=name)
+
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def submit(self, topic, payload):
+        try:
+            self.queue.put_nowait((topic, payload, time.time()))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            dropped_total.inc(worker=self.name)
+            if self.dropped % 1000 == 1:
+                logger.warning(f"{self.name} queue full, dropped {self.dropped} messages so far")
+            return False
+
+    # paho-compatible callback
+    def on_message(self, client, userdata, msg):
+        self.submit(msg.topic, msg.payload)
+
+    def stop(self, timeout=5.0):
+        if self._thread is None:
+            return
+        self.queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+        logger.info(f"{self.name} stopped. Stats: {self.stats()}")
+
+    # Age of the oldest message still waiting, or 0 when the queue is empty
+    def current_lag_ms(self):
+        with self.queue.mutex:
+            oldest = self.queue.queue[0] if self.queue.queue else None
+        if oldest is None or oldest is _STOP:
+            return 0.0
+        return max(0.0, (time.time() - oldest[2]) * 1000.0)
+
+    def stats(self):
+        return {
+            'queue_depth': self.queue.qsize(),
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'lag_ms': round(self.current_lag_ms(), 1),
+            'last_lag_ms': round(self.last_lag_ms, 1),
+            'max_lag_ms': round(self.max_lag_ms, 1),
+        }
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            topic, payload, received = item
+            lag_ms = (time.time() - received) * 1000.0
+            self.last_lag_ms = lag_ms
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            lag_ms_histogram.observe(lag_ms, worker=self.name)
+            try:
+                self.handler(topic, payload, int(received * 1000))
+                self.processed += 1
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"{self.name} failed to handle message from {topic}: {e}")
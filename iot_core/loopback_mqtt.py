@@ -0,0 +1,175 @@
+import queue
+import threading
+
+# In-process stand-in for an MQTT broker and paho's Client, for benchmarks and
+# load tests that must run without a network. LoopbackClient implements the
+# part of the paho 1.x Client API this project uses (connect, subscribe,
+# publish, loop_start/loop_stop/loop_forever, on_connect/on_message) and
+# delivers messages on its own thread, like paho's network thread does.
+
+MQTT_ERR_SUCCESS = 0
+MQTT_ERR_NO_CONN = 4
+
+
+# MQTT topic filter matching with '+' and '#' wildcards
+def topic_matches(sub, topic):
+    sub_parts = sub.split('/')
+    topic_parts = topic.split('/')
+    for i, part in enumerate(sub_parts):
+        if part == '#':
+            return True
+        if i >= len(topic_parts):
+            return False
+        if part != '+' and part != topic_parts[i]:
+            return False
+    return len(sub_parts) == len(topic_parts)
+
+
+class LoopbackMessage:
+    def __init__(self, topic, payload, qos=0, retain=False):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+
+
+class LoopbackMessageInfo:
+    def __init__(self, rc, mid):
+        self.rc = rc
+        self.mid = mid
+
+    def wait_for_publish(self, timeout=None):
+        return True
+
+    def is_published(self):
+        return self.rc == MQTT_ERR_SUCCESS
+
+
+class LoopbackBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = []  # (topic filter, client)
+        self._retained = {}
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, client, sub):
+        with self._lock:
+            self._subscriptions.append((sub, client))
+            retained = [msg for topic, msg in self._retained.items() if topic_matches(sub, topic)]
+        for msg in retained:
+            client._deliver(msg)
+
+    def unsubscribe(self, client, sub):
+        with self._lock:
+            self._subscriptions = [(s, c) for s, c in self._subscriptions if not (s == sub and c is client)]
+
+    def disconnect(self, client):
+        with self._lock:
+            self._subscriptions = [(s, c) for s, c in self._subscriptions if c is not client]
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        elif payload is None:
+            payload = b''
+        msg = LoopbackMessage(topic, bytes(payload), qos, retain)
+        with self._lock:
+            self.published += 1
+            if retain:
+                self._retained[topic] = msg
+            # One copy per client even if several of its filters match
+            targets = []
+            for sub, client in self._subscriptions:
+                if client not in targets and topic_matches(sub, topic):
+                    targets.append(client)
+        for client in targets:
+            client._deliver(msg)
+        self.delivered += len(targets)
+
+
+# Process-wide default broker so independent components find each other
+default_broker = LoopbackBroker()
+
+
+class LoopbackClient:
+    def __init__(self, client_id='', clean_session=True, userdata=None, broker=None, max_queue=0):
+        self._client_id = client_id
+        self._userdata = userdata
+        self.broker = broker or default_broker
+        self.on_connect = None
+        self.on_message = None
+        self.on_disconnect = None
+        self.connected = False
+        self._mid = 0
+        self._inbox = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._running = False
+
+    def user_data_set(self, userdata):
+        self._userdata = userdata
+
+    def connect(self, host='localhost', port=1883, keepalive=60):
+        self.connected = True
+        if self.on_connect:
+            self.on_connect(self, self._userdata, {}, 0)
+        return MQTT_ERR_SUCCESS
+
+    def disconnect(self):
+        self.connected = False
+        self.broker.disconnect(self)
+        if self.on_disconnect:
+            self.on_disconnect(self, self._userdata, 0)
+        return MQTT_ERR_SUCCESS
+
+    def subscribe(self, topic, qos=0):
+        topics = topic if isinstance(topic, list) else [(topic, qos)]
+        for sub, _ in topics:
+            self.broker.subscribe(self, sub)
+        self._mid += 1
+        return MQTT_ERR_SUCCESS, self._mid
+
+    def unsubscribe(self, topic):
+        self.broker.unsubscribe(self, topic)
+        self._mid += 1
+        return MQTT_ERR_SUCCESS, self._mid
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self._mid += 1
+        if not self.connected:
+            return LoopbackMessageInfo(MQTT_ERR_NO_CONN, self._mid)
+        self.broker.publish(topic, payload, qos, retain)
+        return LoopbackMessageInfo(MQTT_ERR_SUCCESS, self._mid)
+
+    def _deliver(self, msg):
+        self._inbox.put(msg)
+
+    def _dispatch_forever(self):
+        while self._running:
+            msg = self._inbox.get()
+            if msg is None:
+                break
+            if self.on_message:
+                self.on_message(self, self._userdata, msg)
+
+    def loop_start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._dispatch_forever, name="LoopbackClient", daemon=True)
+        self._thread.start()
+
+    def loop_stop(self, force=False):
+        if self._thread is None:
+            return
+        self._running = False
+        self._inbox.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def loop_forever(self):
+        self._running = True
+        self._dispatch_forever()
+
+    def pending(self):
+        return self._inbox.qsize()
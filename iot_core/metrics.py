@@ -0,0 +1,268 @@
+import bisect
+import logging
+import threading
+
+from iot_core.sensor_schema import sensor_for_topic
+
+logger = logging.getLogger(__name__)
+
+# In-process metrics in the Prometheus text format. Every process has one
+# registry (`registry` below); modules create their metrics on it at import
+# time and each service serves it over HTTP with start_metrics_server():
+#
+#   curl http://127.0.0.1:9100/metrics
+#
+# Counters and histograms are updated on the hot path, so an update is a dict
+# lookup and an addition under a lock. Queue depths are gauges read by a
+# callback when the endpoint is scraped, so they cost nothing in between.
+
+# Latency buckets in milliseconds
+DEFAULT_BUCKETS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help='', labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}  # tuple of label values -> value
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, key, '', value) for key, value in self.values.items()]
+
+    def get(self, **labels):
+        with self.lock:
+            return self.values.get(self._key(labels), 0)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, help='', labels=()):
+        super().__init__(name, help, labels)
+        self.functions = {}  # tuple of label values -> callable, read at scrape time
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.functions[key] = function
+
+    def remove(self, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values.pop(key, None)
+            self.functions.pop(key, None)
+
+    def samples(self):
+        samples = super().samples()
+        with self.lock:
+            functions = list(self.functions.items())
+        for key, function in functions:
+            try:
+                samples.append((self.name, key, '', function()))
+            except Exception as e:
+                logger.debug(f"Gauge {self.name}{key} callback failed: {e}")
+        return samples
+
+    def get(self, **labels):
+        key = self._key(labels)
+        with self.lock:
+            function = self.functions.get(key)
+            value = self.values.get(key, 0)
+        return function() if function is not None else value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help='', labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    # values[key] = [count per bucket (+Inf last)..., sum, count]
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [0] * (len(self.buckets) + 3)
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            items = [(key, list(state)) for key, state in self.values.items()]
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state):
+                cumulative += count
+                samples.append((self.name + '_bucket', key, f'le="{_format_value(float(bound))}"', cumulative))
+            samples.append((self.name + '_sum', key, '', state[-2]))
+            samples.append((self.name + '_count', key, '', state[-1]))
+        return samples
+
+    # {'count', 'sum', 'avg'} for one label set
+    def get(self, **labels):
+        with self.lock:
+            state = self.values.get(self._key(labels))
+            if state is None:
+                return {'count': 0, 'sum': 0.0, 'avg': 0.0}
+            return {'count': state[-1], 'sum': state[-2], 'avg': state[-2] / state[-1]}
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    # Get-or-create, so several instances of a class can share one metric
+    def _get(self, cls, name, help, labels, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help, labels, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labels):
+                raise ValueError(f"Metric {name} already registered as a different {metric.kind}")
+            return metric
+
+    def counter(self, name, help='', labels=()):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help='', labels=()):
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name, help='', labels=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def render(self):
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, extra, value in metric.samples():
+                lines.append(f"{name}{_format_labels(metric.labelnames, key, extra)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# Shared by every component that owns a queue (label: queue name)
+queue_depth = registry.gauge('iot_queue_depth', 'Items waiting in a queue', ['queue'])
+# Counted by every service's on_message, per sensor: topics are per device,
+# so a topic label would add a series for every chair ever seen
+messages_received = registry.counter('iot_messages_received_total', 'MQTT messages received', ['sensor'])
+parse_failures = registry.counter('iot_parse_failures_total', 'Messages whose payload could not be decoded', ['sensor'])
+
+
+# Bounded label value for a topic: its sensor, or 'other' (alerts, commands)
+def sensor_label(topic):
+    return sensor_for_topic(topic) or 'other'
+
+
+# http.server is only imported by processes that serve metrics
+def _handler_class(registry):
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = self.registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes are not worth a log line each
+
+    MetricsHandler.registry = registry
+    return MetricsHandler
+
+
+# Serves a registry on http://<host>:<port>/metrics from a daemon thread
+class MetricsServer:
+    def __init__(self, port, host='127.0.0.1', registry=registry):
+        from http.server import ThreadingHTTPServer
+        self.server = ThreadingHTTPServer((host, port), _handler_class(registry))
+        self.server.daemon_threads = True
+        self.host, self.port = self.server.server_address[:2]
+        self._thread = threading.Thread(target=self.server.serve_forever, name="MetricsServer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        logger.info(f"Metrics served on http://{self.host}:{self.port}/metrics")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# None if port is falsy (disabled) or already taken; metrics are optional, so
+# a busy port only costs a warning
+def start_metrics_server(port, host='127.0.0.1', registry=registry):
+    if not port:
+        return None
+    try:
+        return MetricsServer(port, host, registry).start()
+    except OSError as e:
+        logger.warning(f"Metrics endpoint not started on {host}:{port}: {e}")
+        return None
@@ -0,0 +1,152 @@
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+import zlib
+
+from iot_core.devices import DeviceRegistry, parse_topic
+from iot_core.metrics import queue_depth
+
+logger = logging.getLogger(__name__)
+
+# Splitting the sensor stream over N ingest processes. Every message of a
+# device goes to the same partition, so each chair's samples stay in order
+# and per-device state (rules, posture fusion) lives in exactly one process.
+#
+# Two ways to get there:
+#   fanout - one receiver process subscribes and hands batches of raw messages
+#            to N workers over multiprocessing queues (Partitioner below)
+#   share  - every worker subscribes with an MQTT shared subscription
+#            ($share/<group>/<filter>) and the broker picks one member per
+#            message. Per-device order then depends on the broker's strategy;
+#            emulators/local_broker.py hashes the same partition_key as
+#            Partitioner, while real brokers usually round-robin the group.
+
+SHARE_PREFIX = '$share/'
+
+
+# Stable across processes and runs (unlike hash(), which is salted per process)
+def partition_for(key, partitions):
+    if partitions <= 1:
+        return 0
+    return zlib.crc32(key.encode()) % partitions
+
+
+# The device id of a topic (legacy iot/sensors/<sensor> topics belong to the
+# default device); topics that name no device are their own key
+def partition_key(topic):
+    parsed = parse_topic(topic)
+    return parsed[1] if parsed is not None else topic
+
+
+def shared_subscription(group, topic_filter):
+    return f"{SHARE_PREFIX}{group}/{topic_filter}"
+
+
+# '$share/<group>/<filter>' -> (group, filter); (None, sub) for normal filters
+def parse_shared_subscription(sub):
+    if not sub.startswith(SHARE_PREFIX):
+        return None, sub
+    group, _, topic_filter = sub[len(SHARE_PREFIX):].partition('/')
+    if not group or not topic_filter:
+        raise ValueError(f"Malformed shared subscription: {sub}")
+    return group, topic_filter
+
+
+_STOP = object()
+
+
+# Receiver side of the fanout mode. submit() runs on the MQTT network thread
+# and only enqueues; a forwarder thread groups messages by device partition
+# and puts one list per partition and round onto that partition's
+# multiprocessing queue, so the pickling cost is paid per batch rather than per
+# message. All queues are bounded: when a worker falls behind, submit() blocks
+# and the backpressure reaches the broker connection.
+class Partitioner:
+    def __init__(self, partitions, max_batch=500, max_queue=64, registry=None, context=None):
+        context = context or multiprocessing
+        self.partitions = partitions
+        self.max_batch = max_batch
+        self.queues = [context.Queue(max_queue) for _ in range(partitions)]
+        self.registry = registry or DeviceRegistry()
+        self._inbox = queue.Queue(max_batch * 4)
+        self._partition_of = {}  # topic -> partition
+        self._thread = None
+        queue_depth.set_function(self._inbox.qsize, queue='partitioner_inbox')
+        for index, partition_queue in enumerate(self.queues):
+            queue_depth.set_function(partition_queue.qsize, queue=f"partition_{index}")
+
+        self.forwarded = [0] * partitions
+        self.batches = 0
+
+    def partition(self, topic):
+        index = self._partition_of.get(topic)
+        if index is None:
+            self.registry.resolve(topic)  # Counted in stats()
+            index = partition_for(partition_key(topic), self.partitions)
+            self._partition_of[topic] = index
+        return index
+
+    def submit(self, topic, payload, received_ms=None):
+        if received_ms is None:
+            received_ms = int(time.time() * 1000)
+        self._inbox.put((topic, payload, received_ms))
+
+    def on_message(self, client, userdata, msg):
+        self.submit(msg.topic, msg.payload)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="Partitioner", daemon=True)
+        self._thread.start()
+
+    # Forward what is queued, then tell every worker to finish (None)
+    def stop(self, timeout=10.0):
+        if self._thread is not None:
+            self._inbox.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+        for index, partition_queue in enumerate(self.queues):
+            try:
+                partition_queue.put(None, timeout=timeout)
+            except queue.Full:
+                logger.warning(f"Partition {index} queue is full; its worker is not consuming")
+
+    def stats(self):
+        stats = {
+            'partitions': self.partitions,
+            'forwarded': list(self.forwarded),
+            'batches': self.batches,
+            'inbox_depth': self._inbox.qsize(),
+            'devices': len(self.registry),
+        }
+        try:
+            stats['queue_depths'] = [q.qsize() for q in self.queues]
+        except NotImplementedError:  # macOS
+            pass
+        return stats
+
+    def _run(self):
+        while True:
+            items = [self._inbox.get()]
+            while len(items) < self.max_batch:
+                try:
+                    items.append(self._inbox.get_nowait())
+                except queue.Empty:
+                    break
+            batches = [[] for _ in range(self.partitions)]
+            stop = False
+            for item in items:
+                if item is _STOP:
+                    stop = True
+                    break
+                batches[self.partition(item[0])].append(item)
+            for index, batch in enumerate(batches):
+                if batch:
+                    self.queues[index].put(batch)
+                    self.forwarded[index] += len(batch)
+                    self.batches += 1
+            if stop:
+                return
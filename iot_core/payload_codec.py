@@ -0,0 +1,122 @@
+import struct
+import time
+
+from iot_core.sensor_schema import PARSERS, sensor_for_topic
+
+# Wire format for sensor payloads.
+#
+# text   - the original human readable strings, e.g.
+#          "Tilt X: 0.71, Tilt Y: -2.59, Tilt Z: 6.23". Always accepted.
+# binary - a fixed-layout little-endian frame:
+#            header  magic(B)=0xA5 version(B) sensor(B) count(H) base_ts_ms(Q)
+#            sample  dt_ms(I) + per-sensor fixed-point values, repeated count times
+#          so N samples can be batched into one MQTT message.
+#
+# Decoders detect the format from the first byte (0xA5 can never start a
+# UTF-8 string), so producers pick the format per topic and consumers
+# accept both without any configuration.
+
+TEXT = 'text'
+BINARY = 'binary'
+
+MAGIC = 0xA5
+VERSION = 1
+
+HEADER = struct.Struct('<BBBHQ')
+
+# sensor -> (wire code, sample struct, scale per value)
+BINARY_LAYOUTS = {
+    'accelerometer': (1, struct.Struct('<Ihhh'), (100, 100, 100)),  # tilt in 1/100 degree
+    'pressure': (2, struct.Struct('<IHH'), (1, 1)),
+    'dht': (3, struct.Struct('<IhH'), (10, 10)),  # 1/10 C, 1/10 %
+}
+_SENSOR_BY_CODE = {code: sensor for sensor, (code, _, _) in BINARY_LAYOUTS.items()}
+
+# Negotiated format per topic; topics not listed use text
+TOPIC_FORMATS = {}
+
+
+def set_topic_format(topic, payload_format):
+    if payload_format not in (TEXT, BINARY):
+        raise ValueError(f"Unknown payload format: {payload_format}")
+    TOPIC_FORMATS[topic] = payload_format
+
+
+def topic_format(topic):
+    return TOPIC_FORMATS.get(topic, TEXT)
+
+
+# Canonical text form, identical to what the emulators have always published
+def format_text(sensor, values):
+    if sensor == 'accelerometer':
+        return f"Tilt X: {values[0]}, Tilt Y: {values[1]}, Tilt Z: {values[2]}"
+    if sensor == 'pressure':
+        return f"Seat Pressure: {values[0]}, Back Pressure: {values[1]}"
+    if sensor == 'dht':
+        return f"Temperature: {values[0]} C, Humidity: {values[1]}%"
+    raise ValueError(f"Unknown sensor: {sensor}")
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+# samples: list of (ts_ms, values)
+def encode_binary(sensor, samples):
+    code, sample_struct, scales = BINARY_LAYOUTS[sensor]
+    base_ts = samples[0][0]
+    parts = [HEADER.pack(MAGIC, VERSION, code, len(samples), base_ts)]
+    for ts_ms, values in samples:
+        scaled = [int(round(value * scale)) for value, scale in zip(values, scales)]
+        parts.append(sample_struct.pack(ts_ms - base_ts, *scaled))
+    return b''.join(parts)
+
+
+def decode_binary(payload):
+    magic, version, code, count, base_ts = HEADER.unpack_from(payload, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a binary sensor payload")
+    if version != VERSION:
+        raise ValueError(f"Unsupported payload version {version}")
+    sensor = _SENSOR_BY_CODE[code]
+    _, sample_struct, scales = BINARY_LAYOUTS[sensor]
+    samples = []
+    offset = HEADER.size
+    for _ in range(count):
+        dt_ms, *raw = sample_struct.unpack_from(payload, offset)
+        offset += sample_struct.size
+        values = tuple(value / scale if scale != 1 else value for value, scale in zip(raw, scales))
+        samples.append((base_ts + dt_ms, values))
+    return sensor, samples
+
+
+def is_binary(payload):
+    return len(payload) >= HEADER.size and payload[0] == MAGIC
+
+
+# Encode one or more samples for a topic in the format negotiated for it.
+# Text cannot batch, so a text topic yields one message per sample.
+def encode_for_topic(topic, samples):
+    sensor = sensor_for_topic(topic)
+    if topic_format(topic) == BINARY:
+        return [encode_binary(sensor, samples)]
+    return [format_text(sensor, values) for _, values in samples]
+
+
+# Decode an MQTT payload (bytes or str) into (sensor, [(ts_ms, values), ...]).
+# Non-sensor topics return (None, []); malformed payloads raise ValueError.
+def decode_payload(topic, payload, received_ms=None):
+    if isinstance(payload, (bytes, bytearray)) and is_binary(payload):
+        try:
+            return decode_binary(payload)
+        except (struct.error, KeyError) as e:
+            raise ValueError(f"Malformed binary payload: {e}")
+    sensor = sensor_for_topic(topic)
+    if sensor is None:
+        return None, []
+    text = payload.decode() if isinstance(payload, (bytes, bytearray)) else payload
+    try:
+        values = PARSERS[sensor](text)
+    except IndexError as e:
+        raise ValueError(f"Malformed {sensor} payload: {text!r}") from e
+    return sensor, [(received_ms if received_ms is not None else now_ms(), values)]
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import time
+
+from iot_core.metrics import queue_depth
+from iot_core.sensor_schema import DEFAULT_DEVICE_ID
+
+logger = logging.getLogger(__name__)
+
+
+# One unit of work flowing through the pipeline. The payload is decoded once
+# by the parse stage; later stages only read device_id/sensor/samples.
+class Envelope:
+    __slots__ = ('topic', 'payload', 'received_ms', 'device_id', 'sensor', 'samples', 'text')
+
+    def __init__(self, topic, payload, received_ms=None):
+        self.topic = topic
+        self.payload = payload
+        self.received_ms = received_ms if received_ms is not None else int(time.time() * 1000)
+        self.device_id = DEFAULT_DEVICE_ID
+        self.sensor = None
+        self.samples = []
+        self.text = None
+
+
+# A pipeline stage: consumes its own bounded asyncio.Queue and forwards what
+# handle() returns to every downstream stage. Because put() on a full queue
+# waits, a slow stage pushes back on everything upstream of it.
+class Stage:
+    name = 'stage'
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self.queue = None
+        self.downstream = []
+        self.processed = 0
+        self.errors = 0
+
+    def bind(self):
+        # Queues must be created inside the running event loop
+        self.queue = asyncio.Queue(self.maxsize)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def handle(self, item):
+        return item
+
+    async def run(self):
+        while True:
+            item = await self.queue.get()
+            try:
+                out = await self.handle(item)
+                self.processed += 1
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"{self.name} stage failed on {getattr(item, 'topic', item)}: {e}")
+                out = None
+            if out is not None:
+                for stage in self.downstream:
+                    await stage.queue.put(out)
+            self.queue.task_done()
+
+    def stats(self):
+        return {
+            'processed': self.processed,
+            'errors': self.errors,
+            'queue_depth': self.queue.qsize() if self.queue is not None else 0,
+        }
+
+
+# Wires stages into a DAG and runs each one as an asyncio task
+class Pipeline:
+    def __init__(self):
+        self.stages = []
+        self.entry = None
+        self._tasks = []
+
+    def add(self, stage, after=None):
+        if stage not in self.stages:
+            self.stages.append(stage)
+        if after is None:
+            self.entry = self.entry or stage
+        else:
+            after.downstream.append(stage)
+        return stage
+
+    def get(self, name):
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        return None
+
+    async def start(self):
+        for stage in self.stages:
+            stage.bind()
+            queue_depth.set_function(stage.queue.qsize, queue=f"stage_{stage.name}")
+        for stage in self.stages:
+            await stage.start()
+            self._tasks.append(asyncio.create_task(stage.run(), name=f"stage-{stage.name}"))
+
+    async def submit(self, item):
+        await self.entry.queue.put(item)
+
+    # Wait until everything submitted so far has passed through every stage
+    async def drain(self):
+        for stage in self.stages:
+            await stage.queue.join()
+
+    async def stop(self):
+        await self.drain()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for stage in self.stages:
+            await stage.stop()
+
+    def stats(self):
+        return {stage.name: stage.stats() for stage in self.stages}
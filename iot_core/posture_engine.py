@@ -0,0 +1,249 @@
+import time
+
+import numpy as np
+
+# Posture thresholds (previously hard-coded in PostureDock.calculate_posture)
+PRESSURE_THRESHOLD_ABSOLUTE = 38
+PRESSURE_THRESHOLD_PERCENT = 20.0  # Percentage difference between seat and back
+TILT_THRESHOLD_MAGNITUDE = 15.0  # Overall tilt magnitude from X and Y
+
+# Smoothing and alerting defaults
+SMOOTHING_WINDOW = 3  # Readings per device in the moving window
+HYSTERESIS = 0.15  # Leave "bad" only when every metric is 15% under its threshold
+CONFIRM_COUNT = 2  # Consecutive evaluations a new state must hold before it is reported
+ALERT_COOLDOWN_SEC = 30.0  # Minimum time between two alerts for the same device
+
+UNKNOWN, GOOD, BAD = -1, 0, 1
+
+
+class PostureThresholds:
+    def __init__(self, pressure_absolute=PRESSURE_THRESHOLD_ABSOLUTE,
+                 pressure_percent=PRESSURE_THRESHOLD_PERCENT,
+                 tilt_magnitude=TILT_THRESHOLD_MAGNITUDE):
+        self.pressure_absolute = pressure_absolute
+        self.pressure_percent = pressure_percent
+        self.tilt_magnitude = tilt_magnitude
+
+
+# Posture rule for whole arrays at once; returns (bad, tilt_magnitude, pressure_difference_percent)
+def evaluate_posture(tilt_x, tilt_y, seat, back, thresholds=None):
+    thresholds = thresholds or PostureThresholds()
+    tilt_x = np.asarray(tilt_x, dtype=np.float64)
+    tilt_y = np.asarray(tilt_y, dtype=np.float64)
+    seat = np.asarray(seat, dtype=np.float64)
+    back = np.asarray(back, dtype=np.float64)
+
+    pressure_difference = np.abs(seat - back)
+    avg_pressure = (seat + back) / 2.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pressure_difference_percent = np.where(avg_pressure != 0, pressure_difference / avg_pressure * 100, 0.0)
+    tilt_magnitude = np.hypot(tilt_x, tilt_y)
+
+    bad = ((pressure_difference > thresholds.pressure_absolute) |
+           (pressure_difference_percent > thresholds.pressure_percent) |
+           (tilt_magnitude > thresholds.tilt_magnitude))
+    return bad, tilt_magnitude, pressure_difference_percent
+
+
+class PostureVerdicts:
+    def __init__(self, device_ids, slots, bad, tilt_magnitude, pressure_difference_percent):
+        self.device_ids = device_ids
+        self.slots = slots
+        self.bad = bad
+        self.tilt_magnitude = tilt_magnitude
+        self.pressure_difference_percent = pressure_difference_percent
+
+    def __len__(self):
+        return len(self.device_ids)
+
+    def __iter__(self):
+        # (device_id, bad) pairs
+        return zip(self.device_ids, self.bad.tolist())
+
+
+# Per-device sliding windows over the raw readings, plus the state machine
+# that turns noisy per-sample verdicts into rare state transitions:
+#  * moving mean (or median) of tilt and seat/back pressure over `window` readings
+#  * hysteresis: a device enters "bad" when a smoothed metric crosses its
+#    threshold and only returns to "good" once all are below threshold*(1-hysteresis)
+#  * debounce: the new state must hold for `confirm` consecutive evaluations
+#  * cooldown: at most one alert per device every `cooldown` seconds
+# All of it is array based and works on a batch of device slots at once.
+class PostureSmoother:
+    def __init__(self, window=SMOOTHING_WINDOW, method='mean', hysteresis=HYSTERESIS,
+                 confirm=CONFIRM_COUNT, cooldown=ALERT_COOLDOWN_SEC, capacity=64):
+        if method not in ('mean', 'median'):
+            raise ValueError(f"Unknown smoothing method: {method}")
+        self.window = window
+        self.method = method
+        self.hysteresis = hysteresis
+        self.confirm = confirm
+        self.cooldown = cooldown
+        self.capacity = 0
+        self.ensure_capacity(capacity)
+
+    def ensure_capacity(self, capacity):
+        if capacity <= self.capacity:
+            return
+
+        def grow(name, shape, dtype, fill):
+            new = np.full(shape, fill, dtype=dtype)
+            old = getattr(self, name, None)
+            if old is not None:
+                new[:len(old)] = old
+            setattr(self, name, new)
+
+        ring = (capacity, self.window)
+        for name in ('tilt_x_buf', 'tilt_y_buf', 'seat_buf', 'back_buf'):
+            grow(name, ring, np.float64, np.nan)
+        grow('pos', capacity, np.intp, 0)
+        grow('state', capacity, np.int8, UNKNOWN)
+        grow('pending', capacity, np.int8, UNKNOWN)
+        grow('streak', capacity, np.int32, 0)
+        grow('last_alert', capacity, np.float64, -np.inf)
+        self.capacity = capacity
+
+    def push(self, slots, tilt_x, tilt_y, seat, back):
+        pos = self.pos[slots]
+        self.tilt_x_buf[slots, pos] = tilt_x
+        self.tilt_y_buf[slots, pos] = tilt_y
+        self.seat_buf[slots, pos] = seat
+        self.back_buf[slots, pos] = back
+        self.pos[slots] = (pos + 1) % self.window
+
+    def smoothed(self, slots):
+        reduce = np.nanmedian if self.method == 'median' else np.nanmean
+        return tuple(reduce(buf[slots], axis=1)
+                     for buf in (self.tilt_x_buf, self.tilt_y_buf, self.seat_buf, self.back_buf))
+
+    # Returns (slots that changed state and may alert, their new bad flags, metrics)
+    def update(self, slots, thresholds, now):
+        tilt_x, tilt_y, seat, back = self.smoothed(slots)
+        entered, tilt_magnitude, pressure_difference_percent = evaluate_posture(
+            tilt_x, tilt_y, seat, back, thresholds)
+
+        relax = 1.0 - self.hysteresis
+        recovered = ((np.abs(seat - back) < thresholds.pressure_absolute * relax) &
+                     (pressure_difference_percent < thresholds.pressure_percent * relax) &
+                     (tilt_magnitude < thresholds.tilt_magnitude * relax))
+
+        state = self.state[slots]
+        candidate = np.where(state == BAD, ~recovered, entered).astype(np.int8)
+        changed = candidate != state
+
+        # Debounce: count how long the same candidate state has been seen
+        streak = np.where(changed & (candidate == self.pending[slots]), self.streak[slots] + 1, changed.astype(np.int32))
+        self.streak[slots] = streak
+        self.pending[slots] = np.where(changed, candidate, UNKNOWN)
+
+        cooled = (now - self.last_alert[slots]) >= self.cooldown
+        confirmed = changed & ((state == UNKNOWN) | ((streak >= self.confirm) & cooled))
+
+        fire = slots[confirmed]
+        self.state[fire] = candidate[confirmed]
+        self.last_alert[fire] = now
+        self.streak[fire] = 0
+        self.pending[fire] = UNKNOWN
+        return fire, candidate[confirmed].astype(bool), tilt_magnitude[confirmed], pressure_difference_percent[confirmed]
+
+
+# Latest accelerometer/pressure state for many devices, kept in parallel
+# NumPy arrays indexed by a per-device slot. Updates are O(1) array writes
+# and evaluate() scores every device that has a fresh pair of readings in
+# one vectorized pass, so there is no Python-level work per device per tick.
+class PostureEngine:
+    def __init__(self, capacity=64, thresholds=None, smoother=None):
+        self.thresholds = thresholds or PostureThresholds()
+        self.smoother = smoother or PostureSmoother()
+        self.slots = {}  # device_id -> slot
+        self.device_ids = []  # slot -> device_id
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        def grow(old, dtype):
+            new = np.zeros(capacity, dtype=dtype)
+            if old is not None:
+                new[:len(old)] = old
+            return new
+
+        self.tilt_x = grow(getattr(self, 'tilt_x', None), np.float64)
+        self.tilt_y = grow(getattr(self, 'tilt_y', None), np.float64)
+        self.seat = grow(getattr(self, 'seat', None), np.float64)
+        self.back = grow(getattr(self, 'back', None), np.float64)
+        # Same pairing rule as the GUI: evaluate once both readings are new
+        self.new_accel = grow(getattr(self, 'new_accel', None), bool)
+        self.new_pressure = grow(getattr(self, 'new_pressure', None), bool)
+        self.capacity = capacity
+        if getattr(self, 'smoother', None) is not None:
+            self.smoother.ensure_capacity(capacity)
+
+    def __len__(self):
+        return len(self.device_ids)
+
+    def slot(self, device_id):
+        slot = self.slots.get(device_id)
+        if slot is None:
+            slot = len(self.device_ids)
+            if slot >= self.capacity:
+                self._allocate(self.capacity * 2)
+            self.slots[device_id] = slot
+            self.device_ids.append(device_id)
+        return slot
+
+    def update_accel(self, device_id, tilt_x, tilt_y):
+        slot = self.slot(device_id)
+        self.tilt_x[slot] = tilt_x
+        self.tilt_y[slot] = tilt_y
+        self.new_accel[slot] = True
+
+    def update_pressure(self, device_id, seat, back):
+        slot = self.slot(device_id)
+        self.seat[slot] = seat
+        self.back[slot] = back
+        self.new_pressure[slot] = True
+
+    # Bulk updates for a batch of messages (device_ids may repeat; last value wins)
+    def update_accel_many(self, device_ids, tilt_x, tilt_y):
+        slots = np.fromiter((self.slot(d) for d in device_ids), dtype=np.intp, count=len(device_ids))
+        self.tilt_x[slots] = tilt_x
+        self.tilt_y[slots] = tilt_y
+        self.new_accel[slots] = True
+
+    def update_pressure_many(self, device_ids, seat, back):
+        slots = np.fromiter((self.slot(d) for d in device_ids), dtype=np.intp, count=len(device_ids))
+        self.seat[slots] = seat
+        self.back[slots] = back
+        self.new_pressure[slots] = True
+
+    # Score every device with fresh accelerometer and pressure data, then
+    # clear their flags so the next pair is needed before they are scored again.
+    def evaluate(self):
+        count = len(self.device_ids)
+        ready = np.flatnonzero(self.new_accel[:count] & self.new_pressure[:count])
+        bad, tilt_magnitude, pressure_difference_percent = evaluate_posture(
+            self.tilt_x[ready], self.tilt_y[ready], self.seat[ready], self.back[ready], self.thresholds)
+        self.new_accel[ready] = False
+        self.new_pressure[ready] = False
+        return PostureVerdicts([self.device_ids[i] for i in ready], ready, bad,
+                               tilt_magnitude, pressure_difference_percent)
+
+    # Like evaluate(), but feeds fresh readings through the smoothing windows and
+    # only returns devices whose smoothed posture changed state (alert-worthy).
+    def evaluate_transitions(self, now=None):
+        now = time.monotonic() if now is None else now
+        count = len(self.device_ids)
+        ready = np.flatnonzero(self.new_accel[:count] & self.new_pressure[:count])
+        self.new_accel[ready] = False
+        self.new_pressure[ready] = False
+        self.smoother.push(ready, self.tilt_x[ready], self.tilt_y[ready], self.seat[ready], self.back[ready])
+        fire, bad, tilt_magnitude, pressure_difference_percent = self.smoother.update(ready, self.thresholds, now)
+        return PostureVerdicts([self.device_ids[i] for i in fire], fire, bad,
+                               tilt_magnitude, pressure_difference_percent)
+
+    # Score every known device from its latest readings, regardless of freshness
+    def evaluate_all(self):
+        count = len(self.device_ids)
+        bad, tilt_magnitude, pressure_difference_percent = evaluate_posture(
+            self.tilt_x[:count], self.tilt_y[:count], self.seat[:count], self.back[:count], self.thresholds)
+        return PostureVerdicts(list(self.device_ids), np.arange(count), bad,
+                               tilt_magnitude, pressure_difference_percent)
@@ -0,0 +1,241 @@
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from iot_core.rollups import PERIODS, backfill_rollups, create_rollup_tables, get_watermark, rollup_table
+from iot_core.sensor_query import ms_to_timestamp
+from iot_core.sensor_schema import SENSOR_TABLES, backfill_typed_tables, create_tables
+
+logger = logging.getLogger(__name__)
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+# How long each kind of data is kept, in days (None = forever).
+# Raw samples (sensor_data and the typed tables) go first; their history
+# lives on in the rollups, which are kept longer.
+class RetentionPolicy:
+    def __init__(self, raw_days=7, minute_days=90, hour_days=None, chunk_size=5000, pause=0.01,
+                 vacuum_pages=1000):
+        self.raw_days = raw_days
+        self.minute_days = minute_days
+        self.hour_days = hour_days
+        self.chunk_size = chunk_size  # Rows per delete transaction
+        self.pause = pause  # Seconds between chunks, so the live writer gets the lock
+        self.vacuum_pages = vacuum_pages  # Pages released per incremental_vacuum step
+
+    def rollup_days(self, period):
+        return {'minute': self.minute_days, 'hour': self.hour_days}.get(period)
+
+
+def _file_bytes(db_path):
+    return sum(os.path.getsize(p) for p in (db_path, db_path + '-wal') if os.path.exists(p))
+
+
+# Prunes the database according to a RetentionPolicy. Every delete runs in
+# chunks of policy.chunk_size rows, each its own short transaction, so the
+# write lock is only ever held for a few milliseconds at a time. Raw rows are
+# only deleted once they are covered by the rollups (id <= rollup watermark).
+# Freed pages are returned to the OS with incremental vacuum; databases created
+# before auto_vacuum was enabled need one full VACUUM (convert=True) first.
+class RetentionEngine:
+    def __init__(self, db_path, policy=None):
+        self.db_path = db_path
+        self.policy = policy or RetentionPolicy()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def _chunked_delete(self, conn, sql, params):
+        deleted = 0
+        while True:
+            with conn:
+                count = conn.execute(sql, params + [self.policy.chunk_size]).rowcount
+            deleted += count
+            if count < self.policy.chunk_size:
+                return deleted
+            if self.policy.pause:
+                time.sleep(self.policy.pause)
+
+    def prune_raw(self, conn, cutoff_ms):
+        watermark = get_watermark(conn)
+        deleted = {}
+        for table, _ in SENSOR_TABLES.values():
+            deleted[table] = self._chunked_delete(
+                conn,
+                f"DELETE FROM {table} WHERE id IN "
+                f"(SELECT id FROM {table} WHERE ts_ms < ? AND raw_id <= ? LIMIT ?)",
+                [cutoff_ms, watermark])
+
+        # sensor_data has no timestamp-only index, but ids grow with time:
+        # delete id ranges from the oldest row on, and stop at the first row
+        # (in id order) that is still inside the retention window
+        cutoff = ms_to_timestamp(cutoff_ms)
+        lo = 0
+        removed = 0
+        while True:
+            row = conn.execute("SELECT id, timestamp FROM sensor_data WHERE id >= ? ORDER BY id LIMIT 1",
+                               (lo,)).fetchone()
+            if row is None or row[0] > watermark or row[1] >= cutoff:
+                break
+            lo = row[0]
+            hi = min(lo + self.policy.chunk_size, watermark + 1)
+            with conn:
+                removed += conn.execute(
+                    "DELETE FROM sensor_data WHERE id >= ? AND id < ? AND timestamp < ?",
+                    (lo, hi, cutoff)).rowcount
+            lo = hi
+            if self.policy.pause:
+                time.sleep(self.policy.pause)
+        deleted['sensor_data'] = removed
+        return deleted
+
+    def prune_rollups(self, conn, now_ms):
+        deleted = {}
+        for period in PERIODS:
+            days = self.policy.rollup_days(period)
+            if days is None:
+                continue
+            table = rollup_table(period)
+            deleted[table] = self._chunked_delete(
+                conn,
+                f"DELETE FROM {table} WHERE (device_id, sensor, field, bucket_ms) IN "
+                f"(SELECT device_id, sensor, field, bucket_ms FROM {table} WHERE bucket_ms < ? LIMIT ?)",
+                [now_ms - days * DAY_MS])
+        return deleted
+
+    # Returns the number of pages given back to the OS
+    def vacuum(self, conn, convert=False):
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if mode != 2:
+            if not convert:
+                logger.warning(f"auto_vacuum is not INCREMENTAL; freed pages stay in the file until a "
+                               f"one-time full VACUUM converts it: python -m iot_core.retention "
+                               f"--db {self.db_path} --convert")
+                return 0
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+            return free
+        released = 0
+        while free:
+            # execute() only steps the pragma once (one page); executescript runs it to completion
+            conn.executescript(f"PRAGMA incremental_vacuum({self.policy.vacuum_pages});")
+            remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if remaining >= free:
+                break  # Another connection holds the lock; try again next pass
+            released += free - remaining
+            free = remaining
+            if self.policy.pause:
+                time.sleep(self.policy.pause)
+        return released
+
+    # One full pass; returns a report of rows deleted, space reclaimed and time taken
+    def run_once(self, convert=False, now_ms=None):
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        started = time.perf_counter()
+        size_before = _file_bytes(self.db_path)
+        conn = self._connect()
+        try:
+            create_tables(conn)
+            create_rollup_tables(conn)
+            # Everything about to be deleted must be in the rollups first
+            backfill_typed_tables(conn)
+            backfill_rollups(conn)
+            timings = {'catch_up_sec': round(time.perf_counter() - started, 3)}
+
+            step = time.perf_counter()
+            deleted = {}
+            if self.policy.raw_days is not None:
+                deleted.update(self.prune_raw(conn, now_ms - self.policy.raw_days * DAY_MS))
+            deleted.update(self.prune_rollups(conn, now_ms))
+            timings['delete_sec'] = round(time.perf_counter() - step, 3)
+
+            step = time.perf_counter()
+            free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            pages_released = self.vacuum(conn, convert)
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            timings['vacuum_sec'] = round(time.perf_counter() - step, 3)
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        finally:
+            conn.close()
+
+        size_after = _file_bytes(self.db_path)
+        report = {
+            'db': self.db_path,
+            'deleted': deleted,
+            'rows_deleted': sum(deleted.values()),
+            'free_pages_before_vacuum': free_before,
+            'pages_released': pages_released,
+            'page_size': page_size,
+            'incremental_vacuum': auto_vacuum == 2,
+            'bytes_before': size_before,
+            'bytes_after': size_after,
+            'bytes_reclaimed': size_before - size_after,
+            'elapsed_sec': round(time.perf_counter() - started, 3),
+            'timings': timings,
+        }
+        logger.info(f"Retention pass finished: {report}")
+        return report
+
+    # Run a pass now and then every interval seconds on a background thread.
+    # The first pass does not wait: a service restarted more often than once
+    # an interval would otherwise never prune at all. With convert=True the
+    # first pass also does the one-time conversion to incremental vacuum.
+    def start(self, interval=24 * 60 * 60, convert=False):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def loop():
+            first = True
+            while True:
+                try:
+                    self.run_once(convert and first)
+                except Exception as e:
+                    logger.error(f"Retention pass failed: {e}")
+                first = False
+                if self._stop.wait(interval):
+                    return
+
+        self._thread = threading.Thread(target=loop, name="Retention", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5.0)
+            self._thread = None
+
+
+def _days(value):
+    days = float(value)
+    return None if days <= 0 else days
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Prune old samples, keep rollups, reclaim disk space.")
+    parser.add_argument('--db', default='iot_data.db')
+    parser.add_argument('--raw-days', type=_days, default=7, help="Keep raw samples this many days (0 = forever)")
+    parser.add_argument('--minute-days', type=_days, default=90, help="Keep minute rollups (0 = forever)")
+    parser.add_argument('--hour-days', type=_days, default=None, help="Keep hour rollups (default forever)")
+    parser.add_argument('--chunk', type=int, default=5000, help="Rows per delete transaction")
+    parser.add_argument('--convert', action='store_true',
+                        help="Enable incremental auto_vacuum with a one-time full VACUUM if needed")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    # Usage: python -m iot_core.retention --db data_manager/iot_data.db --raw-days 7 --convert
+    args = parse_args()
+    policy = RetentionPolicy(args.raw_days, args.minute_days, args.hour_days, args.chunk)
+    print(json.dumps(RetentionEngine(args.db, policy).run_once(args.convert), indent=2))
@@ -0,0 +1,219 @@
+import logging
+import sqlite3
+import sys
+
+from iot_core.sensor_fusion import SensorFusion
+from iot_core.sensor_schema import SENSOR_TABLES, backfill_typed_tables, create_tables
+
+logger = logging.getLogger(__name__)
+
+# Bucket widths of the rollup tables (rollup_minute, rollup_hour)
+PERIODS = {
+    'minute': 60 * 1000,
+    'hour': 60 * 60 * 1000,
+}
+
+# Posture verdicts of fused accelerometer/pressure pairs are rolled up as
+# sensor 'posture', field 'bad' (0/1), so the bucket mean is the bad-posture ratio
+POSTURE_SENSOR = 'posture'
+POSTURE_FIELD = 'bad'
+
+WATERMARK_KEY = 'rollup_raw_id'  # schema_meta: highest sensor_data id already rolled up (see backfill_rollups)
+
+
+def rollup_table(period):
+    if period not in PERIODS:
+        raise ValueError(f"Unknown rollup period: {period}")
+    return f"rollup_{period}"
+
+
+ROLLUP_TABLES_SQL = []
+for _period in PERIODS:
+    ROLLUP_TABLES_SQL.append(f'''
+    CREATE TABLE IF NOT EXISTS rollup_{_period} (
+        device_id TEXT NOT NULL,
+        sensor TEXT NOT NULL,
+        field TEXT NOT NULL,
+        bucket_ms INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        min REAL,
+        max REAL,
+        sum REAL,
+        PRIMARY KEY (device_id, sensor, field, bucket_ms)
+    ) WITHOUT ROWID
+    ''')
+    # All-device queries scan one field's buckets in time order
+    ROLLUP_TABLES_SQL.append(
+        f"CREATE INDEX IF NOT EXISTS idx_rollup_{_period}_field ON rollup_{_period} (sensor, field, bucket_ms)")
+
+
+def create_rollup_tables(conn):
+    for sql in ROLLUP_TABLES_SQL:
+        conn.execute(sql)
+    conn.commit()
+
+
+def _upsert_sql(period):
+    table = rollup_table(period)
+    return (f"INSERT INTO {table} (device_id, sensor, field, bucket_ms, count, min, max, sum) "
+            f"VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            f"ON CONFLICT (device_id, sensor, field, bucket_ms) DO UPDATE SET "
+            f"count = count + excluded.count, min = MIN(min, excluded.min), "
+            f"max = MAX(max, excluded.max), sum = sum + excluded.sum")
+
+
+def get_watermark(conn):
+    row = conn.execute("SELECT value FROM schema_meta WHERE key = ?", (WATERMARK_KEY,)).fetchone()
+    return int(row[0]) if row else 0
+
+
+# Incremental rollup maintenance. apply() takes the typed rows of one write
+# batch ({sensor: [(raw_id, device_id, ts_ms, *values)]}), folds them into
+# per-bucket partial aggregates in memory and merges those into every rollup
+# table with one UPSERT per touched bucket, inside the caller's transaction.
+# Cost is proportional to the batch, never to the table size.
+class RollupMaintainer:
+    def __init__(self, periods=None, fusion=None, thresholds=None):
+        self.periods = list(periods or PERIODS)
+        self.fusion = fusion or SensorFusion()
+        self.thresholds = thresholds
+        self.rows_applied = 0
+        self.buckets_written = 0
+
+    def _posture_rows(self, typed):
+        # Fuse accelerometer and pressure in arrival (raw id) order
+        samples = [(row, 'accelerometer') for row in typed.get('accelerometer', ())]
+        samples += [(row, 'pressure') for row in typed.get('pressure', ())]
+        samples.sort(key=lambda item: item[0][0])
+        fused = []
+        for row, sensor in samples:
+            fused.extend(self.fusion.add(row[1], sensor, row[2], tuple(row[3:])))
+        if not fused:
+            return []
+        # Imported on first use: it brings in numpy, which the services would
+        # otherwise load at startup just for this
+        from iot_core.posture_engine import evaluate_posture
+        bad, _, _ = evaluate_posture([f.accel[0] for f in fused], [f.accel[1] for f in fused],
+                                     [f.pressure[0] for f in fused], [f.pressure[1] for f in fused],
+                                     self.thresholds)
+        return [(f.device_id, f.ts_ms, (float(b),)) for f, b in zip(fused, bad.tolist())]
+
+    def aggregate(self, typed):
+        buckets = {}  # (period, device_id, sensor, field, bucket_ms) -> [count, min, max, sum]
+
+        def add(sensor, fields, device_id, ts_ms, values):
+            for period in self.periods:
+                width = PERIODS[period]
+                bucket_ms = ts_ms - ts_ms % width
+                for field, value in zip(fields, values):
+                    if value is None:
+                        continue
+                    key = (period, device_id, sensor, field, bucket_ms)
+                    agg = buckets.get(key)
+                    if agg is None:
+                        buckets[key] = [1, value, value, value]
+                    else:
+                        agg[0] += 1
+                        agg[1] = min(agg[1], value)
+                        agg[2] = max(agg[2], value)
+                        agg[3] += value
+
+        for sensor, rows in typed.items():
+            fields = SENSOR_TABLES[sensor][1]
+            for row in rows:
+                add(sensor, fields, row[1], row[2], row[3:])
+        for device_id, ts_ms, values in self._posture_rows(typed):
+            add(POSTURE_SENSOR, (POSTURE_FIELD,), device_id, ts_ms, values)
+        return buckets
+
+    def apply(self, conn, typed):
+        rows = sum(len(r) for r in typed.values())
+        if not rows:
+            return 0
+        buckets = self.aggregate(typed)
+        by_period = {}
+        for (period, device_id, sensor, field, bucket_ms), (count, lo, hi, total) in buckets.items():
+            by_period.setdefault(period, []).append((device_id, sensor, field, bucket_ms, count, lo, hi, total))
+        for period, values in by_period.items():
+            conn.executemany(_upsert_sql(period), values)
+
+        last_raw_id = max(row[0] for r in typed.values() for row in r)
+        conn.execute(
+            "INSERT INTO schema_meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = MAX(CAST(value AS INTEGER), CAST(excluded.value AS INTEGER))",
+            (WATERMARK_KEY, str(last_raw_id)))
+        self.rows_applied += rows
+        self.buckets_written += len(buckets)
+        return rows
+
+
+def _backfill_sql(chunk_size):
+    width = max(len(columns) for _, columns in SENSOR_TABLES.values())
+    selects = []
+    for sensor, (table, columns) in SENSOR_TABLES.items():
+        padded = list(columns) + ['NULL'] * (width - len(columns))
+        selects.append(f"SELECT raw_id, '{sensor}', device_id, ts_ms, {', '.join(padded)} "
+                       f"FROM {table} WHERE raw_id > :after")
+    return " UNION ALL ".join(selects) + f" ORDER BY raw_id LIMIT {int(chunk_size)}"
+
+
+# Roll up typed rows stored before rollups existed, resuming from the
+# watermark. Each chunk reads the watermark and its rows inside one write
+# transaction, so a live writer that maintains rollups on another connection
+# can never be counted twice. The watermark is the highest raw id rolled up,
+# not a contiguous range: rows a writer without a maintainer commits below a
+# maintained batch are never picked up here, which is why every DbWriter
+# (services and GUI alike) is given a RollupMaintainer.
+def backfill_rollups(conn, maintainer=None, chunk_size=5000):
+    maintainer = maintainer or RollupMaintainer()
+    create_rollup_tables(conn)
+    sql = _backfill_sql(chunk_size)
+    total = 0
+    last_id = None
+    while True:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(sql, {'after': get_watermark(conn)}).fetchall()
+            if not rows:
+                break
+            typed = {}
+            for row in rows:
+                sensor = row[1]
+                width = len(SENSOR_TABLES[sensor][1])
+                typed.setdefault(sensor, []).append((row[0], row[2], row[3]) + tuple(row[4:4 + width]))
+            total += maintainer.apply(conn, typed)
+            last_id = rows[-1][0]
+    if total:
+        logger.info(f"Backfilled rollups from {total} rows up to sensor_data id {last_id}")
+    return total
+
+
+# Buckets (bucket_ms, count, min, max, mean) for one field, oldest first.
+# Without a device all devices are merged per bucket. For the posture ratio
+# use sensor='posture', field='bad'.
+def query_rollups(conn, sensor, field, period='minute', device_id=None, start_ms=None, end_ms=None):
+    table = rollup_table(period)
+    where, params = ["sensor = ?", "field = ?"], [sensor, field]
+    if device_id is not None:
+        where.append("device_id = ?")
+        params.append(device_id)
+    if start_ms is not None:
+        where.append("bucket_ms >= ?")
+        params.append(int(start_ms))
+    if end_ms is not None:
+        where.append("bucket_ms < ?")
+        params.append(int(end_ms))
+    sql = (f"SELECT bucket_ms, SUM(count), MIN(min), MAX(max), SUM(sum) / SUM(count) FROM {table} "
+           f"WHERE {' AND '.join(where)} GROUP BY bucket_ms ORDER BY bucket_ms")
+    return conn.execute(sql, params).fetchall()
+
+
+if __name__ == "__main__":
+    # Usage: python -m iot_core.rollups [path/to/iot_data.db]
+    path = sys.argv[1] if len(sys.argv) > 1 else 'iot_data.db'
+    conn = sqlite3.connect(path)
+    create_tables(conn)
+    backfill_typed_tables(conn)
+    total = backfill_rollups(conn)
+    conn.close()
+    print(f"{path}: rolled up {total} rows")
@@ -0,0 +1,345 @@
+import json
+import logging
+import math
+import operator
+import os
+import re
+import time
+
+from iot_core.metrics import registry
+from iot_core.sensor_schema import DEFAULT_DEVICE_ID, SENSOR_TABLES, sensor_for_topic
+
+logger = logging.getLogger(__name__)
+
+alerts_total = registry.counter('iot_alerts_total', 'Alerts raised', ['rule'])
+
+# Rules shipped with the data manager scripts, used when no file is given
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data_manager',
+                                  'alert_rules.json')
+
+# Declarative alert rules, loaded from a JSON file such as:
+#
+#   {"rules": [
+#     {"name": "high_temperature", "type": "threshold", "sensor": "dht",
+#      "field": "temperature", "op": ">", "value": 29.0,
+#      "message": "High temperature detected: {value}°C", "color": "blue"},
+#     {"name": "tilt_jerk", "type": "rate_of_change", "sensor": "accelerometer",
+#      "field": "tilt_x", "max_per_sec": 5.0, "message": "Sudden movement"},
+#     {"name": "warm_for_10_min", "type": "duration_above", "sensor": "dht",
+#      "field": "temperature", "value": 27.0, "seconds": 600, "message": "..."},
+#     {"name": "slouching_in_heat", "type": "all", "rules": ["warm_for_10_min", "bad_tilt"],
+#      "within_sec": 60, "message": "..."}
+#   ]}
+#
+# Common keys: "message" (format fields {rule} {device} {value}), optional
+# "color" (published as a <p style='color:..;'> wrapper around the message;
+# the GUI alert dock strips it with parse_alert and shows the text in that
+# colour), "cooldown_sec", "repeat" (false = alert only when the
+# rule becomes active; the default for duration_above), "alert" (false = only
+# used by combinations) and "enabled".
+#
+# Rules are compiled once into a dispatch table sensor -> rules, and each
+# topic is resolved to its entry on first sight, so a message is only
+# checked against the rules that read its sensor.
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+
+# Fields computed from a sample in addition to the stored columns
+def _tilt_magnitude(values):
+    return math.hypot(values[0], values[1])
+
+
+def _pressure_difference(values):
+    return abs(values[0] - values[1])
+
+
+def _pressure_difference_percent(values):
+    average = (values[0] + values[1]) / 2.0
+    return abs(values[0] - values[1]) / average * 100 if average else 0.0
+
+
+DERIVED_FIELDS = {
+    'accelerometer': {'tilt_magnitude': _tilt_magnitude},
+    'pressure': {'pressure_difference': _pressure_difference,
+                 'pressure_difference_percent': _pressure_difference_percent},
+}
+
+
+def field_getter(sensor, field):
+    columns = SENSOR_TABLES[sensor][1]
+    if field in columns:
+        index = columns.index(field)
+        return lambda values: values[index]
+    derived = DERIVED_FIELDS.get(sensor, {}).get(field)
+    if derived is None:
+        raise ValueError(f"Unknown field {field!r} for sensor {sensor!r}")
+    return derived
+
+
+# <p style='color:blue;'>text</p>, as produced by Rule.format
+_COLORED_ALERT = re.compile(r"^<p style='color:\s*([^;']+);?'>(.*)</p>$", re.S)
+
+
+# Published alert message -> (text, colour or None); plain messages pass through
+def parse_alert(message):
+    match = _COLORED_ALERT.match(message.strip())
+    if match is None:
+        return message, None
+    return match.group(2), match.group(1).strip()
+
+
+class Alert:
+    __slots__ = ('rule', 'device_id', 'ts_ms', 'value', 'message')
+
+    def __init__(self, rule, device_id, ts_ms, value, message):
+        self.rule = rule
+        self.device_id = device_id
+        self.ts_ms = ts_ms
+        self.value = value
+        self.message = message
+
+    def __repr__(self):
+        return f"Alert({self.rule}, {self.device_id}, {self.message!r})"
+
+
+class Rule:
+    repeat = True
+
+    def __init__(self, spec):
+        self.name = spec['name']
+        self.spec = spec
+        self.message = spec.get('message', "{rule} triggered: {value}")
+        self.color = spec.get('color')
+        self.alert = spec.get('alert', True)
+        self.repeat = spec.get('repeat', type(self).repeat)  # False = only when the rule becomes active
+        self.cooldown_ms = int(spec.get('cooldown_sec', 0) * 1000)
+        self.sensors = set()
+        self.state = {}  # device_id -> (active, ts_ms) for combinations
+        self.last_fired = {}  # device_id -> ts_ms
+
+        # Cost accounting
+        self.evaluations = 0
+        self.fired = 0
+        self.total_ns = 0
+
+    # Update per-device state with one sample; returns (active, value)
+    def check(self, sensor, device_id, ts_ms, values):
+        raise NotImplementedError
+
+    def format(self, device_id, value):
+        text = self.message.format(rule=self.name, device=device_id, value=value)
+        if self.color:
+            return f"<p style='color:{self.color};'>{text}</p>"
+        return text
+
+    def evaluate(self, sensor, device_id, ts_ms, values):
+        started = time.perf_counter_ns()
+        active, value = self.check(sensor, device_id, ts_ms, values)
+        previous = self.state.get(device_id)
+        self.state[device_id] = (active, ts_ms)
+        alert = None
+        if active and self.alert and (self.repeat or previous is None or not previous[0]):
+            last = self.last_fired.get(device_id)
+            if last is None or ts_ms - last >= self.cooldown_ms:
+                self.last_fired[device_id] = ts_ms
+                self.fired += 1
+                alert = Alert(self.name, device_id, ts_ms, value, self.format(device_id, value))
+        self.evaluations += 1
+        self.total_ns += time.perf_counter_ns() - started
+        return alert
+
+    def stats(self):
+        return {
+            'type': self.spec.get('type'),
+            'evaluations': self.evaluations,
+            'fired': self.fired,
+            'total_ms': round(self.total_ns / 1e6, 3),
+            'avg_us': round(self.total_ns / self.evaluations / 1e3, 3) if self.evaluations else 0.0,
+        }
+
+
+class _FieldRule(Rule):
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.sensor = spec['sensor']
+        if self.sensor not in SENSOR_TABLES:
+            raise ValueError(f"Rule {self.name}: unknown sensor {self.sensor!r}")
+        self.sensors = {self.sensor}
+        self.get = field_getter(self.sensor, spec['field'])
+        op = spec.get('op', '>')
+        if op not in OPERATORS:
+            raise ValueError(f"Rule {self.name}: unknown operator {op!r}")
+        self.op = OPERATORS[op]
+
+
+# value <op> threshold, on every sample
+class ThresholdRule(_FieldRule):
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.threshold = float(spec['value'])
+
+    def check(self, sensor, device_id, ts_ms, values):
+        value = self.get(values)
+        return self.op(value, self.threshold), value
+
+
+# |change per second| between consecutive samples of a device above max_per_sec
+class RateOfChangeRule(_FieldRule):
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.max_per_sec = float(spec['max_per_sec'])
+        self.previous = {}  # device_id -> (ts_ms, value)
+
+    def check(self, sensor, device_id, ts_ms, values):
+        value = self.get(values)
+        previous = self.previous.get(device_id)
+        self.previous[device_id] = (ts_ms, value)
+        if previous is None or ts_ms <= previous[0]:
+            return False, 0.0
+        rate = (value - previous[1]) * 1000.0 / (ts_ms - previous[0])
+        return abs(rate) > self.max_per_sec, round(rate, 3)
+
+
+# value <op> threshold continuously for at least `seconds`; fires once per episode
+class DurationRule(_FieldRule):
+    repeat = False
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.threshold = float(spec['value'])
+        self.duration_ms = int(spec['seconds'] * 1000)
+        self.since = {}  # device_id -> ts_ms the condition started holding
+
+    def check(self, sensor, device_id, ts_ms, values):
+        value = self.get(values)
+        if not self.op(value, self.threshold):
+            self.since.pop(device_id, None)
+            return False, value
+        start = self.since.setdefault(device_id, ts_ms)
+        return ts_ms - start >= self.duration_ms, value
+
+
+# all/any of other rules active for the same device, each seen within within_sec
+class CombinationRule(Rule):
+    repeat = False
+
+    def __init__(self, spec, children):
+        super().__init__(spec)
+        self.mode = all if spec['type'] == 'all' else any
+        self.children = children
+        self.within_ms = int(spec.get('within_sec', 60) * 1000)
+        for child in children:
+            self.sensors |= child.sensors
+
+    def check(self, sensor, device_id, ts_ms, values):
+        def active(child):
+            state = child.state.get(device_id)
+            return state is not None and state[0] and ts_ms - state[1] <= self.within_ms
+        result = self.mode(active(child) for child in self.children)
+        return result, ', '.join(child.name for child in self.children if active(child))
+
+
+RULE_TYPES = {
+    'threshold': ThresholdRule,
+    'rate_of_change': RateOfChangeRule,
+    'duration_above': DurationRule,
+}
+
+
+def compile_rules(specs):
+    rules = {}
+    for spec in specs:
+        if not spec.get('enabled', True):
+            continue
+        kind = spec.get('type')
+        if kind in ('all', 'any'):
+            missing = [name for name in spec['rules'] if name not in rules]
+            if missing:
+                raise ValueError(f"Rule {spec['name']}: unknown or later-defined rules {missing}")
+            rule = CombinationRule(spec, [rules[name] for name in spec['rules']])
+        elif kind in RULE_TYPES:
+            rule = RULE_TYPES[kind](spec)
+        else:
+            raise ValueError(f"Rule {spec.get('name')}: unknown type {kind!r}")
+        if rule.name in rules:
+            raise ValueError(f"Duplicate rule name: {rule.name}")
+        rules[rule.name] = rule
+
+    # Helper rules (alert: false) that no enabled combination reads are never evaluated
+    used = {child.name for rule in rules.values() if isinstance(rule, CombinationRule) for child in rule.children}
+    return [rule for rule in rules.values() if rule.alert or rule.name in used]
+
+
+class RuleEngine:
+    def __init__(self, specs):
+        self.rules = compile_rules(specs)
+        # sensor -> rules in definition order (combinations after their children)
+        self.dispatch = {}
+        for rule in self.rules:
+            for sensor in rule.sensors:
+                self.dispatch.setdefault(sensor, []).append(rule)
+        self._topics = {}  # topic -> rules, resolved on first use
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+        engine = cls(config.get('rules', []))
+        logger.info(f"Loaded {len(engine.rules)} alert rules from {path}")
+        return engine
+
+    def sensors(self):
+        return sorted(self.dispatch)
+
+    def rules_for_topic(self, topic):
+        rules = self._topics.get(topic)
+        if rules is None:
+            rules = self.dispatch.get(sensor_for_topic(topic), [])
+            self._topics[topic] = rules
+        return rules
+
+    def handles(self, topic):
+        return bool(self.rules_for_topic(topic))
+
+    # Check one decoded sample; returns the alerts it raised
+    def process(self, topic, ts_ms, values, device_id=DEFAULT_DEVICE_ID):
+        rules = self.rules_for_topic(topic)
+        if not rules:
+            return []
+        sensor = sensor_for_topic(topic)
+        alerts = []
+        for rule in rules:
+            alert = rule.evaluate(sensor, device_id, ts_ms, values)
+            if alert is not None:
+                alerts.append(alert)
+                alerts_total.inc(rule=rule.name)
+        return alerts
+
+    def stats(self):
+        return {rule.name: rule.stats() for rule in self.rules}
+
+
+# Check one decoded sample against the engine's rules for its topic; returns
+# the alert messages. Failures are logged rather than raised, so one bad
+# sample never stops the caller's message loop.
+def analyze_data(engine, topic, values, ts_ms=None, device_id=DEFAULT_DEVICE_ID):
+    try:
+        if not values:
+            return []
+        if ts_ms is None:
+            ts_ms = int(time.time() * 1000)
+        alerts = engine.process(topic, ts_ms, values, device_id)
+        for alert in alerts:
+            logger.warning(f"Rule {alert.rule} triggered for {alert.device_id}: {alert.value}")
+        return [alert.message for alert in alerts]
+    except Exception as e:
+        logger.error(f"Error analyzing data: {e}")
+        return []
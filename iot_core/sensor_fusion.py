@@ -0,0 +1,135 @@
+import collections
+
+# Defaults: the emulators publish every 15 s, so half a period pairs each
+# accelerometer reading with the nearest pressure reading of the same chair.
+FUSION_TOLERANCE_MS = 7500
+FUSION_MAX_AGE_MS = 60000
+FUSION_MAX_BUFFER = 32  # Unmatched samples kept per device and sensor
+
+PRIMARY = 'accelerometer'
+SECONDARY = 'pressure'
+
+
+class FusedSample:
+    def __init__(self, device_id, ts_ms, accel, pressure, interpolated=False):
+        self.device_id = device_id
+        self.ts_ms = ts_ms
+        self.accel = accel  # (tilt_x, tilt_y[, tilt_z])
+        self.pressure = pressure  # (seat, back)
+        self.interpolated = interpolated
+
+
+def _interpolate(before, after, ts_ms):
+    (t0, v0), (t1, v1) = before, after
+    if t1 == t0:
+        return v0
+    w = (ts_ms - t0) / (t1 - t0)
+    return tuple(a + (b - a) * w for a, b in zip(v0, v1))
+
+
+# Joins accelerometer and pressure samples per device by timestamp.
+# A sample is paired with the other sensor's sample closest in time, provided
+# they are at most tolerance_ms apart; otherwise it waits in a small
+# per-device buffer. Samples older than max_age_ms behind the newest one for
+# the device are dropped as stale, and samples older than both members of
+# the last fused pair for the device are counted as late and dropped.
+# With interpolate=True a sample that falls between two readings of the
+# other sensor is paired with their linear interpolation instead of the
+# nearest one.
+class SensorFusion:
+    def __init__(self, tolerance_ms=FUSION_TOLERANCE_MS, max_age_ms=FUSION_MAX_AGE_MS,
+                 max_buffer=FUSION_MAX_BUFFER, interpolate=False):
+        self.tolerance_ms = tolerance_ms
+        self.max_age_ms = max_age_ms
+        self.max_buffer = max_buffer
+        self.interpolate = interpolate
+        self.buffers = {}  # device_id -> {sensor: deque[(ts_ms, values)]}
+        self.watermark = {}  # device_id -> older ts_ms of the last fused pair
+        self.matched = 0
+        self.interpolated = 0
+        self.dropped_stale = 0
+        self.dropped_overflow = 0
+        self.late = 0
+
+    def _device(self, device_id):
+        buffers = self.buffers.get(device_id)
+        if buffers is None:
+            buffers = {PRIMARY: collections.deque(), SECONDARY: collections.deque()}
+            self.buffers[device_id] = buffers
+        return buffers
+
+    def _expire(self, buffers, newest_ts):
+        cutoff = newest_ts - self.max_age_ms
+        for queue in buffers.values():
+            while queue and queue[0][0] < cutoff:
+                queue.popleft()
+                self.dropped_stale += 1
+
+    # Add one sample; returns the list of FusedSample produced (zero or one)
+    def add(self, device_id, sensor, ts_ms, values):
+        if sensor not in (PRIMARY, SECONDARY):
+            return []
+        if ts_ms < self.watermark.get(device_id, -1):
+            self.late += 1
+            return []
+
+        buffers = self._device(device_id)
+        self._expire(buffers, ts_ms)
+        other = buffers[SECONDARY if sensor == PRIMARY else PRIMARY]
+
+        match_index, match_distance = None, None
+        for index, (other_ts, _) in enumerate(other):
+            distance = abs(other_ts - ts_ms)
+            if distance <= self.tolerance_ms and (match_distance is None or distance < match_distance):
+                match_index, match_distance = index, distance
+
+        if match_index is None:
+            own = buffers[sensor]
+            own.append((ts_ms, values))
+            if len(own) > self.max_buffer:
+                own.popleft()
+                self.dropped_overflow += 1
+            return []
+
+        other_ts, other_values = other[match_index]
+        interpolated = False
+        if self.interpolate:
+            before = [s for s in other if s[0] <= ts_ms]
+            after = [s for s in other if s[0] >= ts_ms]
+            if before and after and before[-1][0] != after[0][0]:
+                other_values = _interpolate(before[-1], after[0], ts_ms)
+                interpolated = True
+                self.interpolated += 1
+
+        # Everything of the other sensor up to the match is consumed or can no longer pair
+        for _ in range(match_index):
+            other.popleft()
+            self.dropped_stale += 1
+        other.popleft()
+        # Own samples older than this one can no longer pair either
+        own = buffers[sensor]
+        while own and own[0][0] <= ts_ms:
+            own.popleft()
+            self.dropped_stale += 1
+
+        # The pair is complete at the later of the two timestamps; anything
+        # older than both members of the pair arrives too late to be useful
+        fused_ts = max(ts_ms, other_ts)
+        self.watermark[device_id] = min(ts_ms, other_ts)
+        self.matched += 1
+        if sensor == PRIMARY:
+            return [FusedSample(device_id, fused_ts, values, other_values, interpolated)]
+        return [FusedSample(device_id, fused_ts, other_values, values, interpolated)]
+
+    def pending(self):
+        return sum(len(q) for buffers in self.buffers.values() for q in buffers.values())
+
+    def stats(self):
+        return {
+            'matched': self.matched,
+            'interpolated': self.interpolated,
+            'dropped_stale': self.dropped_stale,
+            'dropped_overflow': self.dropped_overflow,
+            'late': self.late,
+            'pending': self.pending(),
+        }
@@ -0,0 +1,141 @@
+import calendar
+import logging
+import time
+
+from iot_core.devices import parse_topic
+from iot_core.sensor_schema import SENSOR_TABLES, sensor_for_topic
+
+logger = logging.getLogger(__name__)
+
+# Composite indexes so history lookups are range scans instead of full scans.
+# SQLite appends the rowid to every index, so (topic, timestamp) also serves
+# ORDER BY timestamp, id for one topic.
+INDEXES_SQL = [
+    "CREATE INDEX IF NOT EXISTS idx_sensor_data_topic_ts ON sensor_data (topic, timestamp)",
+]
+for _table, _ in SENSOR_TABLES.values():
+    INDEXES_SQL.append(f"CREATE INDEX IF NOT EXISTS idx_{_table}_device_ts ON {_table} (device_id, ts_ms)")
+    INDEXES_SQL.append(f"CREATE INDEX IF NOT EXISTS idx_{_table}_ts ON {_table} (ts_ms)")
+
+
+def ensure_indexes(conn):
+    for sql in INDEXES_SQL:
+        conn.execute(sql)
+    conn.commit()
+
+
+# epoch ms -> sensor_data.timestamp format ('YYYY-MM-DD HH:MM:SS', UTC)
+def ms_to_timestamp(ms):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(ms / 1000.0))
+
+
+# Accepts epoch ms (int or digit string) or 'YYYY-MM-DD[ HH:MM[:SS]]' in UTC
+def parse_time(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d'):
+        try:
+            return calendar.timegm(time.strptime(value, fmt)) * 1000
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized time: {value}")
+
+
+# Yield rows from a cursor in fetchmany() chunks instead of fetchall()
+def _stream(cursor, batch_size):
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+
+def _keyset(order_column, after, descending):
+    # after is the (order value, id) of the last row of the previous page
+    op = '<' if descending else '>'
+    return f"({order_column} {op} ? OR ({order_column} = ? AND id {op} ?))", [after[0], after[0], after[1]]
+
+
+# Raw rows (id, topic, message, timestamp) ordered by time.
+# start_ms/end_ms are epoch ms, end exclusive.
+def iter_raw(conn, topic=None, start_ms=None, end_ms=None, limit=None, after=None,
+             descending=False, batch_size=500):
+    where, params = [], []
+    if topic is not None:
+        where.append("topic = ?")
+        params.append(topic)
+    if start_ms is not None:
+        where.append("timestamp >= ?")
+        params.append(ms_to_timestamp(start_ms))
+    if end_ms is not None:
+        where.append("timestamp < ?")
+        params.append(ms_to_timestamp(end_ms))
+    if after is not None:
+        clause, values = _keyset('timestamp', after, descending)
+        where.append(clause)
+        params.extend(values)
+    direction = 'DESC' if descending else 'ASC'
+    sql = "SELECT id, topic, message, timestamp FROM sensor_data"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY timestamp {direction}, id {direction}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    cursor = conn.execute(sql, params)
+    cursor.arraysize = batch_size
+    yield from _stream(cursor, batch_size)
+
+
+# Typed rows (id, device_id, ts_ms, <sensor columns...>) ordered by time
+def iter_sensor(conn, sensor, device_id=None, start_ms=None, end_ms=None, limit=None, after=None,
+                descending=False, batch_size=500):
+    table, columns = SENSOR_TABLES[sensor]
+    where, params = [], []
+    if device_id is not None:
+        where.append("device_id = ?")
+        params.append(device_id)
+    if start_ms is not None:
+        where.append("ts_ms >= ?")
+        params.append(int(start_ms))
+    if end_ms is not None:
+        where.append("ts_ms < ?")
+        params.append(int(end_ms))
+    if after is not None:
+        clause, values = _keyset('ts_ms', after, descending)
+        where.append(clause)
+        params.extend(values)
+    direction = 'DESC' if descending else 'ASC'
+    sql = f"SELECT id, device_id, ts_ms, {', '.join(columns)} FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY ts_ms {direction}, id {direction}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    cursor = conn.execute(sql, params)
+    cursor.arraysize = batch_size
+    yield from _stream(cursor, batch_size)
+
+
+# Range query over sensor history: sensor topics are served from the typed
+# tables (device filter available, or taken from the topic: the legacy
+# iot/sensors/<sensor> means the default device, as everywhere else; a bare
+# sensor name means every device), anything else from the raw sensor_data.
+def query_range(conn, topic, device_id=None, start=None, end=None, limit=None, after=None,
+                descending=False, raw=False):
+    start_ms, end_ms = parse_time(start), parse_time(end)
+    sensor = None if raw else sensor_for_topic(topic or '')
+    if sensor is None:
+        if device_id is not None:
+            raise ValueError("Device filter is only available for sensor topics")
+        return iter_raw(conn, topic, start_ms, end_ms, limit, after, descending)
+    if device_id is None:
+        parsed = parse_topic(topic)
+        device_id = parsed[1] if parsed is not None else None
+    return iter_sensor(conn, sensor, device_id, start_ms, end_ms, limit, after, descending)
@@ -0,0 +1,209 @@
+import calendar
+import logging
+import sqlite3
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEVICE_ID = 'default'  # Device of the legacy iot/sensors/<sensor> topics
+
+# sensor name -> (typed table, value columns)
+SENSOR_TABLES = {
+    'accelerometer': ('accelerometer_data', ('tilt_x', 'tilt_y', 'tilt_z')),
+    'pressure': ('pressure_data', ('seat', 'back')),
+    'dht': ('dht_data', ('temperature', 'humidity')),
+}
+
+RAW_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS sensor_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        topic TEXT,
+        message TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+TYPED_TABLES_SQL = [
+    '''
+    CREATE TABLE IF NOT EXISTS accelerometer_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        raw_id INTEGER UNIQUE,
+        device_id TEXT NOT NULL,
+        ts_ms INTEGER NOT NULL,
+        tilt_x REAL,
+        tilt_y REAL,
+        tilt_z REAL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS pressure_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        raw_id INTEGER UNIQUE,
+        device_id TEXT NOT NULL,
+        ts_ms INTEGER NOT NULL,
+        seat INTEGER,
+        back INTEGER
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS dht_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        raw_id INTEGER UNIQUE,
+        device_id TEXT NOT NULL,
+        ts_ms INTEGER NOT NULL,
+        temperature REAL,
+        humidity REAL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS schema_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    ''',
+]
+
+
+# Map a topic to its sensor name: the last topic level, as in both
+# iot/sensors/<sensor> and iot/<site>/<device>/<sensor> (see iot_core/devices.py)
+def sensor_for_topic(topic):
+    sensor = topic.rsplit('/', 1)[-1]
+    return sensor if sensor in SENSOR_TABLES else None
+
+
+# Device id of an iot/<site>/<device>/<sensor> topic; legacy topics carry none
+def device_for_topic(topic, default=DEFAULT_DEVICE_ID):
+    parts = topic.split('/')
+    return parts[2] if len(parts) == 4 else default
+
+
+# "Tilt X: -0.95, Tilt Y: -4.9, Tilt Z: -3.66"
+def parse_accelerometer(message):
+    tilt_x = float(message.split("Tilt X: ")[1].split(",")[0])
+    tilt_y = float(message.split("Tilt Y: ")[1].split(",")[0])
+    tilt_z = float(message.split("Tilt Z: ")[1].split(",")[0])
+    return tilt_x, tilt_y, tilt_z
+
+
+# "Seat Pressure: 73, Back Pressure: 65"
+def parse_pressure(message):
+    seat = int(message.split("Seat Pressure: ")[1].split(",")[0].strip())
+    back = int(message.split("Back Pressure: ")[1].strip())
+    return seat, back
+
+
+# "Temperature: 22.5 C, Humidity: 39.8%"
+def parse_dht(message):
+    temperature = float(message.split("Temperature: ")[1].split(",")[0].replace("C", "").strip())
+    humidity = float(message.split("Humidity: ")[1].replace("%", "").strip())
+    return temperature, humidity
+
+
+PARSERS = {
+    'accelerometer': parse_accelerometer,
+    'pressure': parse_pressure,
+    'dht': parse_dht,
+}
+
+
+# Parse a raw sensor message once into (sensor, values).
+# Returns None for non-sensor topics; raises ValueError/IndexError on bad payloads.
+def parse_message(topic, message):
+    sensor = sensor_for_topic(topic)
+    if sensor is None:
+        return None
+    return sensor, PARSERS[sensor](message)
+
+
+def typed_insert_sql(sensor):
+    table, columns = SENSOR_TABLES[sensor]
+    names = ', '.join(('raw_id', 'device_id', 'ts_ms') + columns)
+    marks = ', '.join('?' * (3 + len(columns)))
+    return f"INSERT OR IGNORE INTO {table} ({names}) VALUES ({marks})"
+
+
+# sensor_data.timestamp ('YYYY-MM-DD HH:MM:SS', UTC) -> epoch milliseconds
+def timestamp_to_ms(timestamp):
+    return calendar.timegm(time.strptime(timestamp, '%Y-%m-%d %H:%M:%S')) * 1000
+
+
+def create_tables(conn):
+    # Only takes effect on a new, empty database; lets retention hand freed
+    # pages back with incremental_vacuum instead of a full VACUUM
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute(RAW_TABLE_SQL)
+    for sql in TYPED_TABLES_SQL:
+        conn.execute(sql)
+    # Raw rows up to this id have their typed rows (see backfill_typed_tables)
+    conn.execute("INSERT OR IGNORE INTO schema_meta (key, value) VALUES ('typed_backfill_id', '0')")
+    conn.commit()
+
+
+# Called by DbWriter in the transaction that wrote raw rows first_id..last_id
+# and their typed rows. Moves the backfill watermark past them when it already
+# covered every row before first_id; otherwise the next backfill closes the
+# gap first. Write transactions are serialized, so batches commit in id order
+# and the watermark keeps up with the live writers, and a restart only has to
+# look at rows that really were never typed.
+def advance_typed_watermark(conn, first_id, last_id):
+    conn.execute(
+        "UPDATE schema_meta SET value = ? WHERE key = 'typed_backfill_id' "
+        "AND CAST(value AS INTEGER) >= ? AND CAST(value AS INTEGER) < ?",
+        (str(last_id), first_id - 1, last_id))
+
+
+# Migration: fill the typed tables from sensor_data rows that predate them.
+# Resumable and idempotent: works in id order from the last recorded watermark,
+# and raw_id is UNIQUE so rows already written by the live ingest are skipped.
+# The live writers advance the watermark too (advance_typed_watermark), so on
+# a database they kept up to date this finds nothing to do.
+def backfill_typed_tables(conn, chunk_size=5000, device_id=DEFAULT_DEVICE_ID):
+    row = conn.execute("SELECT value FROM schema_meta WHERE key = 'typed_backfill_id'").fetchone()
+    last_id = int(row[0]) if row else 0
+    started_id = last_id
+    migrated = 0
+    skipped = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, topic, message, timestamp FROM sensor_data WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, chunk_size)).fetchall()
+        if not rows:
+            break
+        typed = {}
+        for raw_id, topic, message, timestamp in rows:
+            try:
+                parsed = parse_message(topic or '', message or '')
+                if parsed is None:
+                    continue
+                sensor, values = parsed
+                typed.setdefault(sensor, []).append(
+                    (raw_id, device_for_topic(topic, device_id), timestamp_to_ms(timestamp)) + tuple(values))
+            except (ValueError, IndexError, TypeError):
+                skipped += 1
+        last_id = rows[-1][0]
+        with conn:
+            before = conn.total_changes
+            for sensor, values in typed.items():
+                conn.executemany(typed_insert_sql(sensor), values)
+            migrated += conn.total_changes - before
+            # Never moves back past what a live writer already recorded
+            conn.execute(
+                "INSERT INTO schema_meta (key, value) VALUES ('typed_backfill_id', ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value "
+                "WHERE CAST(value AS INTEGER) < CAST(excluded.value AS INTEGER)",
+                (str(last_id),))
+    if migrated or skipped:
+        logger.info(f"Backfilled {migrated} typed rows ({skipped} unparseable) in sensor_data ids "
+                    f"{started_id + 1}..{last_id}")
+    return migrated, skipped
+
+
+if __name__ == "__main__":
+    # Usage: python -m iot_core.sensor_schema [path/to/iot_data.db]
+    path = sys.argv[1] if len(sys.argv) > 1 else 'iot_data.db'
+    conn = sqlite3.connect(path)
+    create_tables(conn)
+    migrated, skipped = backfill_typed_tables(conn)
+    conn.close()
+    print(f"{path}: migrated {migrated} rows, skipped {skipped} unparseable rows")
@@ -0,0 +1,24 @@
+import sqlite3
+
+from iot_core.rollups import backfill_rollups, create_rollup_tables
+from iot_core.sensor_query import ensure_indexes
+from iot_core.sensor_schema import backfill_typed_tables, create_tables
+
+
+# Database setup shared by the services and the GUI: the raw, typed and rollup
+# tables and their indexes, then (optionally) the migration of rows stored
+# before the typed tables and, when a RollupMaintainer is given, before the
+# rollups. Every DbWriter carries a RollupMaintainer, so the rollup tables
+# always have to exist, even where the backfills are skipped.
+def init_db(db_path, backfill=True, rollups=None):
+    conn = sqlite3.connect(db_path)
+    try:
+        create_tables(conn)
+        ensure_indexes(conn)
+        create_rollup_tables(conn)
+        if backfill:
+            backfill_typed_tables(conn)
+        if rollups is not None:
+            backfill_rollups(conn, rollups)
+    finally:
+        conn.close()
@@ -0,0 +1,327 @@
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+
+from iot_core.payload_codec import BINARY, decode_payload, encode_binary, encode_for_topic, is_binary, topic_format
+from iot_core.sensor_schema import sensor_for_topic
+
+logger = logging.getLogger(__name__)
+
+# Store-and-forward for publishers. While the broker is unreachable, messages
+# go to a bounded append-only file instead of being lost; once the connection
+# is back they are drained in rate-limited bursts, oldest first.
+#
+# File format: records of
+#   crc32(I) topic_len(H) payload_len(I) topic payload
+# little-endian, 10 bytes of overhead each. The CRC covers topic and payload,
+# so a record torn by a crash is detected and cut off on open. The read
+# position is kept in <path>.offset; consumed records are only removed when
+# the file is compacted (fully drained, or full).
+
+RECORD = struct.Struct('<IHI')
+OFFSET = struct.Struct('<Q')
+
+MQTT_ERR_SUCCESS = 0
+MQTT_ERR_NO_CONN = 4
+
+
+class RecordBuffer:
+    def __init__(self, path, max_bytes=8 * 1024 * 1024, fsync=False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        self.lock = threading.Lock()
+
+        # Positions are logical (they keep growing across compactions);
+        # physical file offset = position - base
+        self.base = 0
+        self.head = 0  # Next record to drain
+        self.tail = 0  # End of the last record
+        self.records = 0  # Records between head and tail
+
+        self.appended = 0
+        self.drained = 0
+        self.dropped = 0
+        self.compactions = 0
+
+        self._file = None
+        self._offset_file = None
+        self._open()
+
+    def _open(self):
+        mode = 'r+b' if os.path.exists(self.path) else 'w+b'
+        self._file = open(self.path, mode)
+        offset_path = self.path + '.offset'
+        self._offset_file = open(offset_path, 'r+b' if os.path.exists(offset_path) else 'w+b')
+        data = self._offset_file.read(OFFSET.size)
+        offset = OFFSET.unpack(data)[0] if len(data) == OFFSET.size else 0
+
+        # Count the unread records and cut off a torn tail
+        size = os.fstat(self._file.fileno()).st_size
+        offset = min(offset, size)
+        position = offset
+        self._file.seek(position)
+        while position < size:
+            record = self._read_record()
+            if record is None:
+                logger.warning(f"Discarding {size - position} bytes of a damaged record at the end of {self.path}")
+                self._file.truncate(position)
+                break
+            position += RECORD.size + len(record[0]) + len(record[1])
+            self.records += 1
+        self.head = offset
+        self.tail = position
+        if self.records:
+            logger.info(f"Store-and-forward buffer {self.path} holds {self.records} unsent messages")
+
+    def _read_record(self):
+        header = self._file.read(RECORD.size)
+        if len(header) < RECORD.size:
+            return None
+        crc, topic_len, payload_len = RECORD.unpack(header)
+        body = self._file.read(topic_len + payload_len)
+        if len(body) < topic_len + payload_len or zlib.crc32(body) != crc:
+            return None
+        return body[:topic_len], body[topic_len:]
+
+    def _write_offset(self):
+        self._offset_file.seek(0)
+        self._offset_file.write(OFFSET.pack(self.head - self.base))
+        self._offset_file.flush()
+
+    def __len__(self):
+        return self.records
+
+    @property
+    def depth_bytes(self):
+        return self.tail - self.head
+
+    def append(self, topic, payload):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        topic_bytes = topic.encode()
+        body = topic_bytes + payload
+        record = RECORD.pack(zlib.crc32(body), len(topic_bytes), len(payload)) + body
+        if len(record) > self.max_bytes:
+            raise ValueError(f"Message of {len(record)} bytes does not fit a {self.max_bytes} byte buffer")
+        with self.lock:
+            if self.tail - self.base + len(record) > self.max_bytes:
+                self._make_room(len(record))
+            self._file.seek(self.tail - self.base)
+            self._file.write(record)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.tail += len(record)
+            self.records += 1
+            self.appended += 1
+
+    # Full: drop the consumed prefix and, if that is not enough, the oldest
+    # unread records (at least a tenth of the buffer, so a buffer that stays
+    # full is compacted once per ~10% of writes rather than on every append)
+    def _make_room(self, needed):
+        target = max(needed, self.max_bytes // 10)
+        if self.tail - self.head + target > self.max_bytes:
+            self._file.seek(self.head - self.base)
+            while self.head < self.tail and self.tail - self.head + target > self.max_bytes:
+                record = self._read_record()
+                if record is None:
+                    break
+                size = RECORD.size + len(record[0]) + len(record[1])
+                self.head += size
+                self.records -= 1
+                self.dropped += 1
+            logger.warning(f"Store-and-forward buffer full, dropped oldest messages ({self.dropped} so far)")
+        self._compact()
+
+    def _compact(self):
+        self._file.seek(self.head - self.base)
+        remaining = self._file.read(self.tail - self.head)
+        self._file.seek(0)
+        self._file.write(remaining)
+        self._file.truncate(len(remaining))
+        self._file.flush()
+        self.base = self.head
+        self._write_offset()
+        self.compactions += 1
+
+    # Up to n of the oldest records as ([(topic, payload)], end position);
+    # the records stay buffered until commit(end)
+    def peek(self, n):
+        with self.lock:
+            self._file.seek(self.head - self.base)
+            records = []
+            position = self.head
+            while len(records) < n and position < self.tail:
+                record = self._read_record()
+                if record is None:
+                    break
+                records.append((record[0].decode(), record[1]))
+                position += RECORD.size + len(record[0]) + len(record[1])
+            return records, position
+
+    # Records that _make_room dropped after the peek are already gone and
+    # counted as dropped, so only the ones still between head and end count
+    def commit(self, end):
+        with self.lock:
+            if end <= self.head:
+                return  # Already dropped by _make_room
+            count = 0
+            position = self.head
+            while position < end:
+                self._file.seek(position - self.base)
+                _, topic_len, payload_len = RECORD.unpack(self._file.read(RECORD.size))
+                position += RECORD.size + topic_len + payload_len
+                count += 1
+            self.head = end
+            self.records -= count
+            self.drained += count
+            if self.head == self.tail:
+                self._compact()  # Empty again: truncate the file
+            else:
+                self._write_offset()
+
+    def close(self):
+        with self.lock:
+            self._file.close()
+            self._offset_file.close()
+
+    def stats(self):
+        return {
+            'depth': self.records,
+            'depth_bytes': self.depth_bytes,
+            'appended': self.appended,
+            'drained': self.drained,
+            'dropped': self.dropped,
+            'compactions': self.compactions,
+        }
+
+
+# Wraps a paho client: publish() sends directly while the client is connected
+# and nothing is buffered, and appends to the RecordBuffer otherwise (also
+# when the send fails), so the order of messages is kept. Text sensor
+# payloads carry no timestamp and would be stored at their replay time, so
+# they are buffered as binary frames stamped with the capture time instead. A drain thread
+# empties the buffer after a reconnect at no more than drain_rate messages
+# per second, in bursts of `burst`. Messages are published with QoS 1; once
+# paho has accepted a message it keeps and resends it itself across a
+# reconnect, so a drained record is committed as soon as publish returns.
+class BufferedPublisher:
+    def __init__(self, client, buffer, qos=1, drain_rate=200.0, burst=50):
+        self.client = client
+        self.buffer = buffer
+        self.qos = qos
+        self.drain_rate = drain_rate
+        self.burst = burst
+        self.connected = False
+        self.sent_direct = 0
+        self.publish_failures = 0
+        self.reconnects = 0
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Chain any callbacks the caller already installed
+        self._on_connect = client.on_connect
+        self._on_disconnect = client.on_disconnect
+        client.on_connect = self.on_connect
+        client.on_disconnect = self.on_disconnect
+
+    def on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            if self.connected is False and self.buffer.records:
+                logger.info(f"Connected, draining {self.buffer.records} buffered messages")
+            self.connected = True
+            self._wake.set()
+        if self._on_connect is not None:
+            self._on_connect(client, userdata, flags, rc)
+
+    def on_disconnect(self, client, userdata, rc):
+        if self.connected:
+            self.reconnects += 1
+            logger.warning(f"Disconnected from broker (rc={rc}), buffering messages")
+        self.connected = False
+        if self._on_disconnect is not None:
+            self._on_disconnect(client, userdata, rc)
+
+    # ts_ms: when a text payload was sampled (default: now), kept if it is buffered
+    def publish(self, topic, payload, ts_ms=None):
+        if self.connected and not self.buffer.records:
+            info = self.client.publish(topic, payload, qos=self.qos)
+            if info.rc == MQTT_ERR_SUCCESS or (self.qos and info.rc == MQTT_ERR_NO_CONN):
+                self.sent_direct += 1
+                return True
+            self.publish_failures += 1
+        self.buffer.append(topic, self._stamped(topic, payload, ts_ms))
+        self._wake.set()
+        return False
+
+    # Sensor samples [(ts_ms, values)] in the format negotiated for the topic
+    def publish_samples(self, topic, samples):
+        if topic_format(topic) == BINARY:
+            return self.publish(topic, encode_binary(sensor_for_topic(topic), samples))
+        payloads = encode_for_topic(topic, samples)
+        return all([self.publish(topic, payload, ts_ms) for (ts_ms, _), payload in zip(samples, payloads)])
+
+    def _stamped(self, topic, payload, ts_ms):
+        if isinstance(payload, (bytes, bytearray)) and is_binary(payload):
+            return payload
+        try:
+            sensor, samples = decode_payload(topic, payload, ts_ms)
+        except (ValueError, UnicodeDecodeError):
+            return payload  # Not ours to fix; forwarded as it came
+        if sensor is None:
+            return payload
+        return encode_binary(sensor, samples)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._drain_loop, name="StoreAndForward", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _drain_loop(self):
+        while not self._stop.is_set():
+            if not (self.connected and self.buffer.records):
+                self._wake.wait(1.0)
+                self._wake.clear()
+                continue
+            started = time.monotonic()
+            records, end = self.buffer.peek(self.burst)
+            sent = 0
+            for topic, payload in records:
+                info = self.client.publish(topic, payload, qos=self.qos)
+                if not (info.rc == MQTT_ERR_SUCCESS or (self.qos and info.rc == MQTT_ERR_NO_CONN)):
+                    self.publish_failures += 1
+                    break
+                sent += 1
+            if sent:
+                # Commit only the records that went out
+                unsent = sum(RECORD.size + len(topic.encode()) + len(payload) for topic, payload in records[sent:])
+                self.buffer.commit(end - unsent)
+            # Rate limit: a burst of n messages takes at least n / drain_rate seconds
+            pause = max(sent, 1) / self.drain_rate - (time.monotonic() - started)
+            if pause > 0:
+                self._stop.wait(pause)
+
+    def stats(self):
+        stats = self.buffer.stats()
+        stats.update({
+            'connected': self.connected,
+            'sent_direct': self.sent_direct,
+            'publish_failures': self.publish_failures,
+            'reconnects': self.reconnects,
+        })
+        return stats
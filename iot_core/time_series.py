@@ -0,0 +1,97 @@
+import numpy as np
+
+from iot_core.downsampling import downsample_indices
+from iot_core.sensor_query import iter_sensor
+from iot_core.sensor_schema import SENSOR_TABLES
+
+DEFAULT_MAX_POINTS = 2_000_000  # Per series; about a week of 1 Hz data for three chairs
+
+
+# Append-only, array-backed time series: an int64 ts_ms column and a float64
+# value matrix (one column per field), grown by doubling. Points are kept in
+# time order so a visible range is two binary searches, and only the
+# downsampled slice of that range is ever handed to the widget.
+class TimeSeries:
+    def __init__(self, columns, max_points=DEFAULT_MAX_POINTS, capacity=1024):
+        self.columns = list(columns)
+        self.max_points = max_points
+        self.ts = np.empty(capacity, dtype=np.int64)
+        self.values = np.empty((capacity, len(self.columns)), dtype=np.float64)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        if needed <= len(self.ts):
+            return
+        capacity = max(needed, len(self.ts) * 2)
+        ts = np.empty(capacity, dtype=np.int64)
+        values = np.empty((capacity, len(self.columns)), dtype=np.float64)
+        ts[:self.size] = self.ts[:self.size]
+        values[:self.size] = self.values[:self.size]
+        self.ts, self.values = ts, values
+
+    def append(self, ts_ms, values):
+        self.extend(np.array([ts_ms], dtype=np.int64), np.array([values], dtype=np.float64))
+
+    def extend(self, ts_ms, values):
+        ts_ms = np.asarray(ts_ms, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64).reshape(len(ts_ms), len(self.columns))
+        if not len(ts_ms):
+            return
+        self._reserve(len(ts_ms))
+        start, end = self.size, self.size + len(ts_ms)
+        self.ts[start:end] = ts_ms
+        self.values[start:end] = values
+        self.size = end
+        # Out-of-order input (history loaded after live data, late samples): re-sort
+        if (start and ts_ms[0] < self.ts[start - 1]) or np.any(np.diff(ts_ms) < 0):
+            order = np.argsort(self.ts[:end], kind='stable')
+            self.ts[:end] = self.ts[:end][order]
+            self.values[:end] = self.values[:end][order]
+        if self.size > self.max_points:
+            drop = self.size - self.max_points
+            self.ts[:self.max_points] = self.ts[drop:self.size]
+            self.values[:self.max_points] = self.values[drop:self.size]
+            self.size = self.max_points
+
+    def first_ts(self):
+        return int(self.ts[0]) if self.size else None
+
+    def last_ts(self):
+        return int(self.ts[self.size - 1]) if self.size else None
+
+    # Views (no copy) of the points with start_ms <= ts < end_ms
+    def window(self, start_ms=None, end_ms=None):
+        ts = self.ts[:self.size]
+        lo = 0 if start_ms is None else int(np.searchsorted(ts, start_ms, 'left'))
+        hi = self.size if end_ms is None else int(np.searchsorted(ts, end_ms, 'left'))
+        return ts[lo:hi], self.values[lo:hi]
+
+    # At most ~max_points per column for the range; each column is reduced
+    # separately so every column keeps its own peaks
+    def downsampled(self, start_ms=None, end_ms=None, max_points=1000, method='minmax', columns=None):
+        ts, values = self.window(start_ms, end_ms)
+        result = []
+        for column in (range(len(self.columns)) if columns is None else columns):
+            indices = downsample_indices(ts, values[:, column], max_points, method)
+            result.append((ts[indices], values[indices, column]))
+        return result
+
+
+# Load a sensor's typed history into a TimeSeries (oldest first)
+def load_series(conn, sensor, device_id=None, start_ms=None, end_ms=None, series=None):
+    _, columns = SENSOR_TABLES[sensor]
+    if series is None:
+        series = TimeSeries(columns)
+    chunk_ts, chunk_values = [], []
+    for row in iter_sensor(conn, sensor, device_id, start_ms, end_ms, batch_size=5000):
+        chunk_ts.append(row[2])
+        chunk_values.append(row[3:])
+        if len(chunk_ts) >= 50000:
+            series.extend(chunk_ts, chunk_values)
+            chunk_ts, chunk_values = [], []
+    series.extend(chunk_ts, chunk_values)
+    return series
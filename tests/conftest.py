@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from iot_core.storage import init_db  # noqa: E402
+
+
+# An empty database with every table and index, without the backfills
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'iot_data.db')
+    init_db(path, backfill=False)
+    return path
@@ -0,0 +1,126 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from iot_core.analytics import bad_posture_by_hour, hourly_summary, load, tilt_distribution
+from iot_core.db_writer import DbWriter
+from iot_core.export import DAY_MS, export_history, have_pyarrow, list_partitions
+from iot_core.payload_codec import format_text
+from iot_core.sensor_fusion import FUSION_TOLERANCE_MS
+
+DAY = 19_800 * DAY_MS  # A UTC midnight
+HOUR_MS = 3_600_000
+GOOD = (50, 50)
+BAD = (100, 20)  # Seat and back far apart
+
+FORMATS = ['npz', pytest.param('parquet', marks=pytest.mark.skipif(not have_pyarrow(), reason="needs pyarrow"))]
+
+
+def write(db_path, samples):
+    writer = DbWriter(db_path, stats_interval=0)
+    writer.start()
+    try:
+        for device_id, sensor, ts_ms, values in samples:
+            writer.write(f"iot/home/{device_id}/{sensor}", format_text(sensor, values), device_id, values, ts_ms)
+        writer.flush(5.0)
+    finally:
+        writer.stop()
+
+
+def export(db_path, out_dir, fmt='npz'):
+    conn = sqlite3.connect(db_path)
+    try:
+        return export_history(conn, str(out_dir), fmt=fmt)
+    finally:
+        conn.close()
+
+
+def posture_report(db_path, tmp_path, samples, **options):
+    write(db_path, samples)
+    export(db_path, tmp_path / 'export')
+    return bad_posture_by_hour(str(tmp_path / 'export'), **options)
+
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_export_partitions_by_day_and_device(db_path, tmp_path, fmt):
+    write(db_path, [('chair-1', 'dht', DAY + 1000, (21.0, 40.0)),
+                    ('chair-1', 'dht', DAY + DAY_MS + 1000, (22.0, 41.0)),
+                    ('chair-2', 'dht', DAY + 2000, (23.0, 42.0))])
+    export(db_path, tmp_path / 'export', fmt)
+    partitions = [(day, device_id) for day, device_id, _ in list_partitions(str(tmp_path / 'export'), 'dht')]
+    assert partitions == [('2024-03-18', 'chair-1'), ('2024-03-18', 'chair-2'), ('2024-03-19', 'chair-1')]
+
+    data = load(str(tmp_path / 'export'), 'dht', devices={'chair-1'})
+    assert data['ts_ms'].tolist() == [DAY + 1000, DAY + DAY_MS + 1000]
+    assert data['temperature'].tolist() == [21.0, 22.0]
+    assert data['device_id'].tolist() == ['chair-1', 'chair-1']
+
+
+def test_incremental_export_only_appends_new_rows(db_path, tmp_path):
+    write(db_path, [('chair-1', 'dht', DAY + 1000, (21.0, 40.0))])
+    export(db_path, tmp_path / 'export')
+    write(db_path, [('chair-1', 'dht', DAY + 2000, (22.0, 40.0))])
+    report = export(db_path, tmp_path / 'export')
+    assert report['dht']['rows'] == 1
+    assert load(str(tmp_path / 'export'), 'dht')['temperature'].tolist() == [21.0, 22.0]
+
+
+def test_hourly_summary_and_tilt_distribution(db_path, tmp_path):
+    write(db_path, [('chair-1', 'dht', DAY + 1000, (20.0, 40.0)),
+                    ('chair-1', 'dht', DAY + 2000, (24.0, 40.0)),
+                    ('chair-1', 'dht', DAY + HOUR_MS, (30.0, 40.0)),
+                    ('chair-1', 'accelerometer', DAY, (3.0, 4.0, 0.0)),
+                    ('chair-1', 'accelerometer', DAY + 1000, (0.5, 0.0, 0.0))])
+    export(db_path, tmp_path / 'export')
+    summary = hourly_summary(str(tmp_path / 'export'), 'dht', 'temperature')['chair-1']
+    assert summary['hour_ms'].tolist() == [DAY, DAY + HOUR_MS]
+    assert summary['count'].tolist() == [2, 1]
+    assert summary['mean'].tolist() == [22.0, 30.0]
+    assert summary['min'].tolist() == [20.0, 30.0]
+    assert summary['max'].tolist() == [24.0, 30.0]
+
+    counts, edges = tilt_distribution(str(tmp_path / 'export'))
+    assert counts.sum() == 2
+    assert counts[0] == 1 and counts[5] == 1  # Magnitudes 0.5 and 5
+
+
+def test_posture_pairs_with_the_nearest_pressure_sample(db_path, tmp_path):
+    t = DAY + 10 * 60_000
+    report = posture_report(db_path, tmp_path, [
+        ('chair-1', 'pressure', t - 6000, BAD),
+        ('chair-1', 'pressure', t + 1000, GOOD),  # Later, but nearer
+        ('chair-1', 'accelerometer', t, (0.0, 0.0, 0.0)),
+    ])
+    assert report['chair-1']['samples'].tolist() == [1]
+    assert report['chair-1']['bad'].tolist() == [0]
+
+
+def test_posture_pairs_within_the_fusion_tolerance(db_path, tmp_path):
+    t = DAY + 10 * 60_000
+    report = posture_report(db_path, tmp_path, [
+        ('chair-1', 'pressure', t, BAD),
+        ('chair-1', 'accelerometer', t + FUSION_TOLERANCE_MS, (0.0, 0.0, 0.0)),
+        ('chair-1', 'accelerometer', t + FUSION_TOLERANCE_MS + 1, (0.0, 0.0, 0.0)),
+        ('chair-2', 'pressure', t + 5 * 60_000, GOOD),
+        ('chair-2', 'accelerometer', t + 5 * 60_000 - FUSION_TOLERANCE_MS - 1, (0.0, 0.0, 0.0)),
+    ])
+    assert report['chair-1']['samples'].tolist() == [1]
+    assert report['chair-1']['bad'].tolist() == [1]
+    assert 'chair-2' not in report
+
+
+def test_posture_pairs_across_midnight(db_path, tmp_path):
+    midnight = DAY + DAY_MS
+    report = posture_report(db_path, tmp_path, [
+        ('chair-1', 'pressure', midnight - 60_000, GOOD),
+        ('chair-1', 'accelerometer', midnight - 1000, (0.0, 0.0, 0.0)),  # Nearest: next day
+        ('chair-1', 'pressure', midnight + 500, BAD),
+        ('chair-1', 'accelerometer', midnight + 2000, (0.0, 0.0, 0.0)),
+        ('chair-2', 'pressure', midnight - 1000, BAD),
+        ('chair-2', 'accelerometer', midnight + 1000, (0.0, 0.0, 0.0)),  # Nearest: previous day
+    ])
+    assert report['chair-1']['hour_ms'].tolist() == [midnight - HOUR_MS, midnight]
+    assert report['chair-1']['bad'].tolist() == [1, 1]
+    assert report['chair-2']['bad'].tolist() == [1]
+    assert np.allclose(report['chair-1']['bad_percent'], 100.0)
@@ -0,0 +1,103 @@
+import queue
+import sqlite3
+
+from iot_core.db_writer import DbWriter, ForwardingDbWriter
+
+
+def rows(db_path, sql):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def test_batches_commit_every_row(db_path):
+    flushed = []
+    writer = DbWriter(db_path, batch_size=7, flush_interval=10, on_flush=flushed.append)
+    writer.start()
+    for i in range(50):
+        writer.write('iot/sensors/dht', f"Temperature: {i} C, Humidity: 40%", ts_ms=1_700_000_000_000 + i)
+    assert writer.flush(5)
+    writer.stop()
+
+    assert rows(db_path, "SELECT COUNT(*) FROM sensor_data") == [(50,)]
+    # Full batches of 7 went out on their own, the rest on flush()
+    assert [len(batch) for batch in flushed] == [7] * 7 + [1]
+    assert writer.stats()['rows_written'] == 50
+
+
+def test_typed_rows_point_at_their_raw_rows(db_path):
+    writer = DbWriter(db_path, batch_size=4, flush_interval=10)
+    writer.start()
+    for i in range(10):
+        writer.write('iot/home/chair-1/pressure', f"Seat Pressure: {i}, Back Pressure: {i + 1}",
+                     device_id='chair-1', ts_ms=1_700_000_000_000 + i)
+        writer.write('iot/alerts', "Bad posture detected!")  # Raw only, still takes an id
+        writer.write('iot/home/chair-2/accelerometer', None, device_id='chair-2', values=(i, -i, 0.5),
+                     ts_ms=1_700_000_000_000 + i)
+    writer.flush(5)
+    writer.stop()
+
+    raw = dict(rows(db_path, "SELECT id, message FROM sensor_data"))
+    for raw_id, device_id, ts_ms, seat, back in rows(
+            db_path, "SELECT raw_id, device_id, ts_ms, seat, back FROM pressure_data"):
+        assert raw[raw_id] == f"Seat Pressure: {seat}, Back Pressure: {back}"
+        assert device_id == 'chair-1'
+        assert ts_ms == 1_700_000_000_000 + seat
+    accel = rows(db_path, "SELECT s.topic, a.tilt_x, a.tilt_y FROM accelerometer_data a "
+                          "JOIN sensor_data s ON s.id = a.raw_id ORDER BY a.id")
+    assert accel == [('iot/home/chair-2/accelerometer', float(i), float(-i)) for i in range(10)]
+
+
+def test_timestamp_follows_ts_ms(db_path):
+    writer = DbWriter(db_path)
+    writer.start()
+    writer.write('iot/sensors/dht', "Temperature: 20 C, Humidity: 40%", ts_ms=1_714_521_600_000)
+    writer.flush(5)
+    writer.stop()
+    assert rows(db_path, "SELECT timestamp FROM sensor_data") == [('2024-05-01 00:00:00',)]
+    assert rows(db_path, "SELECT ts_ms FROM dht_data") == [(1_714_521_600_000,)]
+
+
+def test_unparseable_message_is_stored_raw_only(db_path):
+    writer = DbWriter(db_path)
+    writer.start()
+    writer.write('iot/sensors/dht', "garbage")
+    writer.flush(5)
+    writer.stop()
+    assert rows(db_path, "SELECT COUNT(*) FROM sensor_data") == [(1,)]
+    assert rows(db_path, "SELECT COUNT(*) FROM dht_data") == [(0,)]
+    assert writer.stats()['parse_errors'] == 1
+
+
+def test_full_queue_drops_instead_of_blocking(db_path):
+    writer = DbWriter(db_path, max_queue=2)  # Not started, so nothing drains
+    results = [writer.write('iot/alerts', str(i)) for i in range(3)]
+    assert results == [True, True, False]
+    assert writer.stats()['rows_dropped'] == 1
+
+
+def test_forwarded_batches_share_one_writer(db_path):
+    # The ingest cluster passes a multiprocessing queue; the API is the same
+    sink = queue.Queue()
+    workers = [ForwardingDbWriter(db_path, sink, batch_size=5, flush_interval=10) for _ in range(2)]
+    for writer in workers:
+        writer.start()
+    for i in range(12):
+        for index, writer in enumerate(workers):
+            writer.write(f"iot/home/chair-{index}/dht", None, device_id=f"chair-{index}", values=(20.0 + i, 40.0),
+                         ts_ms=1_700_000_000_000 + i)
+    for writer in workers:
+        writer.stop()
+    assert [writer.stats()['rows_written'] for writer in workers] == [12, 12]
+    sink.put(None)
+
+    server = DbWriter(db_path, batch_size=50, stats_interval=0)
+    server.serve(sink)
+    # Waiting batches were merged into a single transaction
+    assert server.stats()['flush_count'] == 1
+    assert rows(db_path, "SELECT COUNT(*) FROM sensor_data") == [(24,)]
+    for index in range(2):
+        stored = rows(db_path, f"SELECT temperature FROM dht_data WHERE device_id = 'chair-{index}' ORDER BY raw_id")
+        assert [t for t, in stored] == [20.0 + i for i in range(12)]
@@ -0,0 +1,73 @@
+import importlib
+import os
+import sys
+import types
+
+import pytest
+
+pytest.importorskip('PyQt5')
+
+GUI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'gui')
+TOPIC = 'iot/home/chair-1/accelerometer'
+VALUES = (1.5, -2.0, 0.25)
+
+
+class Dispatcher:
+    def __init__(self):
+        self.posted = []
+
+    def post(self, name, *args):
+        self.posted.append((name, args))
+
+    def plotted(self):
+        return [args for name, args in self.posted if name == 'plot']
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # main_gui opens gui.log in the working directory when imported
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(GUI_DIR)
+    main_gui = importlib.import_module('main_gui')
+    written = []
+    monkeypatch.setattr(main_gui, 'log_to_db', lambda *args, **kwargs: written.append(args))
+    window = types.SimpleNamespace(dispatcher=Dispatcher())
+    client = main_gui.Mqtt_client(window)
+    client.written = written
+    return client
+
+
+# Through paho's callback and the ingest worker, like a live message
+def receive(client, payload):
+    client.worker.start()
+    client.on_message(None, None, types.SimpleNamespace(topic=TOPIC, payload=payload))
+    client.worker.stop()
+    return client.main_window.dispatcher.plotted()[-1][1]
+
+
+def db_row(row_id, ts_ms, values=VALUES):
+    return (row_id, 'chair-1', ts_ms) + tuple(values)
+
+
+def test_live_sample_stored_by_another_process_is_shown_once(client):
+    ts_ms = receive(client, b"Tilt X: 1.5, Tilt Y: -2.0, Tilt Z: 0.25")
+    # The data manager stamped the same sample with its own, later receive time
+    client.on_db_rows('accelerometer', [db_row(1, ts_ms + 40)])
+    assert len(client.main_window.dispatcher.plotted()) == 1
+    assert len(client.written) == 1
+
+
+def test_sample_seen_in_the_db_first_is_not_shown_again_live(client):
+    client.on_db_rows('accelerometer', [db_row(1, 1_700_000_000_000)])
+    dispatcher = client.main_window.dispatcher
+    assert len(dispatcher.plotted()) == 1
+    client.handle_message(TOPIC, b"Tilt X: 1.5, Tilt Y: -2.0, Tilt Z: 0.25", 1_700_000_000_030)
+    assert len(dispatcher.plotted()) == 1
+    assert len(client.written) == 1  # Still stored by the GUI
+
+
+def test_other_db_rows_are_still_shown(client):
+    ts_ms = receive(client, b"Tilt X: 1.5, Tilt Y: -2.0, Tilt Z: 0.25")
+    client.on_db_rows('accelerometer', [db_row(1, ts_ms + 40, (3.0, 3.0, 3.0)),
+                                        db_row(2, ts_ms + 15000)])
+    assert [args[1] for args in client.main_window.dispatcher.plotted()] == [ts_ms, ts_ms + 40, ts_ms + 15000]
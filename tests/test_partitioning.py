@@ -0,0 +1,20 @@
+from iot_core.partitioning import Partitioner, partition_for, partition_key
+
+TOPICS = ['iot/home/chair-1/accelerometer', 'iot/home/chair-1/pressure', 'iot/office/chair-7/dht',
+          'iot/sensors/pressure', 'iot/sensors/accelerometer']
+
+
+def test_partition_key_is_the_device_id():
+    assert partition_key('iot/home/chair-1/accelerometer') == 'chair-1'
+    assert partition_key('iot/sensors/pressure') == 'default'
+    assert partition_key('iot/alerts') == 'iot/alerts'
+
+
+# local_broker.py picks shared subscription members with partition_key too,
+# so --mode fanout and --mode share keep the same devices together
+def test_partitioner_uses_partition_key():
+    partitioner = Partitioner(4)
+    for topic in TOPICS:
+        assert partitioner.partition(topic) == partition_for(partition_key(topic), 4)
+    assert partitioner.partition(TOPICS[0]) == partitioner.partition(TOPICS[1])
+    assert partitioner.partition(TOPICS[3]) == partitioner.partition(TOPICS[4])
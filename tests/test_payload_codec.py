@@ -0,0 +1,66 @@
+import pytest
+
+from iot_core.payload_codec import (BINARY, HEADER, TOPIC_FORMATS, decode_binary, decode_payload, encode_binary,
+                                    encode_for_topic, format_text, is_binary, set_topic_format)
+
+
+@pytest.fixture(autouse=True)
+def clean_formats():
+    TOPIC_FORMATS.clear()
+    yield
+    TOPIC_FORMATS.clear()
+
+
+@pytest.mark.parametrize('sensor, values', [
+    ('accelerometer', (-0.95, 12.34, 89.99)),
+    ('pressure', (73, 65)),
+    ('dht', (-12.5, 99.9)),
+])
+def test_binary_round_trip(sensor, values):
+    samples = [(1_714_521_600_000 + i * 250, values) for i in range(5)]
+    payload = encode_binary(sensor, samples)
+    assert is_binary(payload)
+    decoded_sensor, decoded = decode_binary(payload)
+    assert decoded_sensor == sensor
+    assert [ts for ts, _ in decoded] == [ts for ts, _ in samples]
+    for _, decoded_values in decoded:
+        assert decoded_values == pytest.approx(values)
+
+
+def test_binary_values_are_fixed_point():
+    # 1/100 degree for tilt: more decimals are rounded away
+    _, [(_, values)] = decode_binary(encode_binary('accelerometer', [(0, (1.234, -1.236, 0.0))]))
+    assert values == pytest.approx((1.23, -1.24, 0.0))
+
+
+def test_text_round_trip_uses_receive_time():
+    text = format_text('dht', (22.5, 39.8))
+    assert decode_payload('iot/home/chair-1/dht', text.encode(), received_ms=42) == ('dht', [(42, (22.5, 39.8))])
+
+
+def test_decode_payload_detects_the_format():
+    payload = encode_binary('pressure', [(1000, (1, 2)), (1500, (3, 4))])
+    assert decode_payload('iot/home/chair-1/pressure', payload, received_ms=9999) == \
+        ('pressure', [(1000, (1, 2)), (1500, (3, 4))])
+    assert decode_payload('iot/alerts', b"Bad posture detected!") == (None, [])
+
+
+@pytest.mark.parametrize('payload', [
+    b"Seat Pressure: 73",  # Text missing a field
+    bytes([0xA5, 1, 99, 1, 0]) + bytes(HEADER.size),  # Unknown sensor code
+    encode_binary('dht', [(0, (1.0, 2.0))])[:-1],  # Truncated sample
+])
+def test_malformed_payloads_raise_value_error(payload):
+    with pytest.raises(ValueError):
+        decode_payload('iot/sensors/pressure', payload)
+
+
+def test_encode_for_topic_follows_the_topic_format():
+    samples = [(1000, (1, 2)), (2000, (3, 4))]
+    assert encode_for_topic('iot/sensors/pressure', samples) == \
+        ["Seat Pressure: 1, Back Pressure: 2", "Seat Pressure: 3, Back Pressure: 4"]
+    set_topic_format('iot/sensors/pressure', BINARY)
+    [payload] = encode_for_topic('iot/sensors/pressure', samples)
+    assert decode_binary(payload) == ('pressure', samples)
+    with pytest.raises(ValueError):
+        set_topic_format('iot/sensors/pressure', 'xml')
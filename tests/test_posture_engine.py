@@ -0,0 +1,168 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from iot_core.posture_engine import PostureEngine, PostureSmoother, PostureThresholds, evaluate_posture
+
+
+# The scalar rule PostureDock.calculate_posture used before the engine
+def analyze_posture(tilt_x, tilt_y, seat, back, thresholds=PostureThresholds()):
+    avg_pressure = (seat + back) / 2.0
+    # The scalar version divided by zero here; the engine treats it as no difference
+    pressure_difference_percent = abs(seat - back) / avg_pressure * 100 if avg_pressure else 0.0
+    tilt_magnitude = (tilt_x ** 2 + tilt_y ** 2) ** 0.5
+    return (abs(seat - back) > thresholds.pressure_absolute or
+            pressure_difference_percent > thresholds.pressure_percent or
+            tilt_magnitude > thresholds.tilt_magnitude)
+
+
+NAN = float('nan')
+
+# (tilt_x, tilt_y, seat, back), each on or next to a threshold
+BOUNDARY_CASES = [
+    (9.0, 12.0, 50, 50),  # Tilt magnitude exactly 15: good
+    (9.0, 12.01, 50, 50),  # Just above: bad
+    (-15.0, 0.0, 50, 50),
+    (0.0, 0.0, 110, 90),  # Exactly 20%: good
+    (0.0, 0.0, 111, 90),  # Just above: bad
+    (0.0, 0.0, 238, 200),  # Exactly 38 apart (17.3%): good
+    (0.0, 0.0, 239, 200),  # 39 apart: bad
+    (0.0, 0.0, 0, 0),  # No pressure at all
+    (0.0, 0.0, NAN, 50),  # Missing pressure never makes the posture bad
+    (0.0, 0.0, NAN, NAN),
+    (20.0, 0.0, NAN, 50),  # ... but the tilt still does
+    (NAN, 0.0, 50, 50),
+]
+
+
+@pytest.mark.parametrize('tilt_x, tilt_y, seat, back', BOUNDARY_CASES)
+def test_vectorized_rule_matches_scalar_rule(tilt_x, tilt_y, seat, back):
+    bad, _, _ = evaluate_posture([tilt_x], [tilt_y], [seat], [back])
+    assert bool(bad[0]) == analyze_posture(tilt_x, tilt_y, seat, back)
+
+
+def test_parity_on_random_readings():
+    rng = random.Random(7)
+    readings = [(round(rng.uniform(-20, 20), 2), round(rng.uniform(-20, 20), 2),
+                 rng.randint(0, 120), rng.randint(0, 120)) for _ in range(5000)]
+    readings += BOUNDARY_CASES
+    bad, tilt_magnitude, percent = evaluate_posture(*zip(*readings))
+    assert bad.tolist() == [analyze_posture(*reading) for reading in readings]
+    tilt_x, tilt_y, seat, back = readings[0]
+    assert tilt_magnitude[0] == pytest.approx(math.hypot(tilt_x, tilt_y))
+    assert percent[0] == pytest.approx(abs(seat - back) / ((seat + back) / 2.0) * 100)
+
+
+def test_custom_thresholds():
+    thresholds = PostureThresholds(pressure_absolute=10, pressure_percent=5.0, tilt_magnitude=3.0)
+    readings = [(2.0, 2.0, 50, 50), (1.0, 1.0, 50, 52), (1.0, 1.0, 50, 70)]
+    bad, _, _ = evaluate_posture(*zip(*readings), thresholds)
+    assert bad.tolist() == [analyze_posture(*reading, thresholds) for reading in readings] == [False, False, True]
+
+
+def test_engine_scores_fresh_pairs_like_the_scalar_rule():
+    rng = random.Random(11)
+    engine = PostureEngine(capacity=2)  # Grows on demand
+    readings = {f"chair-{i}": (rng.uniform(-20, 20), rng.uniform(-20, 20), rng.randint(30, 110), rng.randint(30, 110))
+                for i in range(50)}
+    for device_id, (tilt_x, tilt_y, seat, back) in readings.items():
+        engine.update_accel(device_id, tilt_x, tilt_y)
+        if device_id != 'chair-0':
+            engine.update_pressure(device_id, seat, back)
+    verdicts = dict(engine.evaluate())
+    # chair-0 has no pressure reading yet, so it is not scored
+    assert sorted(verdicts) == sorted(set(readings) - {'chair-0'})
+    for device_id, bad in verdicts.items():
+        assert bad == analyze_posture(*readings[device_id])
+    # Scored pairs are consumed
+    assert len(engine.evaluate()) == 0
+
+
+def test_bulk_updates_keep_the_last_value():
+    engine = PostureEngine()
+    engine.update_accel_many(['a', 'b', 'a'], np.array([0.0, 0.0, 20.0]), np.array([0.0, 0.0, 0.0]))
+    engine.update_pressure_many(['a', 'b'], np.array([50, 50]), np.array([50, 50]))
+    assert dict(engine.evaluate()) == {'a': True, 'b': False}
+
+
+def smoothed_engine(**options):
+    options.setdefault('cooldown', 0.0)
+    return PostureEngine(smoother=PostureSmoother(**options))
+
+
+# One fused reading for chair-1 at time now; returns the transitions it caused
+def step(engine, now, tilt_x, seat=50, back=50):
+    engine.update_accel('chair-1', tilt_x, 0.0)
+    engine.update_pressure('chair-1', seat, back)
+    return [bad for _, bad in engine.evaluate_transitions(now)]
+
+
+def test_first_verdict_is_reported_at_once():
+    engine = smoothed_engine(confirm=5)
+    assert step(engine, 0, 20.0) == [True]
+    assert step(engine, 1, 20.0) == []
+
+
+def test_noise_around_the_threshold_does_not_flap():
+    engine = smoothed_engine()
+    rng = random.Random(3)
+    tilts = [15.0 + rng.uniform(-0.6, 0.6) for _ in range(200)]
+    raw = evaluate_posture(tilts, [0.0] * 200, [50] * 200, [50] * 200)[0].tolist()
+    assert sum(a != b for a, b in zip(raw, raw[1:])) > 50  # The per-sample verdict flaps
+    transitions = []
+    for t, tilt in enumerate(tilts):
+        transitions += step(engine, t, tilt)
+    # Once bad, the smoothed tilt never clears the hysteresis band again
+    assert transitions == [False, True]
+
+
+def test_hysteresis_needs_a_clear_recovery():
+    engine = smoothed_engine(window=1, confirm=1)
+    assert step(engine, 0, 16.0) == [True]
+    assert step(engine, 1, 14.0) == []  # Under the threshold, not under 15 * 0.85
+    assert step(engine, 2, 12.0) == [False]
+
+
+def test_debounce_needs_consecutive_samples():
+    engine = smoothed_engine(window=1, hysteresis=0.0, confirm=3)
+    assert step(engine, 0, 0.0) == [False]
+    # Interrupted streaks never confirm
+    assert [step(engine, t, tilt) for t, tilt in enumerate([20.0, 20.0, 0.0, 20.0, 20.0], 1)] == [[]] * 5
+    assert step(engine, 6, 20.0) == [True]
+
+
+def test_cooldown_holds_a_transition_back_until_it_expires():
+    engine = smoothed_engine(window=1, hysteresis=0.0, confirm=1, cooldown=30.0)
+    assert step(engine, 0.0, 0.0) == [False]
+    assert step(engine, 1.0, 20.0) == []
+    assert step(engine, 29.0, 20.0) == []
+    assert step(engine, 30.0, 20.0) == [True]
+    # And the next one waits for the cooldown again
+    assert step(engine, 31.0, 0.0) == []
+    assert step(engine, 60.0, 0.0) == [False]
+
+
+def test_devices_are_smoothed_independently():
+    engine = smoothed_engine(window=1, hysteresis=0.0, confirm=2)
+    engine.update_accel('a', 20.0, 0.0)
+    engine.update_pressure('a', 50, 50)
+    engine.update_accel('b', 0.0, 0.0)
+    engine.update_pressure('b', 50, 50)
+    assert sorted(engine.evaluate_transitions(0)) == [('a', True), ('b', False)]
+    # Only b changes, and only after two readings
+    for t in (1, 2):
+        engine.update_accel('b', 20.0, 0.0)
+        engine.update_pressure('b', 50, 50)
+        verdicts = list(engine.evaluate_transitions(t))
+    assert verdicts == [('b', True)]
+
+
+def test_median_smoothing_ignores_a_spike():
+    engine = smoothed_engine(window=3, method='median', confirm=1)
+    assert step(engine, 0, 0.0) == [False]
+    assert step(engine, 1, 0.0) == []
+    assert step(engine, 2, 90.0) == []
+    with pytest.raises(ValueError):
+        PostureSmoother(method='mode')
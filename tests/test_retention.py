@@ -0,0 +1,88 @@
+import sqlite3
+import time
+
+from iot_core.db_writer import DbWriter
+from iot_core.retention import DAY_MS, RetentionEngine, RetentionPolicy
+from iot_core.rollups import RollupMaintainer
+
+
+def count_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return (conn.execute("SELECT COUNT(*) FROM sensor_data").fetchone()[0],
+                conn.execute("SELECT COUNT(*) FROM dht_data").fetchone()[0])
+    finally:
+        conn.close()
+
+
+def write_samples(db_path, ages_days):
+    now_ms = int(time.time() * 1000)
+    writer = DbWriter(db_path, stats_interval=0, rollups=RollupMaintainer())
+    writer.start()
+    try:
+        for age in ages_days:
+            writer.write('iot/home/chair-1/dht', "Temperature: 22.0 C, Humidity: 40.0%", 'chair-1', (22.0, 40.0),
+                         now_ms - int(age * DAY_MS))
+        writer.flush(5.0)
+    finally:
+        writer.stop()
+
+
+def test_run_once_prunes_rolled_up_raw_rows(db_path):
+    write_samples(db_path, [10, 9, 1])
+    report = RetentionEngine(db_path, RetentionPolicy(raw_days=7, pause=0)).run_once()
+    assert report['deleted']['sensor_data'] == 2
+    assert report['deleted']['dht_data'] == 2
+    assert count_rows(db_path) == (1, 1)
+
+
+def test_start_runs_the_first_pass_immediately(db_path):
+    write_samples(db_path, [10, 1])
+    engine = RetentionEngine(db_path, RetentionPolicy(raw_days=7, pause=0))
+    engine.start(interval=3600)
+    try:
+        deadline = time.monotonic() + 5.0
+        while count_rows(db_path) != (1, 1) and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        engine.stop()
+    assert count_rows(db_path) == (1, 1)
+
+
+def legacy_db(tmp_path):
+    # Created before auto_vacuum was turned on
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE sensor_data (id INTEGER PRIMARY KEY AUTOINCREMENT, topic TEXT, message TEXT, "
+                 "timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def auto_vacuum(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_unconverted_database_warning_names_the_convert_command(tmp_path, caplog):
+    path = legacy_db(tmp_path)
+    report = RetentionEngine(path, RetentionPolicy(pause=0)).run_once()
+    assert not report['incremental_vacuum']
+    assert f"python -m iot_core.retention --db {path} --convert" in caplog.text
+
+
+def test_start_can_convert_on_the_first_pass(tmp_path):
+    path = legacy_db(tmp_path)
+    engine = RetentionEngine(path, RetentionPolicy(pause=0))
+    engine.start(interval=3600, convert=True)
+    try:
+        deadline = time.monotonic() + 5.0
+        while auto_vacuum(path) != 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        engine.stop()
+    assert auto_vacuum(path) == 2
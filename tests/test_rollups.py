@@ -0,0 +1,104 @@
+import sqlite3
+
+from iot_core.db_writer import DbWriter
+from iot_core.rollups import RollupMaintainer, backfill_rollups, get_watermark, query_rollups
+
+MINUTE = 60 * 1000
+DHT_TOPIC = 'iot/home/chair-1/dht'
+
+
+def write_dht(writer, temperatures, start_ms=0):
+    for i, temperature in enumerate(temperatures):
+        writer.write(DHT_TOPIC, f"Temperature: {temperature} C, Humidity: 40.0%", 'chair-1', (temperature, 40.0),
+                     start_ms + i * 1000)
+    writer.flush(5.0)
+
+
+def temperature_minutes(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return query_rollups(conn, 'dht', 'temperature', 'minute', 'chair-1'), get_watermark(conn)
+    finally:
+        conn.close()
+
+
+def test_writer_rolls_up_each_batch(db_path):
+    writer = DbWriter(db_path, stats_interval=0, rollups=RollupMaintainer())
+    writer.start()
+    try:
+        write_dht(writer, [20.0, 22.0, 27.0])
+        write_dht(writer, [30.0], start_ms=MINUTE)
+    finally:
+        writer.stop()
+    buckets, watermark = temperature_minutes(db_path)
+    assert buckets == [(0, 3, 20.0, 27.0, 23.0), (MINUTE, 1, 30.0, 30.0, 30.0)]
+    assert watermark == 4
+
+
+def test_interleaved_writers_cover_every_row(db_path):
+    # Two processes writing the same database, e.g. the data manager and the GUI
+    writers = [DbWriter(db_path, stats_interval=0, rollups=RollupMaintainer()) for _ in range(2)]
+    for writer in writers:
+        writer.start()
+    try:
+        for round_ in range(5):
+            for writer in writers:
+                write_dht(writer, [21.0, 23.0], start_ms=round_ * 10000)
+    finally:
+        for writer in writers:
+            writer.stop()
+    buckets, watermark = temperature_minutes(db_path)
+    assert buckets == [(0, 20, 21.0, 23.0, 22.0)]
+    assert watermark == 20
+    # Nothing left for the backfill, and nothing counted twice
+    conn = sqlite3.connect(db_path)
+    try:
+        assert backfill_rollups(conn) == 0
+    finally:
+        conn.close()
+    assert temperature_minutes(db_path)[0] == buckets
+
+
+def test_backfill_rolls_up_older_rows_once(db_path):
+    # Rows stored before the rollups existed
+    writer = DbWriter(db_path, stats_interval=0)
+    writer.start()
+    try:
+        write_dht(writer, [20.0, 24.0])
+    finally:
+        writer.stop()
+    assert temperature_minutes(db_path) == ([], 0)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        assert backfill_rollups(conn, chunk_size=1) == 2
+        assert backfill_rollups(conn) == 0
+    finally:
+        conn.close()
+    assert temperature_minutes(db_path) == ([(0, 2, 20.0, 24.0, 22.0)], 2)
+
+    # The live writer carries on from the backfilled watermark
+    writer = DbWriter(db_path, stats_interval=0, rollups=RollupMaintainer())
+    writer.start()
+    try:
+        write_dht(writer, [26.0], start_ms=2000)
+    finally:
+        writer.stop()
+    assert temperature_minutes(db_path) == ([(0, 3, 20.0, 26.0, 70.0 / 3)], 3)
+
+
+def test_posture_ratio_is_rolled_up(db_path):
+    writer = DbWriter(db_path, stats_interval=0, rollups=RollupMaintainer())
+    writer.start()
+    try:
+        writer.write('iot/home/chair-1/accelerometer', "Tilt X: 0.0, Tilt Y: 0.0, Tilt Z: 0.0", 'chair-1',
+                     (0.0, 0.0, 0.0), 1000)
+        writer.write('iot/home/chair-1/pressure', "Seat Pressure: 50, Back Pressure: 50", 'chair-1', (50, 50), 1500)
+        writer.flush(5.0)
+    finally:
+        writer.stop()
+    conn = sqlite3.connect(db_path)
+    try:
+        assert query_rollups(conn, 'posture', 'bad', 'minute', 'chair-1') == [(0, 1, 0.0, 0.0, 0.0)]
+    finally:
+        conn.close()
@@ -0,0 +1,119 @@
+import pytest
+
+from iot_core.rules import RuleEngine, analyze_data, parse_alert
+
+DHT = 'iot/home/chair-1/dht'
+ACCEL = 'iot/home/chair-1/accelerometer'
+PRESSURE = 'iot/home/chair-1/pressure'
+
+
+def hot(**spec):
+    rule = {'name': 'hot', 'type': 'threshold', 'sensor': 'dht', 'field': 'temperature', 'op': '>', 'value': 29.0,
+            'message': "Hot on {device}: {value}"}
+    rule.update(spec)
+    return rule
+
+
+def test_threshold_fires_per_sample():
+    engine = RuleEngine([hot()])
+    assert engine.process(DHT, 1000, (28.0, 40.0), 'chair-1') == []
+    [alert] = engine.process(DHT, 2000, (30.5, 40.0), 'chair-1')
+    assert (alert.rule, alert.device_id, alert.ts_ms, alert.value) == ('hot', 'chair-1', 2000, 30.5)
+    assert alert.message == "Hot on chair-1: 30.5"
+    assert len(engine.process(DHT, 3000, (31.0, 40.0), 'chair-1')) == 1
+
+
+def test_only_rules_of_the_topic_sensor_run():
+    engine = RuleEngine([hot()])
+    assert engine.handles(DHT) and engine.handles('iot/sensors/dht')
+    assert not engine.handles(ACCEL)
+    assert engine.process(ACCEL, 1000, (90.0, 90.0, 0.0)) == []
+    assert engine.sensors() == ['dht']
+
+
+def test_cooldown_is_per_device():
+    engine = RuleEngine([hot(cooldown_sec=10)])
+    assert len(engine.process(DHT, 0, (30.0, 40.0), 'chair-1')) == 1
+    assert engine.process(DHT, 5000, (30.0, 40.0), 'chair-1') == []
+    assert len(engine.process(DHT, 5000, (30.0, 40.0), 'chair-2')) == 1
+    assert len(engine.process(DHT, 10000, (30.0, 40.0), 'chair-1')) == 1
+
+
+def test_repeat_false_fires_on_transitions_only():
+    engine = RuleEngine([hot(repeat=False)])
+    fired = [bool(engine.process(DHT, ts, (t, 40.0))) for ts, t in enumerate([30, 31, 20, 30, 30])]
+    assert fired == [True, False, False, True, False]
+
+
+def test_derived_field():
+    engine = RuleEngine([{'name': 'tilted', 'type': 'threshold', 'sensor': 'accelerometer',
+                          'field': 'tilt_magnitude', 'op': '>', 'value': 15}])
+    assert engine.process(ACCEL, 0, (9.0, 12.0, 0.0)) == []  # magnitude 15
+    [alert] = engine.process(ACCEL, 1, (12.0, 16.0, 0.0))
+    assert alert.value == pytest.approx(20.0)
+
+
+def test_rate_of_change():
+    engine = RuleEngine([{'name': 'jerk', 'type': 'rate_of_change', 'sensor': 'accelerometer', 'field': 'tilt_x',
+                          'max_per_sec': 5.0}])
+    assert engine.process(ACCEL, 0, (0.0, 0.0, 0.0)) == []
+    assert engine.process(ACCEL, 1000, (4.0, 0.0, 0.0)) == []
+    [alert] = engine.process(ACCEL, 1500, (8.0, 0.0, 0.0))
+    assert alert.value == 8.0
+
+
+def test_duration_fires_once_per_episode():
+    engine = RuleEngine([{'name': 'warm', 'type': 'duration_above', 'sensor': 'dht', 'field': 'temperature',
+                          'op': '>', 'value': 27.0, 'seconds': 10}])
+    temperatures = [28, 28, 28, 28, 20, 28, 28, 28]
+    fired = [bool(engine.process(DHT, i * 5000, (t, 40.0))) for i, t in enumerate(temperatures)]
+    # Holds from 0 s, so it fires at 10 s; falls at 20 s and holds again from 25 s, so it fires at 35 s
+    assert fired == [False, False, True, False, False, False, False, True]
+
+
+def test_combination_of_helper_rules():
+    engine = RuleEngine([
+        {'name': 'tilt', 'type': 'threshold', 'sensor': 'accelerometer', 'field': 'tilt_magnitude', 'value': 15,
+         'alert': False},
+        {'name': 'uneven', 'type': 'threshold', 'sensor': 'pressure', 'field': 'pressure_difference_percent',
+         'value': 20, 'alert': False},
+        {'name': 'slouch', 'type': 'all', 'rules': ['tilt', 'uneven'], 'within_sec': 5, 'message': "{value}"},
+    ])
+    assert engine.process(ACCEL, 0, (20.0, 0.0, 0.0)) == []
+    [alert] = engine.process(PRESSURE, 1000, (80, 40))
+    assert alert.message == "tilt, uneven"
+    # The tilt reading is too old to combine with
+    assert engine.process(PRESSURE, 10000, (80, 40)) == []
+
+
+def test_unused_helper_rules_are_not_compiled():
+    engine = RuleEngine([hot(alert=False), hot(name='off', enabled=False)])
+    assert engine.rules == []
+
+
+@pytest.mark.parametrize('specs', [
+    [hot(sensor='lidar')],
+    [hot(field='pressure')],
+    [hot(op='=>')],
+    [hot(), hot()],
+    [{'name': 'both', 'type': 'all', 'rules': ['hot']}, hot()],
+    [hot(type='median')],
+])
+def test_invalid_rules_are_rejected(specs):
+    with pytest.raises(ValueError):
+        RuleEngine(specs)
+
+
+def test_colored_alert_round_trip():
+    engine = RuleEngine([hot(color='blue')])
+    [message] = analyze_data(engine, DHT, (30.0, 40.0), 0, 'chair-1')
+    assert parse_alert(message) == ("Hot on chair-1: 30.0", 'blue')
+    assert parse_alert("Good posture!") == ("Good posture!", None)
+
+
+def test_stats_count_evaluations():
+    engine = RuleEngine([hot()])
+    for ts in range(3):
+        engine.process(DHT, ts, (30.0, 40.0))
+    stats = engine.stats()['hot']
+    assert (stats['evaluations'], stats['fired']) == (3, 3)
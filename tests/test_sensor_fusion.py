@@ -0,0 +1,93 @@
+import pytest
+
+from iot_core.sensor_fusion import SensorFusion
+
+ACCEL = (1.0, 2.0, 3.0)
+PRESSURE = (70, 60)
+
+
+def test_pairs_nearest_sample_within_tolerance():
+    fusion = SensorFusion(tolerance_ms=1000)
+    assert fusion.add('chair-1', 'pressure', 1000, (10, 10)) == []
+    assert fusion.add('chair-1', 'pressure', 1800, PRESSURE) == []
+    [fused] = fusion.add('chair-1', 'accelerometer', 2000, ACCEL)
+    assert (fused.device_id, fused.ts_ms, fused.accel, fused.pressure) == ('chair-1', 2000, ACCEL, PRESSURE)
+    assert not fused.interpolated
+    # The older pressure sample can no longer pair and is consumed with the match
+    assert fusion.pending() == 0
+    assert fusion.stats()['matched'] == 1
+
+
+def test_fused_timestamp_is_the_later_sample():
+    fusion = SensorFusion(tolerance_ms=1000)
+    fusion.add('chair-1', 'accelerometer', 1000, ACCEL)
+    [fused] = fusion.add('chair-1', 'pressure', 1500, PRESSURE)
+    assert fused.ts_ms == 1500
+    assert (fused.accel, fused.pressure) == (ACCEL, PRESSURE)
+
+
+def test_samples_outside_tolerance_wait():
+    fusion = SensorFusion(tolerance_ms=1000)
+    fusion.add('chair-1', 'accelerometer', 1000, ACCEL)
+    assert fusion.add('chair-1', 'pressure', 2500, PRESSURE) == []
+    assert fusion.pending() == 2
+
+
+def test_devices_are_joined_separately():
+    fusion = SensorFusion(tolerance_ms=1000)
+    fusion.add('chair-1', 'accelerometer', 1000, ACCEL)
+    assert fusion.add('chair-2', 'pressure', 1000, PRESSURE) == []
+    [fused] = fusion.add('chair-2', 'accelerometer', 1100, ACCEL)
+    assert fused.device_id == 'chair-2'
+    assert fusion.pending() == 1
+
+
+def test_interpolates_between_readings():
+    fusion = SensorFusion(tolerance_ms=1000, interpolate=True)
+    fusion.add('chair-1', 'pressure', 1000, (60, 40))
+    fusion.add('chair-1', 'pressure', 2000, (80, 60))
+    [fused] = fusion.add('chair-1', 'accelerometer', 1250, ACCEL)
+    assert fused.interpolated
+    assert fused.pressure == pytest.approx((65.0, 45.0))
+    assert fusion.stats()['interpolated'] == 1
+
+
+def test_no_interpolation_without_a_reading_on_both_sides():
+    fusion = SensorFusion(tolerance_ms=1000, interpolate=True)
+    fusion.add('chair-1', 'pressure', 1000, PRESSURE)
+    [fused] = fusion.add('chair-1', 'accelerometer', 1300, ACCEL)
+    assert not fused.interpolated
+    assert fused.pressure == PRESSURE
+
+
+def test_stale_samples_expire():
+    fusion = SensorFusion(tolerance_ms=1000, max_age_ms=5000)
+    fusion.add('chair-1', 'pressure', 1000, PRESSURE)
+    fusion.add('chair-1', 'accelerometer', 7000, ACCEL)
+    assert fusion.stats()['dropped_stale'] == 1
+    assert fusion.pending() == 1
+
+
+def test_late_samples_are_dropped():
+    fusion = SensorFusion(tolerance_ms=1000)
+    fusion.add('chair-1', 'accelerometer', 5000, ACCEL)
+    fusion.add('chair-1', 'pressure', 5200, PRESSURE)
+    # Older than both members of the last pair
+    assert fusion.add('chair-1', 'pressure', 4000, PRESSURE) == []
+    assert fusion.stats()['late'] == 1
+    assert fusion.pending() == 0
+
+
+def test_buffer_overflow_drops_oldest():
+    fusion = SensorFusion(tolerance_ms=10, max_buffer=3)
+    for ts in range(0, 500, 100):
+        fusion.add('chair-1', 'accelerometer', ts, ACCEL)
+    assert fusion.pending() == 3
+    assert fusion.stats()['dropped_overflow'] == 2
+    assert [ts for ts, _ in fusion.buffers['chair-1']['accelerometer']] == [200, 300, 400]
+
+
+def test_other_sensors_are_ignored():
+    fusion = SensorFusion()
+    assert fusion.add('chair-1', 'dht', 1000, (22.5, 40.0)) == []
+    assert fusion.pending() == 0
@@ -0,0 +1,43 @@
+import sqlite3
+
+import pytest
+
+from iot_core.db_writer import DbWriter
+from iot_core.sensor_query import query_range
+
+
+@pytest.fixture
+def conn(db_path):
+    writer = DbWriter(db_path, stats_interval=0)
+    writer.start()
+    for i in range(3):
+        writer.write('iot/sensors/dht', None, values=(20.0 + i, 40.0), ts_ms=1000 + i)
+        writer.write('iot/home/chair-1/dht', None, device_id='chair-1', values=(30.0 + i, 40.0), ts_ms=1000 + i)
+    writer.flush(5)
+    writer.stop()
+    conn = sqlite3.connect(db_path)
+    yield conn
+    conn.close()
+
+
+def devices(rows):
+    return sorted({row[1] for row in rows})
+
+
+def test_topic_selects_its_device(conn):
+    assert devices(query_range(conn, 'iot/home/chair-1/dht')) == ['chair-1']
+
+
+def test_legacy_topic_means_the_default_device(conn):
+    rows = list(query_range(conn, 'iot/sensors/dht'))
+    assert devices(rows) == ['default']
+    assert [row[3] for row in rows] == [20.0, 21.0, 22.0]
+
+
+def test_sensor_name_covers_every_device(conn):
+    assert devices(query_range(conn, 'dht')) == ['chair-1', 'default']
+
+
+def test_range_and_order(conn):
+    rows = list(query_range(conn, 'iot/home/chair-1/dht', start=1001, end=1003, descending=True))
+    assert [row[2] for row in rows] == [1002, 1001]
@@ -0,0 +1,72 @@
+import sqlite3
+
+import pytest
+
+from iot_core.db_writer import DbWriter
+from iot_core.sensor_schema import backfill_typed_tables, parse_message
+
+
+def watermark(conn):
+    return int(conn.execute("SELECT value FROM schema_meta WHERE key = 'typed_backfill_id'").fetchone()[0])
+
+
+def test_parse_message():
+    assert parse_message('iot/sensors/accelerometer', "Tilt X: -0.95, Tilt Y: -4.9, Tilt Z: -3.66") == \
+        ('accelerometer', (-0.95, -4.9, -3.66))
+    assert parse_message('iot/home/chair-1/pressure', "Seat Pressure: 73, Back Pressure: 65") == ('pressure', (73, 65))
+    assert parse_message('iot/sensors/dht', "Temperature: 22.5 C, Humidity: 39.8%") == ('dht', (22.5, 39.8))
+    assert parse_message('iot/alerts', "anything") is None
+    with pytest.raises((ValueError, IndexError)):
+        parse_message('iot/sensors/dht', "garbage")
+
+
+def test_backfill_types_legacy_rows_once(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO sensor_data (topic, message, timestamp) VALUES (?, ?, ?)", [
+        ('iot/sensors/dht', "Temperature: 20 C, Humidity: 40%", '2024-05-01 00:00:00'),
+        ('iot/home/chair-1/pressure', "Seat Pressure: 1, Back Pressure: 2", '2024-05-01 00:00:01'),
+        ('iot/sensors/dht', "garbage", '2024-05-01 00:00:02'),
+    ])
+    conn.commit()
+    assert backfill_typed_tables(conn) == (2, 1)
+    assert conn.execute("SELECT device_id, ts_ms FROM pressure_data").fetchall() == [('chair-1', 1714521601000)]
+    assert watermark(conn) == 3
+    assert backfill_typed_tables(conn) == (0, 0)
+    conn.close()
+
+
+def test_live_writer_advances_the_watermark(db_path):
+    writer = DbWriter(db_path, batch_size=10)
+    writer.start()
+    for i in range(25):
+        writer.write('iot/sensors/dht', f"Temperature: {i} C, Humidity: 40%")
+    writer.flush(5)
+    writer.stop()
+
+    conn = sqlite3.connect(db_path)
+    assert watermark(conn) == 25
+    # Nothing left for the next startup to re-read
+    conn.execute("UPDATE sensor_data SET message = 'garbage'")
+    assert backfill_typed_tables(conn) == (0, 0)
+    conn.close()
+
+
+def test_watermark_waits_for_rows_nobody_typed(db_path):
+    conn = sqlite3.connect(db_path)
+    # Written before the typed tables existed: no typed row yet
+    conn.execute("INSERT INTO sensor_data (topic, message, timestamp) "
+                 "VALUES ('iot/sensors/dht', 'Temperature: 1 C, Humidity: 2%', '2024-05-01 00:00:00')")
+    conn.commit()
+
+    writer = DbWriter(db_path)
+    writer.start()
+    writer.write('iot/sensors/dht', "Temperature: 3 C, Humidity: 4%")
+    writer.flush(5)
+    writer.stop()
+
+    # The gap at id 1 keeps the watermark where it was
+    assert watermark(conn) == 0
+    assert backfill_typed_tables(conn) == (1, 0)
+    assert watermark(conn) == 2
+    assert conn.execute("SELECT raw_id, temperature FROM dht_data ORDER BY raw_id").fetchall() == [(1, 1.0), (2, 3.0)]
+    conn.close()
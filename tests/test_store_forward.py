@@ -0,0 +1,173 @@
+import os
+import time
+
+import pytest
+
+from iot_core.payload_codec import decode_payload, is_binary
+from iot_core.store_forward import RECORD, BufferedPublisher, RecordBuffer
+
+
+class FakeClient:
+    def __init__(self):
+        self.on_connect = None
+        self.on_disconnect = None
+        self.published = []
+
+    class Info:
+        rc = 0
+
+    def publish(self, topic, payload, qos=0):
+        self.published.append((topic, payload))
+        return self.Info()
+
+
+@pytest.fixture
+def buffer_path(tmp_path):
+    return str(tmp_path / 'test.buffer')
+
+
+def fill(buffer, n, size=10):
+    for i in range(n):
+        buffer.append(f"iot/test/{i}", bytes([i % 256]) * size)
+
+
+def test_records_round_trip(buffer_path):
+    buffer = RecordBuffer(buffer_path)
+    buffer.append('iot/a', "text payload")
+    buffer.append('iot/b', b'\xa5\x00binary')
+    records, end = buffer.peek(10)
+    assert records == [('iot/a', b"text payload"), ('iot/b', b'\xa5\x00binary')]
+    assert end == buffer.tail and len(buffer) == 2
+    buffer.commit(end)
+    # Fully drained: the file is compacted to nothing
+    assert len(buffer) == 0 and os.path.getsize(buffer_path) == 0
+    buffer.close()
+
+
+def test_offset_survives_reopen(buffer_path):
+    buffer = RecordBuffer(buffer_path)
+    fill(buffer, 5)
+    _, end = buffer.peek(2)
+    buffer.commit(end)
+    buffer.close()
+
+    reopened = RecordBuffer(buffer_path)
+    assert len(reopened) == 3
+    records, _ = reopened.peek(10)
+    assert [topic for topic, _ in records] == ['iot/test/2', 'iot/test/3', 'iot/test/4']
+    reopened.close()
+
+
+def test_torn_tail_is_cut_on_open(buffer_path):
+    buffer = RecordBuffer(buffer_path)
+    fill(buffer, 3)
+    buffer.close()
+    size = os.path.getsize(buffer_path)
+    with open(buffer_path, 'r+b') as f:
+        f.truncate(size - 4)  # A crash in the middle of the last append
+
+    reopened = RecordBuffer(buffer_path)
+    assert len(reopened) == 2
+    assert os.path.getsize(buffer_path) == size - (RECORD.size + len('iot/test/2') + 10)
+    reopened.append('iot/after', b'ok')
+    records, _ = reopened.peek(10)
+    assert [topic for topic, _ in records] == ['iot/test/0', 'iot/test/1', 'iot/after']
+    reopened.close()
+
+
+def test_corrupted_record_fails_the_crc(buffer_path):
+    buffer = RecordBuffer(buffer_path)
+    fill(buffer, 2)
+    buffer.close()
+    with open(buffer_path, 'r+b') as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(b'\xff')
+
+    reopened = RecordBuffer(buffer_path)
+    assert len(reopened) == 1
+    reopened.close()
+
+
+def test_full_buffer_drops_oldest(buffer_path):
+    record_size = RECORD.size + len('iot/test/0') + 10
+    buffer = RecordBuffer(buffer_path, max_bytes=record_size * 10)
+    fill(buffer, 25)
+    stats = buffer.stats()
+    assert stats['dropped'] > 0
+    assert stats['depth'] + stats['dropped'] == 25
+    assert os.path.getsize(buffer_path) <= record_size * 10
+    records, _ = buffer.peek(100)
+    # The newest messages are kept, in order
+    assert records[-1][0] == 'iot/test/24'
+    assert [int(topic.rsplit('/', 1)[1]) for topic, _ in records] == list(range(25 - len(records), 25))
+    with pytest.raises(ValueError):
+        buffer.append('iot/huge', b'x' * record_size * 10)
+    buffer.close()
+
+
+def test_commit_after_drops_counts_only_the_remaining_records(buffer_path):
+    record_size = RECORD.size + len('iot/test/0') + 10
+    buffer = RecordBuffer(buffer_path, max_bytes=record_size * 10)
+    fill(buffer, 10)
+    records, end = buffer.peek(5)
+    # The buffer fills up while the peeked records are being sent
+    buffer.append('iot/late', bytes(10))
+    dropped = buffer.stats()['dropped']
+    assert 0 < dropped < 5
+    buffer.commit(end)
+    stats = buffer.stats()
+    assert stats['drained'] == 5 - dropped
+    assert stats['drained'] + stats['dropped'] + len(buffer) == 11
+    remaining, _ = buffer.peek(100)
+    assert [topic for topic, _ in remaining] == [f"iot/test/{i}" for i in range(5, 10)] + ['iot/late']
+    buffer.close()
+
+
+def test_sends_directly_while_connected(buffer_path):
+    client = FakeClient()
+    publisher = BufferedPublisher(client, RecordBuffer(buffer_path))
+    publisher.on_connect(client, None, {}, 0)
+    assert publisher.publish('iot/home/chair-1/dht', "Temperature: 22.5 C, Humidity: 40.0%")
+    assert client.published == [('iot/home/chair-1/dht', "Temperature: 22.5 C, Humidity: 40.0%")]
+    assert len(publisher.buffer) == 0
+    publisher.buffer.close()
+
+
+def test_replayed_sample_keeps_its_capture_time(buffer_path):
+    client = FakeClient()
+    publisher = BufferedPublisher(client, RecordBuffer(buffer_path), drain_rate=1000.0)
+    topic = 'iot/home/chair-1/dht'
+    captured_ms = 1_700_000_000_000
+
+    # Offline: both samples wait in the buffer
+    assert not publisher.publish_samples(topic, [(captured_ms, (22.5, 40.0)), (captured_ms + 10000, (23.0, 41.0))])
+    assert publisher.buffer.stats()['depth'] == 2
+    assert not publisher.publish('iot/alerts', "Bad posture detected!")
+
+    publisher.start()
+    try:
+        publisher.on_connect(client, None, {}, 0)
+        for _ in range(100):
+            if len(client.published) == 3:
+                break
+            time.sleep(0.02)
+    finally:
+        publisher.stop()
+
+    assert [t for t, _ in client.published] == [topic, topic, 'iot/alerts']
+    decoded = [decode_payload(topic, payload, received_ms=captured_ms + 3_600_000)
+               for _, payload in client.published[:2]]
+    assert all(is_binary(payload) for _, payload in client.published[:2])
+    assert decoded == [('dht', [(captured_ms, (22.5, 40.0))]), ('dht', [(captured_ms + 10000, (23.0, 41.0))])]
+    # Non-sensor messages are forwarded as they came
+    assert client.published[2][1] == b"Bad posture detected!"
+    assert len(publisher.buffer) == 0
+    publisher.buffer.close()
+
+
+def test_undecodable_text_is_buffered_unchanged(buffer_path):
+    publisher = BufferedPublisher(FakeClient(), RecordBuffer(buffer_path))
+    publisher.publish('iot/home/chair-1/dht', "not a reading")
+    records, _ = publisher.buffer.peek(1)
+    assert records == [('iot/home/chair-1/dht', b"not a reading")]
+    publisher.buffer.close()